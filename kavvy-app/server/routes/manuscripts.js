@@ -3,6 +3,9 @@ import Manuscript from '../models/Manuscript.js';
 
 const router = express.Router();
 
+// Resident phase3 analysis service (phase3/analysis_service.py)
+const ANALYSIS_SERVICE_URL = process.env.ANALYSIS_SERVICE_URL || 'http://127.0.0.1:8765';
+
 // Get all manuscripts with optional filters
 router.get('/', async (req, res) => {
   try {
@@ -23,6 +26,35 @@ router.get('/', async (req, res) => {
   }
 });
 
+// Analyze manuscript text with the analysis service
+router.post('/analyze', async (req, res) => {
+  try {
+    const { text } = req.body;
+    if (!text) return res.status(400).json({ message: 'text is required' });
+
+    const response = await fetch(`${ANALYSIS_SERVICE_URL}/analyze`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ text })
+    });
+    const data = await response.json();
+    if (!response.ok) return res.status(502).json({ message: data.message || 'Analysis failed' });
+    res.json(data.results[0]);
+  } catch (error) {
+    res.status(503).json({ message: `Analysis service unavailable: ${error.message}` });
+  }
+});
+
+// Analysis service health (polled by the server / monitoring)
+router.get('/analysis/health', async (req, res) => {
+  try {
+    const response = await fetch(`${ANALYSIS_SERVICE_URL}/health`);
+    res.status(response.ok ? 200 : 503).json(await response.json());
+  } catch (error) {
+    res.status(503).json({ status: 'unavailable', message: error.message });
+  }
+});
+
 // Get manuscript by ID
 router.get('/:id', async (req, res) => {
   try {
@@ -3,6 +3,9 @@ import Publisher from '../models/Publisher.js';
 
 const router = express.Router();
 
+// Resident phase2 matching service (phase2/match_service.py)
+const MATCH_SERVICE_URL = process.env.MATCH_SERVICE_URL || 'http://127.0.0.1:8766';
+
 // Get all publishers with optional filters
 router.get('/', async (req, res) => {
   try {
@@ -20,6 +23,35 @@ router.get('/', async (req, res) => {
   }
 });
 
+// Rank publishers for an author's preferences with the matching service
+router.post('/match', async (req, res) => {
+  try {
+    const { preferences, profile, weights, topK } = req.body;
+    if (!preferences) return res.status(400).json({ message: 'preferences are required' });
+
+    const response = await fetch(`${MATCH_SERVICE_URL}/match`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ preferences, profile, weights, top_k: topK })
+    });
+    const data = await response.json();
+    if (!response.ok) return res.status(response.status === 400 ? 400 : 502).json({ message: data.message || 'Matching failed' });
+    res.json(data);
+  } catch (error) {
+    res.status(503).json({ message: `Match service unavailable: ${error.message}` });
+  }
+});
+
+// Matching service health (polled by the server / monitoring)
+router.get('/match/health', async (req, res) => {
+  try {
+    const response = await fetch(`${MATCH_SERVICE_URL}/health`);
+    res.status(response.ok ? 200 : 503).json(await response.json());
+  } catch (error) {
+    res.status(503).json({ status: 'unavailable', message: error.message });
+  }
+});
+
 // Get publisher by ID
 router.get('/:id', async (req, res) => {
   try {
@@ -15,6 +15,8 @@ const PORT = process.env.PORT || 5001;
 
 // Middleware
 app.use(cors());
+// manuscript text for the analysis service; same limit as its MAX_BODY_BYTES
+app.use('/api/manuscripts/analyze', express.json({ limit: '50mb' }));
 app.use(express.json());
 
 // MongoDB Connection
@@ -1,14 +1,62 @@
 // src/pages/MatchesPage.tsx
-import type { Author, Match } from '../types';
+import { useEffect, useState } from 'react';
+import type { Author, Match, MatchPreferences, Publisher, RankedPublisher } from '../types';
 import { publishers } from '../data/publishers';
 import { PublisherCard } from '../components/PublisherCard';
+import { api } from '../services/api';
 
 interface MatchesPageProps {
   author: Author;
 }
 
+// Author profile -> phase2 matcher preferences ('' = no preference)
+function toPreferences(author: Author): MatchPreferences {
+  return {
+    user_location: author.location || '',
+    subjects: [...author.subjects, ...author.genres],
+    requires_agent: author.hasAgent ? '' : 'N',
+    manuscript_needed: author.manuscriptStatus === 'complete' ? '' : 'N',
+  };
+}
+
+// Ranked service result -> card data, filled in from the bundled list when we know the publisher
+function toMatch(ranked: RankedPublisher): Match {
+  const known = publishers.find(p => p.name.toLowerCase() === ranked.publisher.toLowerCase());
+  const publisher: Publisher = known ?? {
+    name: ranked.publisher,
+    location: ranked.location,
+    website: ranked.website,
+    subjects: ranked.subjects.split(',').map(s => s.trim()).filter(Boolean),
+    genres: [],
+    booksPublished: 0,
+    maxYear: 0,
+    maxSeason: '',
+    manuscriptNeeded: false,
+    chaptersNeeded: false,
+    requiresAgent: false,
+    openCalls: false,
+    promotionChannels: '',
+    recognition: '',
+  };
+  return {
+    publisher,
+    score: Math.round(ranked.match_percent),
+    reasons: [`Ranked #${ranked.rank} by location, subjects and submission requirements`],
+  };
+}
+
 export function MatchesPage({ author }: MatchesPageProps) {
-  // Simple matching algorithm
+  const [serviceMatches, setServiceMatches] = useState<Match[] | null>(null);
+
+  useEffect(() => {
+    let cancelled = false;
+    api.matchPublishers(toPreferences(author))
+      .then(result => { if (!cancelled) setServiceMatches(result.matches.map(toMatch)); })
+      .catch(() => { if (!cancelled) setServiceMatches(null); });  // fall back to local matching
+    return () => { cancelled = true; };
+  }, [author]);
+
+  // Simple matching algorithm (used when the matching service is unavailable)
   const calculateMatches = (): Match[] => {
     return publishers.map(publisher => {
       let score = 0;
@@ -54,7 +102,7 @@ export function MatchesPage({ author }: MatchesPageProps) {
     }).sort((a, b) => b.score - a.score);
   };
 
-  const matches = calculateMatches();
+  const matches = serviceMatches ?? calculateMatches();
 
   const getScoreClass = (score: number): string => {
     if (score >= 70) return 'high';
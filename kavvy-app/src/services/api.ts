@@ -1,3 +1,5 @@
+import type { MatchPreferences, MatchProfile, MatchResponse, MatchWeights } from '../types';
+
 function resolveApiBaseUrl() {
   const configuredUrl = import.meta.env.VITE_API_URL?.trim();
 
@@ -39,6 +41,20 @@ export const api = {
     return response.json();
   },
 
+  // weights override single entries of the profile
+  async matchPublishers(
+    preferences: MatchPreferences,
+    options?: { profile?: MatchProfile; weights?: MatchWeights; topK?: number }
+  ): Promise<MatchResponse> {
+    const response = await fetch(`${API_BASE_URL}/api/publishers/match`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ preferences, profile: options?.profile, weights: options?.weights, topK: options?.topK ?? 10 })
+    });
+    if (!response.ok) throw new Error('Failed to match publishers');
+    return response.json();
+  },
+
   // Authors
   async getAuthors() {
     const response = await fetch(`${API_BASE_URL}/api/authors`);
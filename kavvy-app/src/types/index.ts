@@ -64,6 +64,57 @@ export interface Match {
   reasons: string[];
 }
 
+// phase2 matching service (POST /api/publishers/match)
+export type YesNo = 'Y' | 'N' | '';
+
+export interface MatchPreferences {
+  user_location: string;
+  subjects: string[];
+  manuscript_needed?: YesNo;
+  chapters_needed?: YesNo;
+  requires_agent?: YesNo;
+  peer_reviewed?: YesNo;
+  proposal_required?: YesNo;
+  academic_focus?: YesNo;
+  religious_focus?: YesNo;
+  // only used by the similarity weight (e.g. the 'similar_books' profile)
+  genres?: string[];
+  pages?: number;
+}
+
+export type MatchProfile = 'default' | 'ranked' | 'anywhere' | 'similar_books';
+
+export type MatchWeights = Partial<Record<
+  'distance' | 'subjects' | 'similarity' | Exclude<keyof MatchPreferences, 'user_location' | 'subjects' | 'genres' | 'pages'>,
+  number
+>>;
+
+export interface PublisherEvidence {
+  authors: number;
+  works: number;
+  mean_rating: number | null;
+  median_pages: number | null;
+}
+
+export interface RankedPublisher {
+  rank: number;
+  publisher: string;
+  match_percent: number;
+  location: string;
+  website: string;
+  subjects: string;
+  evidence: PublisherEvidence;
+}
+
+export interface MatchResponse {
+  matches: RankedPublisher[];
+  geocoded: boolean;
+  subjects: { typed: string; matched: string | null }[];
+  profile: MatchProfile;
+  weights: Record<string, number>;
+  catalog_sha256: string;
+}
+
 export interface User {
   id: string;
   email: string;
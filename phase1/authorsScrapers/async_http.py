@@ -0,0 +1,204 @@
+"""
+Asynchronous HTTP layer for the scraper's API lookups (Google Books and
+OpenLibrary).
+
+One AsyncFetcher owns an asyncio event loop on a background thread, so the
+scraper's worker threads can share it:
+
+  * every host gets its own aiohttp session, and so its own connection pool,
+    with at most `host_limits[host]` requests in flight
+  * every request first takes a token from the host's bucket in
+    rate_limiter.HostRateLimiter, so a slow host no longer holds up the others
+  * 429 / 5xx responses and network errors are retried with jittered
+    exponential backoff, up to `max_retries` times; after that the last
+    response is returned (or the error raised), and a warning is logged
+  * with a `cache` (response_cache.ResponseCache), 200 responses are kept
+    on disk; fresh entries are served without a request, and stale ones
+    are revalidated with a conditional request
+  * cache reads and writes and the `record_path` appends run on a small
+    thread pool, so disk I/O never stalls the requests in flight on the loop
+  * `get()` / `get_many()` are coroutines for code running on the loop;
+    `run(coro)` runs a coroutine from any other thread and waits for it
+
+For offline runs and tests, `base_url` sends every request to one server
+(see fake_api_server.py) instead of the real hosts. `record_path` appends
+each response to a JSON Lines file that fake_api_server.py can replay.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import aiohttp
+from multidict import CIMultiDict
+
+from rate_limiter import MAX_RETRIES, RETRY_STATUSES, HostRateLimiter
+from response_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+# concurrent requests per host
+HOST_LIMITS = {"www.googleapis.com": 8, "openlibrary.org": 4}
+DEFAULT_HOST_LIMIT = 4
+REQUEST_TIMEOUT = 30
+# threads for cache and recording I/O (SQLite serializes writes anyway)
+DISK_THREADS = 2
+# response headers kept in recordings
+RECORDED_HEADERS = ("Content-Type", "Retry-After", "ETag", "Last-Modified")
+
+
+def path_key(url: str, params: Optional[dict] = None) -> str:
+    """Path plus sorted query parameters: how fake_api_server.py matches a request"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    query += [(str(k), str(v)) for k, v in (params or {}).items()]
+    return (parts.path or "/") + ("?" + urlencode(sorted(query)) if query else "")
+
+
+def request_key(url: str, params: Optional[dict] = None) -> str:
+    """Normalized scheme, host, path and sorted query: the identity of a GET request"""
+    parts = urlsplit(url)
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}{path_key(url, params)}"
+
+
+class HttpResponse(NamedTuple):
+    status: int
+    headers: Mapping[str, str]  # case-insensitive
+    body: bytes
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class AsyncFetcher:
+    def __init__(self, headers: Optional[Dict[str, str]] = None, host_limits: Optional[Dict[str, int]] = None,
+                 limiter: Optional[HostRateLimiter] = None, max_retries: int = MAX_RETRIES,
+                 cache: Optional[ResponseCache] = None, base_url: Optional[str] = None,
+                 record_path: Optional[str] = None, timeout: float = REQUEST_TIMEOUT):
+        self.headers = dict(headers or {})
+        self.host_limits = {**HOST_LIMITS, **(host_limits or {})}
+        self.limiter = limiter or HostRateLimiter()
+        self.max_retries = max_retries
+        self.cache = cache
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.record_path = record_path
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.requests: Counter = Counter()
+
+        # per host, created on the loop the first time the host is used
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._record_lock = threading.Lock()
+        self._disk = ThreadPoolExecutor(max_workers=DISK_THREADS, thread_name_prefix="async-http-disk")
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="async-http", daemon=True)
+        self._thread.start()
+
+    # 1.  PER-HOST STATE
+    def _host_state(self, host: str) -> Tuple[aiohttp.ClientSession, asyncio.Semaphore]:
+        if host not in self._sessions:
+            limit = self.host_limits.get(host, DEFAULT_HOST_LIMIT)
+            connector = aiohttp.TCPConnector(limit=limit, ttl_dns_cache=300)
+            self._sessions[host] = aiohttp.ClientSession(headers=self.headers, connector=connector,
+                                                         timeout=self.timeout)
+            self._limits[host] = asyncio.Semaphore(limit)
+        return self._sessions[host], self._limits[host]
+
+    # 2.  REQUESTS
+    async def get(self, url: str, params: Optional[dict] = None) -> HttpResponse:
+        """
+        GET one URL, from the cache if it holds a fresh copy. Network errors
+        that outlast the retries propagate as aiohttp.ClientError /
+        asyncio.TimeoutError.
+        """
+        key = request_key(url, params)
+        cached = await self._on_disk(self.cache.get, key) if self.cache is not None else None
+        if cached and cached.fresh:
+            response = HttpResponse(cached.status, cached.headers, cached.body)
+        else:
+            response = await self._fetch(url, params, cached.validators() if cached else {})
+            if cached and response.status == 304:
+                await self._on_disk(self.cache.touch, key)
+                response = HttpResponse(cached.status, cached.headers, cached.body)
+            elif self.cache is not None and response.status == 200:
+                await self._on_disk(self.cache.put, key, response.status, response.headers, response.body)
+        if self.record_path:
+            await self._on_disk(self._record, url, params, response)
+        return response
+
+    async def _on_disk(self, fn, *args):
+        """Run blocking file / SQLite work on the disk threads and wait for it"""
+        return await self.loop.run_in_executor(self._disk, fn, *args)
+
+    async def _fetch(self, url: str, params: Optional[dict], headers: Dict[str, str]) -> HttpResponse:
+        """GET over the network, retrying throttled, failed and 5xx requests"""
+        host = urlsplit(url).hostname or ""
+        session, limit = self._host_state(host)
+        target = url
+        if self.base_url:
+            parts = urlsplit(url)
+            target = self.base_url + parts.path + ("?" + parts.query if parts.query else "")
+        for attempt in range(self.max_retries + 1):
+            response = error = None
+            async with limit:
+                await asyncio.sleep(self.limiter.reserve(host))
+                self.requests[host] += 1
+                try:
+                    async with session.get(target, params=params, headers=headers) as r:
+                        response = HttpResponse(r.status, CIMultiDict(r.headers), await r.read())
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = e
+            status = response.status if response else None
+            retry_after = self.limiter.observe(host, status, response.headers.get("Retry-After") if response else None)
+            if response is not None and status not in RETRY_STATUSES:
+                break
+            if attempt == self.max_retries:
+                logger.warning(f"Giving up on {url} after {attempt + 1} attempts: {error or f'HTTP {status}'}")
+                break
+            await asyncio.sleep(self.limiter.backoff(host, attempt, retry_after))
+        if error is not None:
+            raise error
+        return response
+
+    async def get_many(self, requests: Iterable[Tuple[str, Optional[dict]]]) -> List[HttpResponse]:
+        """
+        GET several URLs concurrently (within each host's limits). Responses
+        come back in request order; a failed request's exception takes its place.
+        """
+        return list(await asyncio.gather(*(self.get(url, params) for url, params in requests),
+                                         return_exceptions=True))
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Run a coroutine on the fetcher's loop from another thread and return its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def _record(self, url: str, params: Optional[dict], response: HttpResponse):
+        line = json.dumps({
+            "url": url,
+            "params": params or {},
+            "status": response.status,
+            "headers": {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            "body": response.body.decode("utf-8", "replace"),
+        }, ensure_ascii=False)
+        with self._record_lock, open(self.record_path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    # 3.  TEARDOWN
+    async def _close_sessions(self):
+        for session in self._sessions.values():
+            await session.close()
+
+    def close(self):
+        if self.loop.is_closed():
+            return
+        self.run(self._close_sessions())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+        self._disk.shutdown()
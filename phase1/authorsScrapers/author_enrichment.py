@@ -0,0 +1,86 @@
+"""
+Cross-publisher author enrichment for the scraper.
+
+An author often appears under several imprints. The Goodreads scrape and
+the work-count lookups only depend on the author, so they are done once per
+author, not once per (publisher, author) row:
+
+  * `normalize_author_name` gives every spelling of a name one key: case,
+    accents and punctuation are dropped, and initials are merged, so
+    "J.K. Rowling", "J. K. Rowling" and "JK ROWLING" are all "jk rowling"
+  * `AuthorEnricher.submit(name)` puts a name on one shared work queue the
+    first time its key is seen. Later rows with the same key get the same
+    future back, and so the same result
+  * `duplicates_avoided` counts the rows answered by an existing lookup
+
+The enrichment itself (`enrich(name) -> dict`) is supplied by the scraper.
+"""
+
+import re
+import threading
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+
+# runs of capitals this long or shorter, written without dots ("JK", "JRR"), are initials
+MAX_INITIALS_RUN = 3
+# letters NFKD does not split into a base letter and an accent
+_FOLD = str.maketrans({"ø": "o", "Ø": "O", "ł": "l", "Ł": "L", "đ": "d", "Đ": "D", "æ": "ae", "Æ": "AE",
+                       "œ": "oe", "Œ": "OE"})
+
+
+def normalize_author_name(name: str) -> str:
+    """Matching key for an author name: casefolded, unaccented, punctuation-free, initials merged"""
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).translate(_FOLD)
+    # in an all-capitals name, short words are words ("URSULA K LE GUIN"), not initials
+    shouting = text.isupper()
+    tokens = []
+    for token in re.split(r"[\W_]+", text):
+        if not token:
+            continue
+        if not shouting and token.isupper() and 1 < len(token) <= MAX_INITIALS_RUN:
+            tokens.extend(token.casefold())
+        else:
+            tokens.append(token.casefold())
+    # adjacent single letters are one run of initials: "j k rowling" -> "jk rowling"
+    key = []
+    in_initials = False
+    for token in tokens:
+        if len(token) == 1 and in_initials:
+            key[-1] += token
+        else:
+            key.append(token)
+            in_initials = len(token) == 1
+    return " ".join(key)
+
+
+class AuthorEnricher:
+    def __init__(self, enrich: Callable[[str], dict], workers: int):
+        """`enrich(name)` looks one author up; `workers` threads drain the queue"""
+        self.enrich = enrich
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="enrich")
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.rows = 0
+
+    def submit(self, name: str) -> Future:
+        """Future for `name`'s enrichment; queued only the first time its normalized name is seen"""
+        key = normalize_author_name(name) or name
+        with self._lock:
+            self.rows += 1
+            if key not in self._futures:
+                self._futures[key] = self._executor.submit(self.enrich, name)
+            return self._futures[key]
+
+    @property
+    def unique(self) -> int:
+        return len(self._futures)
+
+    @property
+    def duplicates_avoided(self) -> int:
+        return self.rows - self.unique
+
+    def close(self):
+        """Wait for running lookups; queued ones that never started are dropped"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
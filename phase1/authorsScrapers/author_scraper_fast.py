@@ -4,8 +4,8 @@ Used on 6/09/2025 when revisitng phase 2 because of not enough author data
 This script collected up to 40 authors from each publishing house
 """
 
+import asyncio
 import pandas as pd
-import requests
 import time
 import csv
 from bs4 import BeautifulSoup
@@ -18,12 +18,19 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
 import logging
-import concurrent.futures
 import threading
+import concurrent.futures
+from collections import deque
 from threading import Lock
 
+from async_http import AsyncFetcher
+from author_enrichment import AuthorEnricher, normalize_author_name
+from driver_pool import DriverPool, DriverStartError
+from rate_limiter import HostRateLimiter
+from response_cache import ResponseCache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -31,99 +38,107 @@ logger = logging.getLogger(__name__)
 # CONFIGURATION
 START_FROM_PUBLISHER = 321  # Resume from where you left off
 MAX_WORKERS = 10  # Number of parallel threads
+AUTHOR_TIMEOUT = 30  # Seconds to wait for one author's enrichment before logging it as failed
+PUBLISHERS_AHEAD = 5  # Publishers collected ahead of the oldest one still being enriched
+DRIVER_POOL_SIZE = 5  # Chrome instances shared by the threads; each scrape checks one out
+MAX_PAGE_LOADS = 200  # Restart a Chrome instance after this many page loads
 FAST_GOODREADS = True  # Reduced delays for Goodreads
+GOODREADS_HOST = 'www.goodreads.com'  # Rate-limited like the APIs (see rate_limiter.HOST_RATES)
+GOOGLE_PAGE_WAVE = 3  # Google Books result pages fetched concurrently per round
+CACHE_PATH = "api_cache.sqlite3"  # On-disk cache of API responses; None to always fetch
+CACHE_TTL_DAYS = 7  # Older cached responses are revalidated with the API
+API_BASE_URL = None  # e.g. "http://127.0.0.1:8800" to send API calls to fake_api_server.py
+RECORD_RESPONSES = None  # e.g. "recorded_responses.jsonl" to save API responses for fake_api_server.py
 
 class PublisherAuthorScraper:
     def __init__(self, input_csv_path, output_csv_path):
         self.input_csv_path = input_csv_path
         self.output_csv_path = output_csv_path
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        # Per-host token buckets shared by the API client and the Goodreads browsers
+        self.limiter = HostRateLimiter()
+        
+        # Cached API responses, so reruns and recurring authors are answered from disk
+        self.cache = ResponseCache(CACHE_PATH, ttl=CACHE_TTL_DAYS * 24 * 3600) if CACHE_PATH else None
         
-        # Thread-safe WebDriver pool
-        self.driver_pool = []
-        self.driver_lock = Lock()
-        self.setup_driver_pool()
+        # Async API client: per-host connection pools and concurrency limits
+        self.http = AsyncFetcher(
+            limiter=self.limiter,
+            cache=self.cache,
+            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'},
+            base_url=API_BASE_URL,
+            record_path=RECORD_RESPONSES,
+        )
         
-        # Rate limiting
-        self.last_request_time = 0
-        self.min_request_interval = 0.5 if FAST_GOODREADS else 1  # Reduced interval
-        self.request_lock = Lock()
+        # WebDriver pool: one browser per Goodreads scrape at a time
+        self.driver_pool = self.setup_driver_pool()
         
         # Results storage
         self.results = []
         self.results_lock = Lock()
         
-    def setup_driver_pool(self):
-        """Setup multiple Chrome WebDriver instances for parallel processing"""
-        for i in range(MAX_WORKERS):
-            try:
-                chrome_options = Options()
-                chrome_options.binary_location = '/usr/bin/chromium-browser'
-                chrome_options.add_argument('--headless')
-                chrome_options.add_argument('--no-sandbox')
-                chrome_options.add_argument('--disable-dev-shm-usage')
-                chrome_options.add_argument('--disable-gpu')
-                chrome_options.add_argument('--disable-extensions')
-                chrome_options.add_argument('--disable-plugins')
-                chrome_options.add_argument('--disable-images')
-                chrome_options.add_argument('--window-size=1920,1080')
-                chrome_options.add_argument(f'--remote-debugging-port={9222 + i}')
-                chrome_options.add_argument('--user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
-                
-                driver = webdriver.Chrome(options=chrome_options)
-                self.driver_pool.append(driver)
-                logger.info(f"Chrome WebDriver {i+1} initialized successfully")
-            except Exception as e:
-                logger.error(f"Failed to initialize WebDriver {i+1}: {e}")
-                self.driver_pool.append(None)
+    @staticmethod
+    def new_driver(slot):
+        """Start one headless Chrome WebDriver; each pool slot gets its own debugging port"""
+        chrome_options = Options()
+        chrome_options.binary_location = '/usr/bin/chromium-browser'
+        chrome_options.add_argument('--headless')
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--disable-gpu')
+        chrome_options.add_argument('--disable-extensions')
+        chrome_options.add_argument('--disable-plugins')
+        chrome_options.add_argument('--disable-images')
+        chrome_options.add_argument('--window-size=1920,1080')
+        chrome_options.add_argument(f'--remote-debugging-port={9222 + slot}')
+        chrome_options.add_argument('--user-agent=Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+        return webdriver.Chrome(options=chrome_options)
     
-    def get_driver(self):
-        """Get an available driver from the pool"""
-        with self.driver_lock:
-            for driver in self.driver_pool:
-                if driver:
-                    return driver
-        return None
-    
-    def rate_limit(self):
-        """Implement thread-safe rate limiting"""
-        with self.request_lock:
-            current_time = time.time()
-            time_since_last = current_time - self.last_request_time
-            if time_since_last < self.min_request_interval:
-                sleep_time = self.min_request_interval - time_since_last
-                time.sleep(sleep_time)
-            self.last_request_time = time.time()
+    def setup_driver_pool(self):
+        """Create the WebDriver pool and start its browsers up front"""
+        pool = DriverPool(self.new_driver, DRIVER_POOL_SIZE, max_page_loads=MAX_PAGE_LOADS)
+        started = pool.warm()
+        logger.info(f"{started}/{DRIVER_POOL_SIZE} Chrome WebDrivers ready")
+        return pool
     
     def get_google_books_authors(self, publisher_name, max_authors=40):
         """Get authors from Google Books API for a given publisher"""
+        return self.http.run(self.fetch_google_books_authors(publisher_name, max_authors))
+    
+    async def fetch_google_books_authors(self, publisher_name, max_authors=40):
+        """Google Books authors; result pages are fetched GOOGLE_PAGE_WAVE at a time, and read in order"""
         authors = []
         try:
             query = f'inpublisher:"{publisher_name}"'
             url = f'https://www.googleapis.com/books/v1/volumes'
             
-            start_index = 0
             max_results = 40
+            start_indexes = list(range(0, 400, max_results))
             
-            while len(authors) < max_authors and start_index < 400:
-                params = {
-                    'q': query,
-                    'startIndex': start_index,
-                    'maxResults': max_results,
-                    'fields': 'items(volumeInfo(title,authors,pageCount,categories,publishedDate,publisher))'
-                }
-                
-                self.rate_limit()
-                response = self.session.get(url, params=params)
+            done = False
+            for wave_start in range(0, len(start_indexes), GOOGLE_PAGE_WAVE):
+                wave = start_indexes[wave_start:wave_start + GOOGLE_PAGE_WAVE]
+                responses = await self.http.get_many(
+                    (url, {
+                        'q': query,
+                        'startIndex': start_index,
+                        'maxResults': max_results,
+                        'fields': 'items(volumeInfo(title,authors,pageCount,categories,publishedDate,publisher))'
+                    })
+                    for start_index in wave
+                )
                 
-                if response.status_code == 200:
+                for response in responses:
+                    if isinstance(response, Exception):
+                        raise response
+                    if len(authors) >= max_authors or response.status != 200:
+                        done = True
+                        break
+                    
                     data = response.json()
                     items = data.get('items', [])
                     
                     if not items:
+                        done = True
                         break
                     
                     for item in items:
@@ -144,9 +159,8 @@ class PublisherAuthorScraper:
                                     'sample_book_pages': page_count,
                                     'sample_book_genre': genre
                                 })
-                    
-                    start_index += max_results
-                else:
+                
+                if done:
                     break
                     
         except Exception as e:
@@ -156,6 +170,9 @@ class PublisherAuthorScraper:
     
     def get_openlibrary_authors(self, publisher_name, max_authors=20):
         """Get additional authors from OpenLibrary API"""
+        return self.http.run(self.fetch_openlibrary_authors(publisher_name, max_authors))
+    
+    async def fetch_openlibrary_authors(self, publisher_name, max_authors=20):
         authors = []
         try:
             url = 'https://openlibrary.org/search.json'
@@ -165,10 +182,9 @@ class PublisherAuthorScraper:
                 'fields': 'title,author_name,number_of_pages_median,subject'
             }
             
-            self.rate_limit()
-            response = self.session.get(url, params=params)
+            response = await self.http.get(url, params)
             
-            if response.status_code == 200:
+            if response.status == 200:
                 data = response.json()
                 docs = data.get('docs', [])
                 author_books = {}
@@ -203,6 +219,9 @@ class PublisherAuthorScraper:
     
     def get_author_work_count_openlibrary(self, author_name):
         """Get author's work count from OpenLibrary API"""
+        return self.http.run(self.fetch_author_work_count_openlibrary(author_name))
+    
+    async def fetch_author_work_count_openlibrary(self, author_name):
         try:
             url = 'https://openlibrary.org/search.json'
             params = {
@@ -211,10 +230,9 @@ class PublisherAuthorScraper:
                 'fields': 'numFound'
             }
             
-            self.rate_limit()
-            response = self.session.get(url, params=params)
+            response = await self.http.get(url, params)
             
-            if response.status_code == 200:
+            if response.status == 200:
                 data = response.json()
                 return data.get('numFound', 0)
         except Exception as e:
@@ -225,14 +243,19 @@ class PublisherAuthorScraper:
     def scrape_goodreads_rating(self, author_name, driver=None):
         """Scrape author rating from Goodreads - OPTIMIZED"""
         if not driver:
-            driver = self.get_driver()
-        
-        if not driver:
-            return None, None
+            # Hold a browser only for the scrape itself
+            try:
+                with self.driver_pool.checkout() as driver:
+                    return self.scrape_goodreads_rating(author_name, driver)
+            except (TimeoutError, DriverStartError) as e:
+                # No browser free or none could start: the work count still comes from the APIs
+                logger.error(f"No WebDriver for {author_name}: {e}")
+                return None, None
         
         try:
             search_url = f"https://www.goodreads.com/search?q={quote_plus(author_name)}&search_type=books"
             
+            self.limiter.wait(GOODREADS_HOST)
             driver.get(search_url)
             # REDUCED delay for speed
             time.sleep(random.uniform(0.5, 1.0) if FAST_GOODREADS else random.uniform(2, 4))
@@ -241,6 +264,7 @@ class PublisherAuthorScraper:
                 author_links = driver.find_elements(By.CSS_SELECTOR, "a[href*='/author/show/']")
                 if author_links:
                     author_url = author_links[0].get_attribute('href')
+                    self.limiter.wait(GOODREADS_HOST)
                     driver.get(author_url)
                     time.sleep(random.uniform(0.5, 1.0) if FAST_GOODREADS else random.uniform(2, 4))
                     
@@ -268,6 +292,12 @@ class PublisherAuthorScraper:
             except (NoSuchElementException, AttributeError):
                 pass
                 
+        except (NoSuchElementException, TimeoutException) as e:
+            logger.error(f"Error scraping Goodreads for {author_name}: {e}")
+        except WebDriverException as e:
+            # The browser itself failed; the pool restarts it before its next checkout
+            logger.error(f"Error scraping Goodreads for {author_name}: {e}")
+            driver.crashed = True
         except Exception as e:
             logger.error(f"Error scraping Goodreads for {author_name}: {e}")
         
@@ -275,6 +305,9 @@ class PublisherAuthorScraper:
     
     def get_author_book_count_google(self, author_name):
         """Get author's book count from Google Books"""
+        return self.http.run(self.fetch_author_book_count_google(author_name))
+    
+    async def fetch_author_book_count_google(self, author_name):
         try:
             url = 'https://www.googleapis.com/books/v1/volumes'
             params = {
@@ -283,10 +316,9 @@ class PublisherAuthorScraper:
                 'fields': 'totalItems'
             }
             
-            self.rate_limit()
-            response = self.session.get(url, params=params)
+            response = await self.http.get(url, params)
             
-            if response.status_code == 200:
+            if response.status == 200:
                 data = response.json()
                 total_items = data.get('totalItems', 0)
                 return min(total_items, 500)
@@ -295,79 +327,66 @@ class PublisherAuthorScraper:
         
         return 0
     
-    def process_single_author(self, author_data, publisher):
-        """Process a single author - used for threading"""
-        try:
-            author_name = author_data['name']
-            
-            # Get available driver for this thread
-            driver = self.get_driver()
-            
-            # Get Goodreads data
-            goodreads_rating, goodreads_works = self.scrape_goodreads_rating(author_name, driver)
-            
-            # Get work count
-            distinct_works_count = 0
-            
-            if goodreads_works and goodreads_works > 0:
-                distinct_works_count = goodreads_works
-            else:
-                openlibrary_count = self.get_author_work_count_openlibrary(author_name)
-                if openlibrary_count and openlibrary_count > 0:
-                    distinct_works_count = openlibrary_count
-                else:
-                    google_count = self.get_author_book_count_google(author_name)
-                    distinct_works_count = google_count
-            
-            if not distinct_works_count:
-                distinct_works_count = author_data.get('book_count', 0)
-            
-            result = {
-                'Publisher': publisher,
-                'Author': author_name,
-                'Goodreads_Rating': goodreads_rating,
-                'Distinct_Works_Count': distinct_works_count,
-                'Sample_Book_Title': author_data.get('sample_book', ''),
-                'Sample_Book_Genre': author_data.get('sample_book_genre', ''),
-                'Sample_Book_Pages': author_data.get('sample_book_pages', 0)
-            }
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error processing author {author_name}: {e}")
-            return None
+    def get_publisher_authors(self, publisher):
+        """Google Books and OpenLibrary authors for one publisher, fetched concurrently"""
+        async def both():
+            return await asyncio.gather(
+                self.fetch_google_books_authors(publisher, max_authors=25),
+                self.fetch_openlibrary_authors(publisher, max_authors=15),
+            )
+        return self.http.run(both())
     
-    def process_authors_parallel(self, final_authors, publisher):
-        """Process authors in parallel using threading"""
-        results = []
+    def enrich_author(self, author_name):
+        """Goodreads rating and work count for one author - runs once per normalized name"""
+        # Get Goodreads data (checks a browser out of the pool)
+        goodreads_rating, goodreads_works = self.scrape_goodreads_rating(author_name)
         
-        # Process in batches to avoid overwhelming APIs
-        batch_size = MAX_WORKERS
+        # Get work count
+        distinct_works_count = 0
         
-        for i in range(0, len(final_authors), batch_size):
-            batch = final_authors[i:i + batch_size]
-            
-            with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                futures = []
-                
-                for author_data in batch:
-                    future = executor.submit(self.process_single_author, author_data, publisher)
-                    futures.append((future, author_data['name']))
-                
-                for future, author_name in futures:
-                    try:
-                        result = future.result(timeout=30)  # 30 second timeout per author
-                        if result:
-                            results.append(result)
-                            logger.info(f"  ✓ Processed author: {author_name}")
-                    except Exception as e:
-                        logger.error(f"  ✗ Failed to process author {author_name}: {e}")
-            
-            # Brief pause between batches
-            time.sleep(1)
+        if goodreads_works and goodreads_works > 0:
+            distinct_works_count = goodreads_works
+        else:
+            openlibrary_count = self.get_author_work_count_openlibrary(author_name)
+            if openlibrary_count and openlibrary_count > 0:
+                distinct_works_count = openlibrary_count
+            else:
+                google_count = self.get_author_book_count_google(author_name)
+                distinct_works_count = google_count
         
-        return results
+        return {'rating': goodreads_rating, 'works': distinct_works_count}
+    
+    def author_row(self, author_data, publisher, enrichment):
+        """Join an author's enrichment back to one publisher row"""
+        return {
+            'Publisher': publisher,
+            'Author': author_data['name'],
+            'Goodreads_Rating': enrichment['rating'],
+            'Distinct_Works_Count': enrichment['works'] or author_data.get('book_count', 0),
+            'Sample_Book_Title': author_data.get('sample_book', ''),
+            'Sample_Book_Genre': author_data.get('sample_book_genre', ''),
+            'Sample_Book_Pages': author_data.get('sample_book_pages', 0)
+        }
+    
+    def finish_publisher(self, index, publisher, authors, futures):
+        """Wait for one publisher's enrichments, add its rows and save progress"""
+        rows = []
+        for author_data, future in zip(authors, futures):
+            try:
+                rows.append(self.author_row(author_data, publisher, future.result(timeout=AUTHOR_TIMEOUT)))
+                logger.info(f"  ✓ Processed author: {author_data['name']}")
+            except concurrent.futures.TimeoutError:
+                logger.error(f"  ✗ Failed to process author {author_data['name']}: no result after {AUTHOR_TIMEOUT}s")
+            except Exception as e:
+                logger.error(f"  ✗ Failed to process author {author_data['name']}: {e}")
+        
+        # Thread-safe results addition
+        with self.results_lock:
+            self.results.extend(rows)
+        
+        # Save progress frequently
+        self.save_results()
+        logger.info(f"Progress saved after {index + 1}: {publisher}")
     
     def process_publishers(self):
         """Process all publishers from the CSV file"""
@@ -380,42 +399,50 @@ class PublisherAuthorScraper:
             publishers = publishers[START_FROM_PUBLISHER:]
             
             logger.info(f"Resuming from publisher {START_FROM_PUBLISHER + 1}, processing {len(publishers)} remaining publishers...")
-            logger.info(f"Using {MAX_WORKERS} parallel threads for Goodreads scraping")
+            logger.info(f"Using {MAX_WORKERS} parallel threads sharing {DRIVER_POOL_SIZE} browsers for Goodreads scraping")
             
-            for i, publisher in enumerate(publishers):
-                actual_index = START_FROM_PUBLISHER + i
-                logger.info(f"Processing publisher {actual_index + 1}/{len(publishers_df)}: {publisher}")
-                
-                # Get authors from APIs
-                google_authors = self.get_google_books_authors(publisher, max_authors=25)
-                openlibrary_authors = self.get_openlibrary_authors(publisher, max_authors=15)
-                
-                # Combine and deduplicate
-                all_authors = google_authors + openlibrary_authors
-                unique_authors = {}
-                
-                for author_data in all_authors:
-                    author_name = author_data['name']
-                    if author_name not in unique_authors:
-                        unique_authors[author_name] = author_data
-                
-                final_authors = list(unique_authors.values())[:40]
-                
-                if final_authors:
-                    # Process authors in parallel
-                    logger.info(f"  Processing {len(final_authors)} authors in parallel...")
-                    batch_results = self.process_authors_parallel(final_authors, publisher)
+            # One enrichment queue for all publishers: each normalized author name is looked up once
+            enricher = AuthorEnricher(self.enrich_author, MAX_WORKERS)
+            # (index, publisher, authors, futures), finished and saved in input order
+            pending = deque()
+            
+            try:
+                for i, publisher in enumerate(publishers):
+                    actual_index = START_FROM_PUBLISHER + i
+                    logger.info(f"Processing publisher {actual_index + 1}/{len(publishers_df)}: {publisher}")
                     
-                    # Thread-safe results addition
-                    with self.results_lock:
-                        self.results.extend(batch_results)
-                
-                # Save progress frequently
-                self.save_results()
-                logger.info(f"Progress saved after {actual_index + 1}: {publisher}")
+                    # Get authors from both APIs at once
+                    google_authors, openlibrary_authors = self.get_publisher_authors(publisher)
+                    
+                    # Combine and deduplicate (by normalized name)
+                    all_authors = google_authors + openlibrary_authors
+                    unique_authors = {}
+                    
+                    for author_data in all_authors:
+                        author_key = normalize_author_name(author_data['name'])
+                        if author_key not in unique_authors:
+                            unique_authors[author_key] = author_data
+                    
+                    final_authors = list(unique_authors.values())[:40]
+                    
+                    # Queue the authors; names already seen under another publisher reuse that lookup
+                    logger.info(f"  Queued {len(final_authors)} authors for enrichment...")
+                    futures = [enricher.submit(author_data['name']) for author_data in final_authors]
+                    pending.append((actual_index, publisher, final_authors, futures))
+                    
+                    # Save publishers whose authors are all enriched; never run more than PUBLISHERS_AHEAD ahead
+                    while pending and (len(pending) > PUBLISHERS_AHEAD or all(f.done() for f in pending[0][3])):
+                        self.finish_publisher(*pending.popleft())
+                    
+                    # Shorter delay between publishers
+                    time.sleep(random.uniform(2, 4))
                 
-                # Shorter delay between publishers
-                time.sleep(random.uniform(2, 4))
+                while pending:
+                    self.finish_publisher(*pending.popleft())
+            finally:
+                enricher.close()
+                logger.info(f"Enrichment: {enricher.rows} author rows, {enricher.unique} unique authors, "
+                            f"{enricher.duplicates_avoided} duplicate lookups avoided")
             
             self.save_results()
             logger.info("Processing completed!")
@@ -434,13 +461,15 @@ class PublisherAuthorScraper:
     
     def cleanup(self):
         """Clean up resources"""
-        for driver in self.driver_pool:
-            if driver:
-                try:
-                    driver.quit()
-                except:
-                    pass
-        self.session.close()
+        logger.info(f"WebDriver pool: {self.driver_pool.summary()}")
+        self.driver_pool.close()
+        logger.info(f"API requests per host: {dict(self.http.requests)}")
+        for host, stats in self.limiter.stats().items():
+            logger.info(f"Rate limiter {host}: {stats}")
+        self.http.close()
+        if self.cache is not None:
+            logger.info(f"API response cache: {dict(self.cache.stats)}, {len(self.cache):,} entries in {CACHE_PATH}")
+            self.cache.close()
 
 def main():
     INPUT_CSV_PATH = "publishers.csv"
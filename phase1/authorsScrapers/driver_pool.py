@@ -0,0 +1,187 @@
+"""
+Bounded pool of Selenium WebDrivers for the Goodreads scrape.
+
+Idle browsers wait in a blocking queue. `checkout()` hands one browser to
+exactly one thread, and returns it when the `with` block ends. A thread
+that finds the pool empty waits for a free browser, up to `checkout_timeout`
+seconds, and then gets a TimeoutError. So the number of browsers is set
+independently of the number of worker threads:
+
+  * a browser is started lazily, the first time its slot is checked out
+    (or up front with `warm()`)
+  * on checkout, an idle browser is health-checked with a trivial script;
+    a dead or hung browser is quit and replaced
+  * after `max_page_loads` page loads, a browser is quit and restarted, so
+    Chrome's memory growth over a long run stays bounded
+  * a WebDriverException raised inside the `with` block marks the browser
+    as crashed, and it is replaced before anyone else gets it
+  * a browser that cannot be started raises DriverStartError, whatever the
+    factory raised
+
+Each slot keeps its own --remote-debugging-port across restarts.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+from selenium.common.exceptions import WebDriverException
+
+logger = logging.getLogger(__name__)
+
+# restart a browser after this many page loads
+MAX_PAGE_LOADS = 200
+# seconds a thread waits for a free browser
+CHECKOUT_TIMEOUT = 120
+
+
+class DriverStartError(Exception):
+    """The factory could not start a browser for a pool slot"""
+
+
+class PooledDriver:
+    """A pool slot: the browser (or None before it starts) and its page-load count"""
+
+    def __init__(self, slot: int):
+        self.slot = slot
+        self.driver = None
+        self.page_loads = 0
+        self.crashed = False
+
+    def get(self, url: str):
+        """Load a page, counting it toward the recycle limit"""
+        self.page_loads += 1
+        self.driver.get(url)
+
+    def __getattr__(self, name):
+        # everything else (find_elements, current_url, ...) goes to the WebDriver
+        return getattr(self.driver, name)
+
+
+class DriverPool:
+    def __init__(self, factory: Callable[[int], object], size: int, max_page_loads: int = MAX_PAGE_LOADS,
+                 checkout_timeout: float = CHECKOUT_TIMEOUT):
+        """`factory(slot)` starts a new WebDriver for the given slot number"""
+        if size < 1:
+            raise ValueError(f"pool size must be at least 1, got {size}")
+        self.factory = factory
+        self.size = size
+        self.max_page_loads = max_page_loads
+        self.checkout_timeout = checkout_timeout
+        self._idle: "queue.Queue[PooledDriver]" = queue.Queue(maxsize=size)
+        for slot in range(size):
+            self._idle.put(PooledDriver(slot))
+        self.stats: Counter = Counter()
+        self.wait_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _count(self, event: str, wait: float = 0.0):
+        with self._stats_lock:
+            self.stats[event] += 1
+            self.wait_seconds += wait
+
+    # 1.  BROWSER LIFECYCLE
+    def _start(self, lease: PooledDriver):
+        try:
+            lease.driver = self.factory(lease.slot)
+        except Exception as e:
+            raise DriverStartError(f"WebDriver {lease.slot + 1} failed to start: {e}") from e
+        lease.page_loads = 0
+        lease.crashed = False
+        self._count("started")
+        logger.info(f"Chrome WebDriver {lease.slot + 1} initialized successfully")
+
+    def _stop(self, lease: PooledDriver, reason: str):
+        if lease.driver is not None:
+            try:
+                lease.driver.quit()
+            except Exception:
+                pass
+            self._count(reason)
+        lease.driver = None
+
+    @staticmethod
+    def healthy(lease: PooledDriver) -> bool:
+        """True if the browser still answers a trivial script"""
+        try:
+            return lease.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _ready(self, lease: PooledDriver):
+        """Replace a crashed, dead or worn-out browser; start one if the slot is empty"""
+        if lease.driver is not None and (lease.crashed or not self.healthy(lease)):
+            logger.warning(f"WebDriver {lease.slot + 1} is unresponsive, restarting it")
+            self._stop(lease, "crashed")
+        if lease.driver is None:
+            self._start(lease)
+
+    # 2.  CHECKOUT / RETURN
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None) -> Iterator[PooledDriver]:
+        """
+        Exclusive use of one browser for the `with` block. Raises TimeoutError
+        if none is free in time, and DriverStartError if a browser cannot be
+        started.
+        """
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        try:
+            lease = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            self._count("timeouts", time.monotonic() - start)
+            raise TimeoutError(f"no WebDriver free within {timeout:g} s") from None
+        self._count("checkouts", time.monotonic() - start)
+        try:
+            self._ready(lease)
+            yield lease
+        except WebDriverException:
+            lease.crashed = True
+            raise
+        finally:
+            self._return(lease)
+
+    def _return(self, lease: PooledDriver):
+        if lease.crashed:
+            # quit now rather than at the next checkout, so a dead browser does not hold memory
+            self._stop(lease, "crashed")
+        elif lease.page_loads >= self.max_page_loads:
+            self._stop(lease, "recycled")
+        self._idle.put(lease)
+
+    # 3.  SETUP / TEARDOWN
+    def warm(self) -> int:
+        """Start every browser now; returns how many started"""
+        leases = []
+        try:
+            while len(leases) < self.size:
+                lease = self._idle.get_nowait()
+                leases.append(lease)
+                if lease.driver is None:
+                    try:
+                        self._start(lease)
+                    except DriverStartError as e:
+                        logger.error(f"Failed to initialize WebDriver {lease.slot + 1}: {e}")
+        except queue.Empty:
+            pass
+        finally:
+            for lease in leases:
+                self._idle.put(lease)
+        return sum(lease.driver is not None for lease in leases)
+
+    def summary(self) -> Dict[str, float]:
+        with self._stats_lock:
+            return {**self.stats, "wait_seconds": round(self.wait_seconds, 2)}
+
+    def close(self):
+        """Quit every idle browser. Call it once all checkouts have returned."""
+        while True:
+            try:
+                lease = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._stop(lease, "closed")
@@ -0,0 +1,116 @@
+"""
+Local stand-in for Google Books and OpenLibrary that replays recorded
+responses, so the scraper's HTTP layer can be exercised offline.
+
+Recordings are JSON Lines, as written by AsyncFetcher(record_path=...)
+(RECORD_RESPONSES in author_scraper_fast.py). Each line holds one response:
+{"url", "params", "status", "headers", "body"}. A request matches a
+recording by path and sorted query parameters (async_http.path_key). The
+host is ignored, because the Google Books and OpenLibrary paths do not
+overlap. If one request was recorded several times, the responses are
+replayed in order, and the last one repeats. Unrecorded requests get a 404.
+A conditional request whose If-None-Match equals the recorded ETag gets a
+304, as it would from the real API.
+
+Point the scraper at the server with API_BASE_URL = "http://127.0.0.1:8800".
+
+Usage:
+    python fake_api_server.py recorded_responses.jsonl
+    python fake_api_server.py recorded_responses.jsonl --port 8800 --delay 0.2
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+
+from async_http import path_key
+
+DEFAULT_PORT = 8800
+
+
+def load_recordings(path: Path) -> Dict[str, List[dict]]:
+    """path_key -> recorded responses, in recording order"""
+    recordings = defaultdict(list)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                recordings[path_key(record["url"], record.get("params"))].append(record)
+    return dict(recordings)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    # set by make_server
+    recordings: Dict[str, List[dict]] = {}
+    delay = 0.0
+    hits: Counter = Counter()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        key = path_key(self.path)
+        with self.lock:
+            replayed = self.hits[key]
+            self.hits[key] += 1
+        responses = self.recordings.get(key)
+        if self.delay:
+            time.sleep(self.delay)
+        if not responses:
+            self._send(404, {"Content-Type": "application/json"}, json.dumps({"error": f"not recorded: {key}"}))
+            return
+        record = responses[min(replayed, len(responses) - 1)]
+        headers = record.get("headers") or {}
+        etag = headers.get("ETag")
+        if etag and self.headers.get("If-None-Match") == etag:
+            self._send(304, {"ETag": etag}, "")
+            return
+        self._send(record["status"], headers, record["body"])
+
+    def _send(self, status: int, headers: Dict[str, str], body: str):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(recordings: Dict[str, List[dict]], host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                delay: float = 0.0) -> ThreadingHTTPServer:
+    """Server replaying `recordings`; port 0 picks a free port (see server.server_address)"""
+    handler = type("BoundReplayHandler", (ReplayHandler,), {
+        "recordings": recordings, "delay": delay, "hits": Counter(), "lock": threading.Lock(),
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", type=Path, help="recorded responses (.jsonl)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+
+    recordings = load_recordings(args.recordings)
+    server = make_server(recordings, args.host, args.port, args.delay)
+    print(f"Replaying {sum(map(len, recordings.values())):,} responses for {len(recordings):,} requests "
+          f"on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
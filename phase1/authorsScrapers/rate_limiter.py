@@ -0,0 +1,171 @@
+"""
+Per-host rate limiting for the scrapers: token buckets, adaptive rates and
+retry backoff.
+
+Every host (googleapis.com, openlibrary.org, goodreads.com, ...) has its own
+token bucket, so a slow or throttling host never stalls the others:
+
+  * a bucket refills at the host's current rate (requests/s), and holds up
+    to `burst` tokens, so a quiet host can take a short burst at once
+  * `reserve(host)` takes a token and returns how long the caller must wait
+    for it. Async code awaits that delay and threads sleep it, so one
+    limiter serves the aiohttp layer and the Selenium page loads alike
+  * rates adapt AIMD-style. Each successful response adds about
+    ADDITIVE_INCREASE requests/s per second of traffic, up to the host's
+    ceiling. A 429 or 503 halves the rate (down to MIN_RATE), and a
+    Retry-After header pauses the host for as long as it asks
+  * failed requests are retried with jittered exponential backoff
+    (`backoff_delay`), never sooner than a Retry-After asks
+
+`stats()` reports, per host, the current rate, the requests, throttled
+responses and retries seen, and the seconds spent waiting on the bucket and
+in backoff (summed over requests). Those numbers are for tuning HOST_RATES
+toward the highest sustained rate a host tolerates.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+# host: (starting requests/s, burst, ceiling requests/s)
+HOST_RATES = {
+    "www.googleapis.com": (10.0, 20, 20.0),
+    "openlibrary.org": (4.0, 8, 8.0),
+    "www.goodreads.com": (2.0, 4, 4.0),
+}
+DEFAULT_RATE = (2.0, 4, 4.0)
+# lowest rate multiplicative decrease can reach
+MIN_RATE = 0.2
+# requests/s gained per second of successful traffic
+ADDITIVE_INCREASE = 0.5
+MULTIPLICATIVE_DECREASE = 0.5
+
+# responses that mean "slow down"; they cut the rate
+THROTTLE_STATUSES = {429, 503}
+# responses worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+# longest Retry-After honoured, in seconds
+MAX_RETRY_AFTER = 300.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or an HTTP date), capped; None if absent or invalid"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        seconds = float(value)
+    else:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Seconds before retry `attempt` (0-based): jittered exponential backoff, at least Retry-After"""
+    ceiling = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)
+    delay = random.uniform(ceiling / 2, ceiling)
+    return max(delay, retry_after or 0.0)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int, max_rate: float):
+        self.rate = rate
+        self.burst = burst
+        self.max_rate = max(max_rate, rate)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        # Retry-After: no token is handed out before this time
+        self.paused_until = 0.0
+
+    def reserve(self, now: float) -> float:
+        """Take one token; seconds until it is available (tokens may go negative: later callers queue behind)"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def increase(self):
+        self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE / self.rate)
+
+    def decrease(self, now: float, retry_after: Optional[float]):
+        self.rate = max(MIN_RATE, self.rate * MULTIPLICATIVE_DECREASE)
+        # drop any saved-up burst: the host just said it is overloaded
+        self.tokens = min(self.tokens, 0.0)
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+
+class HostRateLimiter:
+    def __init__(self, host_rates: Optional[Dict[str, Tuple[float, int, float]]] = None):
+        self.host_rates = {**HOST_RATES, **(host_rates or {})}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host: str) -> TokenBucket:
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(*self.host_rates.get(host, DEFAULT_RATE))
+            self._stats[host] = dict.fromkeys(
+                ("requests", "throttled", "retries", "wait_seconds", "backoff_seconds"), 0
+            )
+        return self._buckets[host]
+
+    # 1.  BEFORE A REQUEST
+    def reserve(self, host: str) -> float:
+        """Take a token for `host`; the caller must wait the returned seconds before sending"""
+        with self._lock:
+            wait = self._bucket(host).reserve(time.monotonic())
+            self._stats[host]["requests"] += 1
+            self._stats[host]["wait_seconds"] += wait
+        return wait
+
+    def wait(self, host: str):
+        """Blocking form of reserve(), for threads (e.g. Selenium page loads)"""
+        delay = self.reserve(host)
+        if delay > 0:
+            time.sleep(delay)
+
+    # 2.  AFTER A RESPONSE
+    def observe(self, host: str, status: Optional[int], retry_after: Optional[str] = None) -> Optional[float]:
+        """
+        Adapt the host's rate to a response (status None for a network
+        error). Returns the Retry-After delay in seconds, if one was sent.
+        """
+        delay = parse_retry_after(retry_after)
+        with self._lock:
+            bucket = self._bucket(host)
+            if status in THROTTLE_STATUSES:
+                bucket.decrease(time.monotonic(), delay)
+                self._stats[host]["throttled"] += 1
+            elif status is not None and status < 400:
+                bucket.increase()
+        return delay
+
+    def backoff(self, host: str, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry `attempt` (0-based) to `host`, counted in its stats"""
+        delay = backoff_delay(attempt, retry_after)
+        with self._lock:
+            self._bucket(host)
+            self._stats[host]["retries"] += 1
+            self._stats[host]["backoff_seconds"] += delay
+        return delay
+
+    # 3.  REPORTING
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                host: {
+                    "rate": round(self._buckets[host].rate, 2),
+                    **{name: round(value, 2) if isinstance(value, float) else value for name, value in stats.items()},
+                }
+                for host, stats in self._stats.items()
+            }
@@ -0,0 +1,113 @@
+"""
+Persistent cache of API responses for the scraper.
+
+Successful (200) responses are kept in one SQLite file (api_cache.sqlite3)
+in WAL mode, keyed by async_http.request_key: the normalized URL plus
+sorted query parameters. So a rerun after a crash, or an author who recurs
+under another publisher, is answered from disk:
+
+  * bodies are zlib-compressed; only the headers needed later are kept
+  * an entry younger than `ttl` seconds is served without any request
+  * an older entry with an ETag or Last-Modified header is revalidated:
+    the request carries If-None-Match / If-Modified-Since, and on a 304 the
+    stored body is served and its age is reset
+  * an older entry without validators is fetched again, and replaced
+
+Each entry is written in its own transaction, so a killed run keeps
+everything it fetched.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from multidict import CIMultiDict
+
+DEFAULT_CACHE_PATH = Path("api_cache.sqlite3")
+# seconds a stored response is served without asking the server
+DEFAULT_TTL = 7 * 24 * 3600
+# response headers stored with the body
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+COMPRESSION_LEVEL = 6
+
+
+class CachedResponse(NamedTuple):
+    status: int
+    headers: CIMultiDict
+    body: bytes
+    fresh: bool
+
+    def validators(self) -> Dict[str, str]:
+        """Conditional request headers for revalidating this entry"""
+        headers = {}
+        if "ETag" in self.headers:
+            headers["If-None-Match"] = self.headers["ETag"]
+        if "Last-Modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["Last-Modified"]
+        return headers
+
+
+class ResponseCache:
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " status INTEGER NOT NULL,"
+            " headers TEXT NOT NULL,"
+            " body BLOB NOT NULL,"
+            " fetched REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """The stored response for `key` (fresh or stale), or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, fetched FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            status, headers, body, fetched = row
+            fresh = time.time() - fetched < self.ttl
+            self.stats["hits" if fresh else "stale"] += 1
+        return CachedResponse(status, CIMultiDict(json.loads(headers)), zlib.decompress(body), fresh)
+
+    def put(self, key: str, status: int, headers, body: bytes):
+        """Store one response in its own transaction"""
+        kept = {name: headers[name] for name in CACHED_HEADERS if name in headers}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO responses (key, status, headers, body, fetched) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET status = excluded.status, headers = excluded.headers,"
+                " body = excluded.body, fetched = excluded.fetched",
+                (key, status, json.dumps(kept), zlib.compress(body, COMPRESSION_LEVEL), time.time()),
+            )
+            self._conn.commit()
+            self.stats["stored"] += 1
+
+    def touch(self, key: str):
+        """Reset an entry's age after the server confirmed it (304 Not Modified)"""
+        with self._lock:
+            self._conn.execute("UPDATE responses SET fetched = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.stats["revalidated"] += 1
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,288 @@
+"""
+Batch matching: rank publishers for many authors in one run.
+
+Reads author preferences from JSON Lines or CSV (one author per line/row)
+and writes the top-k publishers for each author. No prompts are involved.
+Authors are scored in blocks, each as an authors x publishers matrix
+(ScoringEngine.score_block). Only one block per worker is in memory at a
+time, so memory stays bounded however large the input is. Large inputs are
+spread over a process pool. Every worker memory-maps the same compiled
+catalog.
+
+Input fields (same meaning as the interactive prompts):
+    author_id        optional; defaults to the line/row number
+    user_location    free text, e.g. "Phoenix, Arizona"
+    subjects         list, or a comma-separated string
+    manuscript_needed, chapters_needed, requires_agent, peer_reviewed,
+    proposal_required, academic_focus, religious_focus
+                     "Y", "N", or blank/missing for no preference
+    genres, pages    optional; used by the similarity weight
+                     (e.g. --profile similar_books)
+
+Output is JSON Lines (one object per author with a ranked `matches` list),
+or CSV with one row per (author, rank) when the output path ends in .csv.
+
+Usage:
+    python batch_match.py authors.jsonl -o matches.jsonl
+    python batch_match.py authors.csv -o matches.csv --top-k 10 --workers 8
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from catalog import load_catalog
+from geocoder import GEOCODERS, make_geocoder
+from publisher_matcher import FLAG_MAP, GEOCODER, WEIGHT_PROFILES, geocode_location, load_cache
+from scoring_engine import ScoringEngine
+
+TOP_K = 5
+# rough working-set budget for one block of authors
+BLOCK_BYTES = 64 << 20
+# below this many authors the pool costs more than it saves
+POOL_MIN_AUTHORS = 2000
+
+# per-worker state, set by _init_worker
+_engine: Optional[ScoringEngine] = None
+_rows: Optional[np.ndarray] = None
+
+
+# 1.  INPUT
+def parse_preferences(record: dict) -> dict:
+    """Normalize one input record the way get_preferences normalizes answers"""
+    subjects = record.get("subjects") or []
+    if isinstance(subjects, str):
+        subjects = subjects.split(",")
+    prefs = {
+        "user_location": str(record.get("user_location") or record.get("location") or "").strip(),
+        "subjects": [s.strip().lower() for s in subjects if s.strip()],
+    }
+    for key in FLAG_MAP:
+        value = str(record.get(key) or "").strip().upper()
+        if value not in {"Y", "N", ""}:
+            raise ValueError(f"{key} must be Y, N or blank, got {record.get(key)!r}")
+        prefs[key] = value
+    genres = record.get("genres") or []
+    if isinstance(genres, str):
+        genres = genres.split(",")
+    prefs["genres"] = [g.strip().lower() for g in genres if g.strip()]
+    pages = str(record.get("pages") or "").strip()
+    if pages and not (pages.isdigit() and int(pages) > 0):
+        raise ValueError(f"pages must be a positive whole number, got {record.get('pages')!r}")
+    prefs["pages"] = int(pages) if pages else None
+    return prefs
+
+
+def read_authors(path: Path) -> Iterator[Tuple[str, dict]]:
+    """Yield (author_id, prefs) from a .jsonl or .csv file"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            records = enumerate(csv.DictReader(f), 1)
+        else:
+            records = ((n, json.loads(line)) for n, line in enumerate(f, 1) if line.strip())
+        for n, record in records:
+            try:
+                prefs = parse_preferences(record)
+            except ValueError as e:
+                raise ValueError(f"{path}:{n}: {e}") from None
+            yield str(record.get("author_id") or record.get("id") or n), prefs
+
+
+def count_authors(path: Path) -> int:
+    with open(path, "rb") as f:
+        lines = sum(1 for line in f if line.strip())
+    return lines - 1 if path.suffix.lower() == ".csv" else lines
+
+
+def block_size_for(engine: ScoringEngine) -> int:
+    """Authors per block so that one block's matrices fit in BLOCK_BYTES"""
+    per_author = engine.size * (4 * 8 + len(FLAG_MAP))
+    return max(1, BLOCK_BYTES // per_author)
+
+
+def iter_blocks(authors: Iterator[Tuple[str, dict]], block_size: int, cache, geocoder) -> Iterator[tuple]:
+    """
+    Group authors into blocks, geocoding each location in the parent process.
+    A block's locations are fetched from the cache in one query.
+    """
+    def geocoded(block):
+        cache.prefetch(prefs["user_location"] for _, prefs in block)
+        coords = [geocode_location(prefs["user_location"], cache, geocoder) for _, prefs in block]
+        return tuple(zip(*block)) + (tuple(coords),)
+
+    block = []
+    for author in authors:
+        block.append(author)
+        if len(block) == block_size:
+            yield geocoded(block)
+            block = []
+    if block:
+        yield geocoded(block)
+
+
+# 2.  SCORING (runs in the workers)
+def top_k_rows(scores: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+    """
+    Per row, the k best (column, match_percent) with match_percent > 0, best
+    first, ties in catalog order - the same selection as ScoringEngine.rank
+    """
+    percents = np.round(scores, 1)
+    n = percents.shape[1]
+    k = min(k, n)
+    if k == 0:
+        return [[] for _ in percents]
+    # the k-th best value per row; everything tied with it is a candidate, so ties can be broken by catalog order
+    thresholds = np.partition(percents, n - k, axis=1)[:, n - k]
+    results = []
+    for row, threshold in zip(percents, thresholds):
+        cols = np.flatnonzero((row >= threshold) & (row > 0))
+        cols = cols[np.lexsort((cols, -row[cols]))][:k]
+        results.append([(int(c), float(row[c])) for c in cols])
+    return results
+
+
+def _init_worker(csv_path: Path):
+    global _engine, _rows
+    catalog = load_catalog(csv_path, rebuild=False)
+    _rows = np.flatnonzero(~catalog.flag_is("in_house", "Y"))  # exclude in‑house only
+    _engine = ScoringEngine.from_catalog(catalog, _rows)
+
+
+def _match_block(block: tuple, k: int, weights: Dict[str, float]) -> List[List[Tuple[int, float]]]:
+    _, prefs_list, coords_list = block
+    top = top_k_rows(_engine.score_block(list(prefs_list), list(coords_list), weights), k)
+    return [[(int(_rows[col]), percent) for col, percent in matches] for matches in top]
+
+
+def run_blocks(blocks: Iterator[tuple], k: int, workers: int, csv_path: Path,
+               weights: Dict[str, float]) -> Iterator[tuple]:
+    """Yield (block, top-k per author) in input order"""
+    if workers == 0:
+        _init_worker(csv_path)
+        for block in blocks:
+            yield block, _match_block(block, k, weights)
+        return
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    with context.Pool(workers, initializer=_init_worker, initargs=(csv_path,)) as pool:
+        # at most two blocks per worker in flight, so reading never runs far ahead
+        pending = deque()
+        for block in blocks:
+            pending.append((block, pool.apply_async(_match_block, (block, k, weights))))
+            if len(pending) >= 2 * workers:
+                block, result = pending.popleft()
+                yield block, result.get()
+        while pending:
+            block, result = pending.popleft()
+            yield block, result.get()
+
+
+# 3.  OUTPUT
+class ResultWriter:
+    CSV_FIELDS = ["author_id", "rank", "publisher", "match_percent", "location", "website"]
+
+    def __init__(self, path: Path, catalog):
+        self.catalog = catalog
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.csv = None
+        if path.suffix.lower() == ".csv":
+            self.csv = csv.writer(self.file)
+            self.csv.writerow(self.CSV_FIELDS)
+        self.records: Dict[int, Dict[str, str]] = {}
+
+    def record(self, row: int) -> Dict[str, str]:
+        if row not in self.records:
+            self.records[row] = self.catalog.record(row)
+        return self.records[row]
+
+    def write(self, author_id: str, prefs: dict, coords, matches: List[Tuple[int, float]]):
+        ranked = [
+            {
+                "rank": rank,
+                "publisher": self.record(row)["Publisher"],
+                "match_percent": percent,
+                "location": self.record(row)["Regional Preference/Origin Location"],
+                "website": self.record(row)["Website"],
+            }
+            for rank, (row, percent) in enumerate(matches, 1)
+        ]
+        if self.csv:
+            for match in ranked:
+                self.csv.writerow([author_id] + [match[field] for field in self.CSV_FIELDS[1:]])
+        else:
+            self.file.write(json.dumps({
+                "author_id": author_id,
+                "user_location": prefs["user_location"],
+                "geocoded": bool(coords),
+                "matches": ranked,
+            }, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+# 4.  MAIN
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", type=Path, help="author preferences (.jsonl or .csv)")
+    parser.add_argument("-o", "--output", type=Path, default=Path("matches.jsonl"),
+                        help="results (.jsonl, or .csv for one row per match)")
+    parser.add_argument("--csv", type=Path, default=Path("publishers.csv"), help="publishers CSV")
+    parser.add_argument("--top-k", type=int, default=TOP_K)
+    parser.add_argument("--block-size", type=int, default=None,
+                        help="authors scored per matrix block (default: sized to ~64 MB)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"worker processes (default: all CPUs from {POOL_MIN_AUTHORS:,} authors, else 0)")
+    parser.add_argument("--geocoder", choices=GEOCODERS, default=GEOCODER)
+    parser.add_argument("--profile", choices=WEIGHT_PROFILES, default="default", help="weight profile")
+    args = parser.parse_args()
+
+    for path in (args.input, args.csv):
+        if not path.exists():
+            print(f"File not found: {path.resolve()}")
+            sys.exit(1)
+    if args.top_k < 1:
+        parser.error("--top-k must be at least 1")
+
+    geocoder = make_geocoder(args.geocoder)
+    catalog = load_catalog(args.csv, geocoder=geocoder)
+    n_authors = count_authors(args.input)
+    workers = args.workers
+    if workers is None:
+        workers = (os.cpu_count() or 1) if n_authors >= POOL_MIN_AUTHORS else 0
+    block_size = args.block_size or block_size_for(ScoringEngine.from_catalog(catalog))
+
+    cache = load_cache()
+    writer = ResultWriter(args.output, catalog)
+    start = time.perf_counter()
+    done = located = 0
+    try:
+        blocks = iter_blocks(read_authors(args.input), block_size, cache, geocoder)
+        for block, results in run_blocks(blocks, args.top_k, workers, args.csv, WEIGHT_PROFILES[args.profile]):
+            for author_id, prefs, coords, matches in zip(*block, results):
+                writer.write(author_id, prefs, coords, matches)
+                located += bool(coords)
+            done += len(results)
+            print(f"\r   {done:,}/{n_authors:,} authors", end="", file=sys.stderr, flush=True)
+    finally:
+        writer.close()
+        cache.close()
+    elapsed = time.perf_counter() - start
+    print(file=sys.stderr)
+    print(f"Matched {done:,} authors against {catalog.size:,} publishers in {elapsed:.2f} s "
+          f"({workers or 'no'} workers, blocks of {block_size:,}); {done - located:,} locations not geocoded")
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
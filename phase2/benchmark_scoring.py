@@ -0,0 +1,176 @@
+"""
+Benchmark: row-by-row score_publisher vs the vectorized ScoringEngine.
+
+Builds a synthetic catalog (default 100k publishers) with random locations,
+subjects and flags. The coordinates are pre-seeded into the geocoding cache,
+so nothing goes to the network. The legacy df.apply path is timed on a
+subset (`--legacy-rows`) and extrapolated. Both paths must give identical
+match_percent values on that subset. Top-k ranking with pruning
+(ScoringEngine.top_k) is compared against scoring everything and sorting,
+and re-ranking under every weight profile from cached components
+(ScoringEngine.rank) against calling top_k once per profile. Batch mode
+(score_block + batch_match.top_k_rows) is checked against top_k on authors
+with few preferences, where many publishers tie for the last places.
+Publisher subjects listed as "X and Y" must match when typed verbatim as
+well as one part at a time.
+
+The exit status is 1 if any of these checks fails.
+
+Usage:
+    python benchmark_scoring.py [--rows 100000] [--legacy-rows 5000]
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch_match import top_k_rows
+from publisher_matcher import FLAG_MAP, WEIGHT_PROFILES, score_publisher
+from scoring_engine import LOCATION_COL, ScoringEngine
+from subject_index import SubjectIndex
+
+SUBJECTS = [
+    "fiction", "poetry", "history", "science fiction", "fantasy", "romance", "mystery & crime",
+    "young adult", "children's", "biography", "memoir", "religion", "philosophy", "education",
+    "art", "photography", "cooking", "travel", "business", "economics", "law", "politics",
+    "science", "mathematics", "medicine", "nature", "sports", "music", "drama", "essays",
+]
+
+
+def synthetic_catalog(rows, n_locations=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    locations = [f"Town {i}, Synthland" for i in range(n_locations)]
+    cache = {
+        loc: (float(lat), float(lon))
+        for loc, lat, lon in zip(locations, rng.uniform(25, 49, n_locations), rng.uniform(-124, -67, n_locations))
+    }
+    # a few unresolvable locations, like real data
+    for loc in locations[:50]:
+        cache[loc] = None
+
+    subject_lists = [
+        list(rng.choice(SUBJECTS, size=rng.integers(0, 8), replace=False)) for _ in range(rows)
+    ]
+    df = pd.DataFrame({
+        "Publisher": [f"Press {i}" for i in range(rows)],
+        LOCATION_COL: rng.choice(locations, size=rows),
+        "Subjects": [", ".join(s) for s in subject_lists],
+        "Subjects_list": subject_lists,
+    })
+    for col in FLAG_MAP.values():
+        df[col] = rng.choice(["Y", "N", "NONE"], size=rows, p=[0.3, 0.65, 0.05])
+    return df, cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--legacy-rows", type=int, default=5_000)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    df, cache = synthetic_catalog(args.rows)
+    prefs = {
+        "user_location": "Town 77, Synthland",
+        "subjects": ["fiction", "poetry", "history"],
+        "manuscript_needed": "Y",
+        "chapters_needed": "Y",
+        "requires_agent": "N",
+        "peer_reviewed": "",
+        "proposal_required": "Y",
+        "academic_focus": "N",
+        "religious_focus": "N",
+    }
+    user_coords = cache[prefs["user_location"]]
+
+    start = time.perf_counter()
+    engine = ScoringEngine.from_dataframe(df, cache.get)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast = engine.score(prefs, user_coords)
+    vectorized = time.perf_counter() - start
+
+    # top-k: full score + sort vs pruned, both with a cold distance cache
+    engine.row_cache.clear()
+    start = time.perf_counter()
+    percents = np.round(engine.score(prefs, user_coords), 1)
+    positive = np.flatnonzero(percents > 0)
+    ranked = positive[np.lexsort((positive, -percents[positive]))][: args.top_k]
+    sorted_time = time.perf_counter() - start
+    engine.row_cache.clear()
+    start = time.perf_counter()
+    top = engine.top_k(prefs, user_coords, args.top_k)
+    pruned_time = time.perf_counter() - start
+    same_top = top == [(int(i), float(percents[i])) for i in ranked]
+
+    # weight profiles: top_k per profile vs cached components + one dot product each
+    engine.row_cache.clear()
+    start = time.perf_counter()
+    per_profile = [engine.top_k(prefs, user_coords, args.top_k, w) for w in WEIGHT_PROFILES.values()]
+    profiles_time = time.perf_counter() - start
+    engine.row_cache.clear()
+    start = time.perf_counter()
+    engine.components(prefs, user_coords)
+    components_time = time.perf_counter() - start
+    start = time.perf_counter()
+    reranked = [engine.rank(prefs, user_coords, args.top_k, w) for w in WEIGHT_PROFILES.values()]
+    rerank_time = (time.perf_counter() - start) / len(WEIGHT_PROFILES)
+
+    # batch mode on tie-heavy authors: no subjects and mostly blank flags
+    rng = np.random.default_rng(1)
+    locations = df[LOCATION_COL].unique()
+    tie_prefs = [
+        {**prefs, "user_location": str(rng.choice(locations)), "subjects": [],
+         **{key: str(rng.choice(["Y", "N", ""], p=[0.1, 0.1, 0.8])) for key in FLAG_MAP}}
+        for _ in range(200)
+    ]
+    tie_coords = [cache[p["user_location"]] for p in tie_prefs]
+    batch = top_k_rows(engine.score_block(tie_prefs, tie_coords), args.top_k)
+    batch_same = batch == [engine.top_k(p, c, args.top_k) for p, c in zip(tie_prefs, tie_coords)]
+
+    # publisher subjects joined with "and", typed whole and in parts
+    joined = ["History and Politics", "Fantasy and Science Fiction", "Feminism and LGBTQ+", "Poetry"]
+    index = SubjectIndex(joined, np.arange(len(joined) + 1), np.arange(len(joined)), len(joined))
+    typed = {"history and politics": [0], "Fantasy and Science Fiction": [1], "feminism and lgbtq+": [2],
+             "politics": [0], "science fiction": [1], "poetry": [3]}
+    and_same = all(index.matches([term])[0].tolist() == expected for term, expected in typed.items())
+
+    subset = df.head(args.legacy_rows)
+    start = time.perf_counter()
+    legacy = subset.apply(lambda row: score_publisher(row, prefs, cache, user_coords), axis=1)
+    legacy_time = (time.perf_counter() - start) * len(df) / len(subset)
+
+    same = np.array_equal(legacy.round(1).to_numpy(), pd.Series(fast[: len(subset)]).round(1).to_numpy())
+    print(f"catalog rows           : {len(df):,}")
+    print(f"engine build           : {build:.3f} s (once per catalog)")
+    print(f"vectorized score       : {vectorized * 1000:.1f} ms")
+    print(f"df.apply (extrapolated): {legacy_time:.1f} s")
+    print(f"speedup                : {legacy_time / vectorized:,.0f}x")
+    print(f"match_percent identical on {len(subset):,} rows: {same}")
+    print(f"top-{args.top_k} via full sort     : {sorted_time * 1000:.1f} ms")
+    print(f"top-{args.top_k} with pruning      : {pruned_time * 1000:.1f} ms (same ranking: {same_top})")
+    print(f"top_k x {len(WEIGHT_PROFILES)} profiles      : {profiles_time * 1000:.1f} ms")
+    print(f"cached components      : {components_time * 1000:.1f} ms (once per preference set)")
+    print(f"re-rank per profile    : {rerank_time * 1000:.1f} ms (same ranking: {reranked == per_profile})")
+    print(f"batch top-{args.top_k} vs top_k    : same ranking for {len(tie_prefs)} tie-heavy authors: {batch_same}")
+    print(f"'X and Y' subjects      : match typed whole and in parts: {and_same}")
+
+    checks = {
+        "match_percent identical": same,
+        "top_k ranking": same_top,
+        "re-rank from cached components": reranked == per_profile,
+        "batch top-k vs top_k": batch_same,
+        "'X and Y' subjects": and_same,
+    }
+    failed = [name for name, ok in checks.items() if not ok]
+    if failed:
+        print(f"FAILED: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Precompiled publisher catalog.
+
+`build-catalog` compiles publishers.csv into a single uncompressed .npz
+(publishers.catalog.npz) holding everything matching needs, already
+parsed:
+
+  * lat / lon          - resolved coordinates (NaN where unresolved)
+  * flag_yes / flag_no - uint16 bitmasks, bit j set when FLAG_COLUMNS[j] is
+                         "Y" / "N" (other values such as "CHRISTIAN" set neither)
+  * subject_indptr / subject_indices
+                       - integer subject IDs per publisher (CSR)
+  * string table       - one UTF-8 blob + offsets; display columns and the
+                         subject vocabulary are int32 IDs into it
+  * evidence_* / genre_*
+                       - per-publisher aggregates of the phase 1 author data
+                         (publisher_evidence.py): author and work counts, mean
+                         rating, median pages, genre counts
+  * geocoder           - name of the geocoder that resolved the coordinates
+  * source_sha256      - hash of the CSV, the author data and the geocoder
+                         name the artifact was built from
+
+Members are stored uncompressed, so `load_catalog` memory-maps each array
+straight out of the zip instead of reading it, and start-up costs a hash of
+the CSVs plus a few page faults. The artifact is rebuilt automatically when
+the hash no longer matches, including when a caller asks for a different
+geocoder than the one it was built with.
+
+    python catalog.py build-catalog [publishers.csv] [--geocoder offline]
+    python catalog.py info [publishers.csv]
+"""
+
+import argparse
+import hashlib
+import os
+import struct
+import sys
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from publisher_matcher import FLAG_MAP, GEOCODER, geocode_location, get_geocoder, load_cache, load_publishers
+from geocoder import GEOCODERS, make_geocoder
+from publisher_evidence import AUTHORS_CSV, aggregate_authors, empty_aggregates
+
+# bump when the layout changes, so old artifacts are rebuilt
+CATALOG_VERSION = 3
+
+LOCATION_COL = "Regional Preference/Origin Location"
+FLAG_COLUMNS = list(FLAG_MAP.values()) + ["in_house"]
+# display columns kept in the string table: artifact name -> CSV column
+STRING_COLUMNS = {
+    "publisher": "Publisher",
+    "location": LOCATION_COL,
+    "website": "Website",
+    "subjects": "Subjects",
+}
+
+
+def catalog_path(csv_path: Path) -> Path:
+    return Path(csv_path).with_suffix(".catalog.npz")
+
+
+def source_hash(csv_path: Path, authors_csv: Optional[Path] = AUTHORS_CSV, geocoder: str = "") -> str:
+    """sha256 of the publishers CSV, the author data (when it exists) and the geocoder name"""
+    digest = hashlib.sha256(f"catalog-v{CATALOG_VERSION}\ngeocoder:{geocoder}\n".encode())
+    for path in (csv_path, authors_csv):
+        if path is None or not Path(path).exists():
+            digest.update(b"-")
+            continue
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class StringTable:
+    """Deduplicated strings -> int32 IDs, stored as one UTF-8 blob plus offsets"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.parts: List[bytes] = []
+
+    def add(self, value: str) -> int:
+        if value not in self.ids:
+            self.ids[value] = len(self.parts)
+            self.parts.append(value.encode("utf-8"))
+        return self.ids[value]
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        offsets = np.zeros(len(self.parts) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(part) for part in self.parts])
+        return {
+            "strings_data": np.frombuffer(b"".join(self.parts), dtype=np.uint8),
+            "strings_offsets": offsets,
+        }
+
+
+# 1.  BUILD
+def build_catalog(csv_path: Path, out_path: Optional[Path] = None, geocoder=None,
+                  authors_csv: Optional[Path] = AUTHORS_CSV) -> Path:
+    csv_path = Path(csv_path)
+    out_path = Path(out_path or catalog_path(csv_path))
+    geocoder = geocoder or get_geocoder()
+    digest = source_hash(csv_path, authors_csv, geocoder.name)
+    df = load_publishers(csv_path)
+
+    locations = df[LOCATION_COL].astype(str).unique()
+    cache = load_cache()
+    cache.prefetch(locations)
+    coords = {loc: geocode_location(loc, cache, geocoder) for loc in locations}
+    cache.close()
+    lat = np.full(len(df), np.nan)
+    lon = np.full(len(df), np.nan)
+    for i, loc in enumerate(df[LOCATION_COL].astype(str)):
+        if coords[loc]:
+            lat[i], lon[i] = coords[loc]
+
+    flag_yes = np.zeros(len(df), dtype=np.uint16)
+    flag_no = np.zeros(len(df), dtype=np.uint16)
+    for bit, col in enumerate(FLAG_COLUMNS):
+        flag_yes |= (df[col] == "Y").to_numpy().astype(np.uint16) << bit
+        flag_no |= (df[col] == "N").to_numpy().astype(np.uint16) << bit
+
+    strings = StringTable()
+    subject_ids: Dict[str, int] = {}
+    indptr = [0]
+    indices: List[int] = []
+    for subjects in df["Subjects_list"]:
+        row = {subject_ids.setdefault(s, len(subject_ids)) for s in subjects}
+        indices.extend(sorted(row))
+        indptr.append(len(indices))
+    subject_names = np.array([strings.add(s) for s in subject_ids], dtype=np.int32)
+
+    arrays = {
+        "source_sha256": np.array(digest),
+        "geocoder": np.array(geocoder.name),
+        "lat": lat,
+        "lon": lon,
+        "flag_yes": flag_yes,
+        "flag_no": flag_no,
+        "subject_indptr": np.array(indptr, dtype=np.int64),
+        "subject_indices": np.array(indices, dtype=np.int32),
+        "subject_names": subject_names,
+    }
+    for name, col in STRING_COLUMNS.items():
+        arrays[name] = np.array([strings.add(str(v)) for v in df[col]], dtype=np.int32)
+
+    if authors_csv is not None and Path(authors_csv).exists():
+        evidence = aggregate_authors(authors_csv, df["Publisher"].astype(str).tolist())
+    else:
+        evidence = empty_aggregates(len(df))
+    evidence["genre_names"] = np.array([strings.add(g) for g in evidence["genre_names"]], dtype=np.int32)
+    arrays.update(evidence)
+    arrays.update(strings.arrays())
+
+    # write next to the target and swap in, so readers never see a partial file
+    # (per-process name: service workers may rebuild at the same time)
+    tmp = out_path.with_name(f"{out_path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, out_path)
+    return out_path
+
+
+# 2.  LOAD
+def mmap_npz(path: Path) -> Dict[str, np.ndarray]:
+    """Memory-map every member of an uncompressed .npz (np.load would read them)"""
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: {info.filename} is compressed and cannot be memory-mapped")
+            # the local file header is 30 bytes + name + extra field
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[: -len(".npy")]
+            if dtype.hasobject:
+                raise ValueError(f"{path}: {name} holds Python objects")
+            if not shape or 0 in shape:
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+            else:
+                arrays[name] = np.memmap(
+                    path, dtype=dtype, mode="r", offset=f.tell(), shape=shape, order="F" if fortran else "C"
+                )
+    return arrays
+
+
+class Catalog:
+    def __init__(self, arrays: Dict[str, np.ndarray], path: Optional[Path] = None):
+        self.arrays = arrays
+        self.path = path
+        self.source_sha256 = str(arrays["source_sha256"])
+        self.geocoder = str(arrays["geocoder"])
+        self.lat = arrays["lat"]
+        self.lon = arrays["lon"]
+        self.flag_yes = arrays["flag_yes"]
+        self.flag_no = arrays["flag_no"]
+        self.subject_indptr = arrays["subject_indptr"]
+        self.subject_indices = arrays["subject_indices"]
+        self.subject_names = [self.string(i) for i in arrays["subject_names"]]
+        self.genre_names = [self.string(i) for i in arrays["genre_names"]]
+
+    @property
+    def size(self) -> int:
+        return len(self.lat)
+
+    def string(self, i: int) -> str:
+        offsets = self.arrays["strings_offsets"]
+        return bytes(self.arrays["strings_data"][offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def flag_is(self, column: str, value: str = "Y") -> np.ndarray:
+        """Boolean mask of publishers whose `column` equals "Y" or "N" """
+        bits = self.flag_yes if value == "Y" else self.flag_no
+        return (bits >> FLAG_COLUMNS.index(column)) & 1 == 1
+
+    def record(self, row: int) -> Dict[str, str]:
+        """Display fields of one publisher, keyed by their CSV column names"""
+        return {col: self.string(self.arrays[name][row]) for name, col in STRING_COLUMNS.items()}
+
+    def evidence(self, row: int) -> Dict[str, Optional[float]]:
+        """Author-data aggregates of one publisher (None where there is no data)"""
+        rating, pages = float(self.arrays["evidence_rating"][row]), float(self.arrays["evidence_pages"][row])
+        return {
+            "authors": int(self.arrays["evidence_authors"][row]),
+            "works": int(self.arrays["evidence_works"][row]),
+            "mean_rating": None if np.isnan(rating) else round(rating, 2),
+            "median_pages": None if np.isnan(pages) else pages,
+        }
+
+
+def load_catalog(csv_path: Path, artifact: Optional[Path] = None, geocoder=None, rebuild: bool = True,
+                 authors_csv: Optional[Path] = AUTHORS_CSV) -> Catalog:
+    """
+    Memory-map the compiled catalog for `csv_path`, building it first if it is
+    missing or was built from a different version of the CSV or author data,
+    or with another geocoder than `geocoder` (any geocoder will do if None).
+    """
+    artifact = Path(artifact or catalog_path(csv_path))
+    if artifact.exists():
+        arrays = mmap_npz(artifact)
+        built_with = str(arrays["geocoder"]) if "geocoder" in arrays else ""
+        wanted = geocoder.name if geocoder is not None else built_with
+        if str(arrays["source_sha256"]) == source_hash(csv_path, authors_csv, wanted):
+            return Catalog(arrays, artifact)
+    if not rebuild:
+        raise FileNotFoundError(f"{artifact} is missing or stale; run `python catalog.py build-catalog`")
+    print(f"Building publisher catalog {artifact.name}...")
+    build_catalog(csv_path, artifact, geocoder, authors_csv)
+    return Catalog(mmap_npz(artifact), artifact)
+
+
+# 3.  CLI
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build-catalog", help="compile the publisher CSV into a catalog artifact")
+    build.add_argument("csv", nargs="?", type=Path, default=Path("publishers.csv"))
+    build.add_argument("--out", type=Path, default=None, help="artifact path (default: <csv>.catalog.npz)")
+    build.add_argument("--geocoder", choices=GEOCODERS, default=GEOCODER)
+    build.add_argument("--authors", type=Path, default=AUTHORS_CSV, help="phase 1 author data to aggregate")
+    build.add_argument("--force", action="store_true", help="rebuild even if the CSV is unchanged")
+    info = sub.add_parser("info", help="describe the catalog artifact")
+    info.add_argument("csv", nargs="?", type=Path, default=Path("publishers.csv"))
+    info.add_argument("--out", type=Path, default=None)
+    info.add_argument("--authors", type=Path, default=AUTHORS_CSV)
+    args = parser.parse_args()
+
+    if not args.csv.exists():
+        print(f"CSV not found: {args.csv.resolve()}")
+        sys.exit(1)
+    artifact = Path(args.out or catalog_path(args.csv))
+
+    if args.command == "build-catalog":
+        geocoder = make_geocoder(args.geocoder)
+        digest = source_hash(args.csv, args.authors, geocoder.name)
+        if not args.force and artifact.exists() and str(mmap_npz(artifact)["source_sha256"]) == digest:
+            print(f"{artifact} is up to date")
+            return
+        if not args.authors.exists():
+            print(f"   ⚠️  Author data not found ({args.authors}); building without publisher evidence")
+        start = time.perf_counter()
+        build_catalog(args.csv, artifact, geocoder, args.authors)
+        print(f"Built {artifact} in {time.perf_counter() - start:.2f} s ({artifact.stat().st_size:,} bytes)")
+    elif args.command == "info":
+        start = time.perf_counter()
+        catalog = load_catalog(args.csv, artifact, rebuild=False, authors_csv=args.authors)
+        elapsed = time.perf_counter() - start
+        print(f"artifact   : {artifact} ({artifact.stat().st_size:,} bytes)")
+        print(f"source hash: {catalog.source_sha256}")
+        print(f"geocoder   : {catalog.geocoder}")
+        print(f"publishers : {catalog.size:,} ({int(np.isnan(catalog.lat).sum())} without coordinates)")
+        print(f"subjects   : {len(catalog.subject_names):,}")
+        covered = int((catalog.arrays["evidence_authors"] > 0).sum())
+        print(f"evidence   : {covered:,} publishers with author data, {len(catalog.genre_names):,} genres")
+        print(f"load time  : {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
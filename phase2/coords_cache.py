@@ -0,0 +1,148 @@
+"""
+Crash-safe coordinate cache shared by the matcher, the catalog build and
+batch runs.
+
+Geocoded locations live in one SQLite file (coords_cache.sqlite3) in WAL
+mode, so several processes can read while one writes and a killed run never
+leaves a half-written file:
+
+  * every resolved location is upserted in its own transaction, so nothing
+    resolved before a crash is lost, and nothing else needs saving at exit
+  * a miss (None) is stored with its time and expires after `negative_ttl`,
+    so a name Nominatim could not resolve is retried later, not forever
+  * `prefetch(locations)` loads all the locations a run needs in one query;
+    lookups afterwards are answered from memory
+
+The object behaves like the dict the cache used to be (`in`, `[]`, `[]=`,
+`get`), so `geocode_location` takes either. The first time the cache is
+opened, any coords_cache.json next to it is imported.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+DEFAULT_CACHE_PATH = Path("coords_cache.sqlite3")
+# seconds before a failed lookup may be retried
+NEGATIVE_TTL = 30 * 24 * 3600
+# prefetched / looked-up entries kept in memory
+MEMO_SIZE = 100_000
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+Coords = Optional[Tuple[float, float]]
+
+
+class CoordsCache:
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, negative_ttl: float = NEGATIVE_TTL,
+                 legacy_json: Optional[Path] = None):
+        self.path = Path(path)
+        self.negative_ttl = negative_ttl
+        self.memo: Dict[str, Coords] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS coords ("
+            " location TEXT PRIMARY KEY,"
+            " lat REAL,"
+            " lon REAL,"
+            " updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        legacy_json = Path(legacy_json) if legacy_json else self.path.with_suffix(".json")
+        self._migrate(legacy_json)
+
+    def _migrate(self, legacy_json: Path):
+        """
+        Import coords_cache.json once; the marker keeps later opens from
+        re-importing. The check and the import share one write transaction, so
+        processes opening a new cache at the same time import it only once.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone():
+                    return
+                imported = 0
+                if legacy_json.exists():
+                    with open(legacy_json, "r", encoding="utf-8") as f:
+                        legacy = json.load(f)
+                    now = time.time()
+                    rows = [(loc, *(coords if coords else (None, None)), now) for loc, coords in legacy.items()]
+                    # entries already in SQLite are newer than the JSON file
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO coords (location, lat, lon, updated) VALUES (?, ?, ?, ?)", rows
+                    )
+                    imported = len(rows)
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO meta (key, value) VALUES ('migrated', ?)",
+                    [json.dumps({"from": str(legacy_json), "entries": imported, "at": time.time()})],
+                )
+                self._conn.commit()
+            finally:
+                if self._conn.in_transaction:
+                    self._conn.rollback()
+
+    def _fresh(self, lat, lon, updated: float) -> bool:
+        return lat is not None or time.time() - updated < self.negative_ttl
+
+    def _remember(self, location: str, coords: Coords):
+        if len(self.memo) >= MEMO_SIZE:
+            self.memo.clear()
+        self.memo[location] = coords
+
+    def prefetch(self, locations: Iterable[str]) -> Dict[str, Coords]:
+        """Load every cached location in `locations` with one query per 500; return the ones found"""
+        wanted = [loc for loc in dict.fromkeys(locations) if loc not in self.memo]
+        found: Dict[str, Coords] = {}
+        with self._lock:
+            for start in range(0, len(wanted), _QUERY_CHUNK):
+                group = wanted[start:start + _QUERY_CHUNK]
+                marks = ",".join("?" * len(group))
+                rows = self._conn.execute(
+                    f"SELECT location, lat, lon, updated FROM coords WHERE location IN ({marks})", group
+                ).fetchall()
+                for location, lat, lon, updated in rows:
+                    if self._fresh(lat, lon, updated):
+                        found[location] = None if lat is None else (lat, lon)
+        for location, coords in found.items():
+            self._remember(location, coords)
+        return found
+
+    def __contains__(self, location: str) -> bool:
+        return location in self.memo or location in self.prefetch([location])
+
+    def __getitem__(self, location: str) -> Coords:
+        if location not in self:
+            raise KeyError(location)
+        return self.memo[location]
+
+    def get(self, location: str, default: Coords = None) -> Coords:
+        return self[location] if location in self else default
+
+    def __setitem__(self, location: str, coords: Coords):
+        """Upsert one location in its own transaction"""
+        lat, lon = coords if coords else (None, None)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO coords (location, lat, lon, updated) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (location) DO UPDATE SET lat = excluded.lat, lon = excluded.lon,"
+                " updated = excluded.updated",
+                (location, lat, lon, time.time()),
+            )
+            self._conn.commit()
+        self._remember(location, None if coords is None else (lat, lon))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM coords").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,425 @@
+"""
+Pluggable geocoding backends for publisher_matcher.
+
+The default backend is an offline gazetteer: a bundled tab-separated file
+(gazetteer.tsv: name, latitude, longitude) mapping normalized city / state /
+country names to coordinates. On first use it is compiled into a sorted,
+fixed-width NumPy index (gazetteer.idx.npy) that is memory-mapped, so a
+lookup is a binary search and nothing is parsed at start-up. A query is
+resolved by:
+
+  1. exact match on the normalized name ("Hoboken, NJ, USA" and
+     "hoboken, nj, united states" are the same key)
+  2. fuzzy match (difflib) on the city part, among names with the same
+     first letter and the same state / country
+  3. the same two steps on shorter forms: "City, Country" and "City"
+     (city-only names are only in the gazetteer when they are unambiguous).
+     A shorter form is only accepted when the gazetteer lists the dropped
+     state / country for the place it finds, so "Portland, Maine" is not
+     answered with Portland, Oregon; such names are left to Nominatim
+
+Nominatim is kept as an optional, rate-limited fallback for names the
+gazetteer does not know. Backends are chosen with `make_geocoder`:
+
+    make_geocoder("offline")    # gazetteer only, never touches the network
+    make_geocoder("auto")       # gazetteer, then Nominatim
+    make_geocoder("nominatim")  # Nominatim only (the old behaviour)
+
+Any object with a `geocode(location) -> (lat, lon) | None` method can be
+passed to `publisher_matcher.geocode_location` instead.
+
+The bundled gazetteer is built from the resolved entries of
+coords_cache.json; a GeoNames dump (e.g. cities15000.txt) can be merged in
+for wider coverage:
+
+    python geocoder.py build
+    python geocoder.py build --geonames cities15000.txt --countries countryInfo.txt --admin1 admin1CodesASCII.txt
+    python geocoder.py lookup "Phoenix, Arizona"
+"""
+
+import argparse
+import csv
+import difflib
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+GAZETTEER_FILE = HERE / "gazetteer.tsv"
+CACHE_FILE = HERE / "coords_cache.json"
+
+# difflib ratio needed for a fuzzy match
+FUZZY_CUTOFF = 0.85
+# seconds between two Nominatim requests (their usage policy)
+NOMINATIM_INTERVAL = 1.0
+
+GEOCODERS = ("offline", "auto", "nominatim")
+
+Coords = Optional[Tuple[float, float]]
+
+COUNTRY_ALIASES = {
+    "us": "united states",
+    "u s": "united states",
+    "usa": "united states",
+    "u s a": "united states",
+    "united states of america": "united states",
+    "uk": "united kingdom",
+    "u k": "united kingdom",
+    "great britain": "united kingdom",
+}
+
+_PUNCT = re.compile(r"[^\w\s,]")
+
+
+def normalize_name(name: str) -> str:
+    """Lower-case, ASCII-fold, drop punctuation and canonicalize country aliases"""
+    name = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode()
+    name = _PUNCT.sub(" ", name.lower())
+    parts = [" ".join(part.split()) for part in name.split(",")]
+    return ", ".join(COUNTRY_ALIASES.get(part, part) for part in parts if part)
+
+
+def shorter_forms(key: str) -> List[Tuple[str, List[str]]]:
+    """'city, state, country' -> [('city, country', ['state']), ('city', ['state', 'country'])]"""
+    parts = key.split(", ")
+    forms = []
+    if len(parts) > 2:
+        forms.append((f"{parts[0]}, {parts[-1]}", parts[1:-1]))
+    if len(parts) > 1:
+        forms.append((parts[0], parts[1:]))
+    return forms
+
+
+_ALPHABET = {c: i for i, c in enumerate("abcdefghijklmnopqrstuvwxyz0123456789 ")}
+
+
+def char_counts(words: List[str]) -> np.ndarray:
+    """(len(words), 38) character counts; anything outside a-z, 0-9 and space shares the last column"""
+    counts = np.zeros((len(words), len(_ALPHABET) + 1), dtype=np.int16)
+    for row, word in enumerate(words):
+        for c in word:
+            counts[row, _ALPHABET.get(c, len(_ALPHABET))] += 1
+    return counts
+
+
+class FuzzyCandidates:
+    """
+    City names sharing one (first letter, remaining parts) group, with their
+    lengths and character counts. difflib's quick_ratio is an upper bound of
+    its ratio and depends only on those, so it is computed for the whole
+    group at once and difflib only compares the names that can reach the cutoff.
+    """
+
+    def __init__(self, heads: List[str]):
+        self.heads = np.array(heads, dtype=object)
+        self.lengths = np.array([len(head) for head in heads])
+        self.counts = char_counts(heads)
+
+    def close(self, word: str, cutoff: float) -> List[str]:
+        shared = np.minimum(self.counts, char_counts([word])[0]).sum(axis=1)
+        bound = 2.0 * shared / (self.lengths + len(word))
+        return list(self.heads[bound >= cutoff])
+
+
+# 1.  BACKENDS
+class Geocoder:
+    """Interface: map a free-text location to (lat, lon), or None if unknown"""
+
+    # True if a miss is worth remembering (the backend asked an authoritative source)
+    remote = False
+
+    @property
+    def name(self) -> str:
+        """Identifies the backend and its data; part of the catalog's source hash"""
+        return type(self).__name__
+
+    def geocode(self, location: str) -> Coords:
+        raise NotImplementedError
+
+
+class GazetteerGeocoder(Geocoder):
+    def __init__(self, path: Path = GAZETTEER_FILE, fuzzy_cutoff: float = FUZZY_CUTOFF):
+        self.path = Path(path)
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.index = load_index(self.path)
+        self.names = self.index["name"]
+        self._digest: Optional[str] = None
+        self._heads: Optional[Dict[Tuple[str, str], FuzzyCandidates]] = None
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def name(self) -> str:
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.index.tobytes()).hexdigest()[:16]
+        return f"gazetteer:{self._digest}"
+
+    def _exact(self, key: str) -> Coords:
+        encoded = key.encode("ascii")
+        i = int(np.searchsorted(self.names, encoded))
+        if i < len(self.names) and self.names[i] == encoded:
+            return float(self.index["lat"][i]), float(self.index["lon"][i])
+        return None
+
+    def _fuzzy_index(self) -> Dict[Tuple[str, str], FuzzyCandidates]:
+        """(remaining parts, first letter) -> candidate cities; built on the first fuzzy lookup"""
+        if self._heads is None:
+            groups: Dict[Tuple[str, str], List[str]] = {}
+            for name in self.names:
+                head, _, tail = name.decode("ascii").partition(", ")
+                if head:
+                    groups.setdefault((tail, head[0]), []).append(head)
+            self._heads = {group: FuzzyCandidates(heads) for group, heads in groups.items()}
+        return self._heads
+
+    def _fuzzy(self, key: str) -> Tuple[Optional[str], Coords]:
+        # compare only the first part ("city") among names with the same first
+        # letter and the same remaining parts, so a shared ", united states"
+        # cannot make two different cities look alike
+        head, _, tail = key.partition(", ")
+        group = self._fuzzy_index().get((tail, head[:1]))
+        candidates = group.close(head, self.fuzzy_cutoff) if group else []
+        match = difflib.get_close_matches(head, candidates, n=1, cutoff=self.fuzzy_cutoff)
+        if not match:
+            return None, None
+        name = f"{match[0]}, {tail}" if tail else match[0]
+        return name, self._exact(name)
+
+    def _find(self, key: str) -> Tuple[Optional[str], Coords]:
+        """(gazetteer name, coordinates) for a key, exact then fuzzy"""
+        coords = self._exact(key)
+        return (key, coords) if coords else self._fuzzy(key)
+
+    def _qualifiers(self, city: str, coords: Tuple[float, float]) -> set:
+        """States / countries the gazetteer lists for the place `city` at `coords`"""
+        lo = int(np.searchsorted(self.names, f"{city}, ".encode("ascii")))
+        hi = int(np.searchsorted(self.names, f"{city}, \x7f".encode("ascii")))
+        qualifiers = set()
+        for i in range(lo, hi):
+            # the same place under another name (entries may be rounded differently)
+            if abs(self.index["lat"][i] - coords[0]) < 0.1 and abs(self.index["lon"][i] - coords[1]) < 0.1:
+                qualifiers.update(self.names[i].decode("ascii").split(", ")[1:])
+        return qualifiers
+
+    def geocode(self, location: str) -> Coords:
+        key = normalize_name(location)
+        if not key:
+            return None
+        name, coords = self._find(key)
+        if coords:
+            return coords
+        for form, dropped in shorter_forms(key):
+            name, coords = self._find(form)
+            # a shorter form may name another place ("Portland, Maine" -> "portland"
+            # is Portland, Oregon): only accept it if the gazetteer lists every
+            # dropped state / country for it, and otherwise leave the name to the
+            # next backend
+            if coords:
+                if set(dropped) <= self._qualifiers(name.split(", ")[0], coords):
+                    return coords
+                return None
+        return None
+
+
+class NominatimGeocoder(Geocoder):
+    remote = True
+    name = "nominatim"
+
+    def __init__(self, min_interval: float = NOMINATIM_INTERVAL, timeout: int = 10):
+        from geopy.geocoders import Nominatim
+
+        self.geolocator = Nominatim(user_agent="publisher_matcher", timeout=timeout)
+        self.min_interval = min_interval
+        self.last_call = 0.0
+
+    def geocode(self, location: str) -> Coords:
+        wait = self.last_call + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            loc = self.geolocator.geocode(location)
+        finally:
+            self.last_call = time.monotonic()
+        return (loc.latitude, loc.longitude) if loc else None
+
+
+class ChainGeocoder(Geocoder):
+    """Try each backend in turn; the first hit wins"""
+
+    def __init__(self, backends: Iterable[Geocoder]):
+        self.backends = list(backends)
+        self.remote = any(backend.remote for backend in self.backends)
+
+    @property
+    def name(self) -> str:
+        return "+".join(backend.name for backend in self.backends)
+
+    def geocode(self, location: str) -> Coords:
+        for backend in self.backends:
+            try:
+                coords = backend.geocode(location)
+            except Exception as e:
+                print(f"   ⚠️  {type(backend).__name__} failed for '{location}': {e}")
+                continue
+            if coords:
+                return coords
+        return None
+
+
+def make_geocoder(kind: str = "auto", gazetteer: Path = GAZETTEER_FILE) -> Geocoder:
+    if kind not in GEOCODERS:
+        raise ValueError(f"geocoder must be one of {GEOCODERS}, got {kind!r}")
+    backends: List[Geocoder] = []
+    if kind in ("offline", "auto"):
+        backends.append(GazetteerGeocoder(gazetteer))
+    if kind in ("auto", "nominatim"):
+        backends.append(NominatimGeocoder())
+    return ChainGeocoder(backends)
+
+
+# 2.  GAZETTEER FILE + INDEX
+def index_path(path: Path) -> Path:
+    return path.with_suffix(".idx.npy")
+
+
+def read_gazetteer(path: Path) -> Dict[str, Tuple[float, float]]:
+    entries = {}
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f, delimiter="\t"):
+            entries.setdefault(normalize_name(row["name"]), (float(row["latitude"]), float(row["longitude"])))
+    return entries
+
+
+def write_gazetteer(path: Path, entries: Dict[str, Tuple[float, float]]) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        writer.writerow(["name", "latitude", "longitude"])
+        for name in sorted(entries):
+            lat, lon = entries[name]
+            writer.writerow([name, repr(lat), repr(lon)])
+
+
+def build_index(path: Path) -> Path:
+    """Compile the TSV into a sorted fixed-width array (name, lat, lon)"""
+    entries = read_gazetteer(path)
+    names = sorted(entries)
+    width = max((len(name) for name in names), default=1)
+    index = np.empty(len(names), dtype=[("name", f"S{width}"), ("lat", "f8"), ("lon", "f8")])
+    index["name"] = [name.encode("ascii") for name in names]
+    index["lat"] = [entries[name][0] for name in names]
+    index["lon"] = [entries[name][1] for name in names]
+    out = index_path(path)
+    np.save(out, index)
+    return out
+
+
+def load_index(path: Path) -> np.ndarray:
+    """Memory-map the compiled index, rebuilding it if the TSV is newer"""
+    idx = index_path(path)
+    if not idx.exists() or idx.stat().st_mtime < path.stat().st_mtime:
+        build_index(path)
+    return np.load(idx, mmap_mode="r")
+
+
+def entries_from_cache(cache_path: Path) -> Dict[str, Tuple[float, float]]:
+    """Resolved coords_cache.json entries, plus unambiguous city-only names"""
+    with open(cache_path, "r", encoding="utf-8") as f:
+        cache = json.load(f)
+    entries: Dict[str, Tuple[float, float]] = {}
+    cities: Dict[str, List[Tuple[float, float]]] = {}
+    for location, coords in cache.items():
+        key = normalize_name(location)
+        if not coords or not key:
+            continue
+        coords = (float(coords[0]), float(coords[1]))
+        entries.setdefault(key, coords)
+        if ", " in key:
+            cities.setdefault(key.split(", ")[0], []).append(coords)
+    for city, places in cities.items():
+        # same place spelled differently ("New York, US" / "New York, United States")
+        distinct = {(round(lat, 1), round(lon, 1)) for lat, lon in places}
+        if len(distinct) == 1:
+            entries.setdefault(city, places[0])
+    return entries
+
+
+def entries_from_geonames(
+    cities_path: Path, countries_path: Optional[Path] = None, admin1_path: Optional[Path] = None
+) -> Dict[str, Tuple[float, float]]:
+    """
+    Names from a GeoNames cities dump. Ambiguous names go to the most
+    populous place, as Nominatim would rank them.
+    """
+    countries, admin1 = {}, {}
+    if countries_path:
+        with open(countries_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                countries[cols[0]] = cols[4]
+    if admin1_path:
+        with open(admin1_path, "r", encoding="utf-8") as f:
+            for line in f:
+                cols = line.rstrip("\n").split("\t")
+                admin1[cols[0]] = cols[1]
+
+    places = []
+    with open(cities_path, "r", encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            places.append((int(cols[14] or 0), cols[2], float(cols[4]), float(cols[5]), cols[8], cols[10]))
+    places.sort(key=lambda place: -place[0])
+
+    entries: Dict[str, Tuple[float, float]] = {}
+    for _, name, lat, lon, country_code, admin1_code in places:
+        country = countries.get(country_code, country_code)
+        state = admin1.get(f"{country_code}.{admin1_code}")
+        forms = [name, f"{name}, {country}"]
+        if state:
+            forms += [f"{name}, {state}", f"{name}, {state}, {country}"]
+            if country_code == "US":
+                forms.append(f"{name}, {admin1_code}")
+        for form in forms:
+            entries.setdefault(normalize_name(form), (lat, lon))
+    return entries
+
+
+# 3.  CLI
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="(re)build the gazetteer file and its index")
+    build.add_argument("--cache", type=Path, default=CACHE_FILE, help="coords cache to import")
+    build.add_argument("--geonames", type=Path, help="GeoNames cities file (e.g. cities15000.txt)")
+    build.add_argument("--countries", type=Path, help="GeoNames countryInfo.txt")
+    build.add_argument("--admin1", type=Path, help="GeoNames admin1CodesASCII.txt")
+    build.add_argument("--out", type=Path, default=GAZETTEER_FILE)
+    lookup = sub.add_parser("lookup", help="geocode names with the offline gazetteer")
+    lookup.add_argument("names", nargs="+")
+    lookup.add_argument("--gazetteer", type=Path, default=GAZETTEER_FILE)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        entries = entries_from_cache(args.cache) if args.cache.exists() else {}
+        if args.geonames:
+            for name, coords in entries_from_geonames(args.geonames, args.countries, args.admin1).items():
+                entries.setdefault(name, coords)
+        write_gazetteer(args.out, entries)
+        idx = build_index(args.out)
+        print(f"Wrote {len(entries):,} names to {args.out} (index: {idx.name}, {idx.stat().st_size:,} bytes)")
+    elif args.command == "lookup":
+        geocoder = GazetteerGeocoder(args.gazetteer)
+        for name in args.names:
+            print(f"{name}: {geocoder.geocode(name)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Load test for match_service.py.
+
+Sends `--requests` POST /match requests from `--concurrency` threads against
+a running service (or one started here with `--start`). Each request has
+random preferences drawn from gazetteer locations and common subjects.
+With `--vary-weights`, requests instead re-rank PREFERENCE_SETS authors
+under random weight profiles and weights, as a weight slider would.
+Client-side latencies are measured exactly, and p50/p99 are checked
+against `--p50-ms` / `--p99-ms`.
+The exit status is 1 if a target is missed or any request fails.
+
+Usage:
+    python load_test_service.py --start
+    python load_test_service.py --url http://127.0.0.1:8766 --requests 5000 --concurrency 16 --p99-ms 50
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from benchmark_scoring import SUBJECTS
+from geocoder import GAZETTEER_FILE, read_gazetteer
+from publisher_matcher import FLAG_MAP, WEIGHT_PROFILES, WEIGHTS
+
+HERE = Path(__file__).resolve().parent
+
+P50_TARGET_MS = 10.0
+P99_TARGET_MS = 50.0
+START_TIMEOUT_S = 60
+# distinct preference sets re-ranked under random weights with --vary-weights
+PREFERENCE_SETS = 50
+
+
+def make_bodies(n: int, vary_weights: bool, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    locations = sorted(read_gazetteer(GAZETTEER_FILE))
+
+    def random_prefs():
+        return {
+            "user_location": rng.choice(locations),
+            "subjects": rng.sample(SUBJECTS, rng.randint(0, 4)),
+            **{key: rng.choice(["Y", "N", ""]) for key in FLAG_MAP},
+        }
+
+    # with --vary-weights, a few authors moving their weight sliders
+    authors = [random_prefs() for _ in range(PREFERENCE_SETS)]
+    bodies = []
+    for _ in range(n):
+        if vary_weights:
+            body = {
+                "preferences": rng.choice(authors),
+                "profile": rng.choice(list(WEIGHT_PROFILES)),
+                "weights": {key: rng.randint(0, 2 * max(1, value)) for key, value in WEIGHTS.items()},
+            }
+            body["weights"]["distance"] = max(1, body["weights"]["distance"])
+        else:
+            body = {"preferences": random_prefs()}
+        body["top_k"] = 5
+        bodies.append(json.dumps(body).encode("utf-8"))
+    return bodies
+
+
+def post(url: str, body: bytes) -> float:
+    """Milliseconds for one POST /match; raises on a non-200 answer"""
+    request = urllib.request.Request(f"{url}/match", data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=30) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service(csv_path: Path, workers: int) -> tuple:
+    """Start match_service.py on a free port; return (process, url) once /health answers"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, str(HERE / "match_service.py"), "--port", str(port), "--csv", str(csv_path),
+         "--workers", str(workers)],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + START_TIMEOUT_S
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"match_service.py exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1):
+                return process, url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"match_service.py did not answer within {START_TIMEOUT_S} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8766")
+    parser.add_argument("--start", action="store_true", help="start a local service on a free port for the test")
+    parser.add_argument("--csv", type=Path, default=Path("publishers.csv"), help="publishers CSV for --start")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="service workers for --start")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=50, help="untimed requests sent first")
+    parser.add_argument("--vary-weights", action="store_true", help="random weights in every request")
+    parser.add_argument("--p50-ms", type=float, default=P50_TARGET_MS)
+    parser.add_argument("--p99-ms", type=float, default=P99_TARGET_MS)
+    args = parser.parse_args()
+
+    process = None
+    url = args.url.rstrip("/")
+    if args.start:
+        process, url = start_service(args.csv, args.workers)
+    try:
+        bodies = make_bodies(args.warmup + args.requests, args.vary_weights)
+        for body in bodies[:args.warmup]:
+            post(url, body)
+
+        failures = []
+
+        def timed(body):
+            try:
+                return post(url, body)
+            except Exception as e:
+                failures.append(str(e))
+                return None
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            latencies = [ms for ms in pool.map(timed, bodies[args.warmup:]) if ms is not None]
+        elapsed = time.perf_counter() - start
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    ok = not failures
+    print(f"{args.requests:,} requests, concurrency {args.concurrency}: {elapsed:.2f} s "
+          f"({args.requests / elapsed:,.0f} req/s), {len(failures)} failed")
+    if failures:
+        print(f"   first failure: {failures[0]}")
+    if latencies:
+        p50, p99 = np.percentile(latencies, [50, 99])
+        for name, value, target in (("p50", p50, args.p50_ms), ("p99", p99, args.p99_ms)):
+            passed = value <= target
+            ok &= passed
+            print(f"{name}: {value:7.2f} ms  (target {target:g} ms)  {'ok' if passed else 'MISSED'}")
+        print(f"max: {max(latencies):7.2f} ms")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
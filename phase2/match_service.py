@@ -0,0 +1,413 @@
+"""
+Resident publisher matching service.
+
+Loads the publisher catalog and builds the scoring engine once, then ranks
+publishers over local HTTP. The Express backend can call it for each
+request instead of running publisher_matcher.py.
+
+  * Per-request weights: a request picks a weight profile
+    (WEIGHT_PROFILES, "default" if omitted) and may override any of its
+    weights. Rankings come from ScoringEngine.rank, which caches the
+    unweighted components per preference set, so re-ranking the same
+    preferences under new weights (a UI slider) is one dot product.
+  * Hot reload: a watcher thread polls publishers.csv, the phase 1 author
+    data and the compiled catalog. When either changes, the new catalog and engine are built next
+    to the live ones and swapped in with one reference assignment. Requests
+    already running finish on the state they started with, so none are
+    dropped or see a half-loaded catalog. A failed reload keeps the old
+    state.
+  * Geocoding: user locations go through the shared SQLite coordinate
+    cache and the offline gazetteer by default (`--geocoder auto` adds
+    Nominatim). A request can also pass `coords` directly.
+  * Workers: `--workers N` forks N processes that accept on the same
+    socket, each with its own engine (the catalog itself is memory-mapped,
+    so it is shared). Each worker watches and reloads on its own, and
+    /health and /metrics describe the worker that answered.
+  * Metrics: per-endpoint latency histograms at GET /metrics.
+
+Endpoints:
+    POST /match     {"preferences": {...}, "profile": "default", "weights": {...}, "top_k": 5}
+                    preferences use the batch_match.py input fields
+                    -> {"matches": [...], "geocoded": bool, "subjects": [...], ...}
+    POST /reload    reload the catalog now
+    GET  /health    -> {"status": "ok", "publishers": ..., "catalog_sha256": ..., ...}
+    GET  /metrics   -> {"latency_ms": {endpoint: histogram}, ...}
+
+Usage:
+    python match_service.py --port 8766 --workers 4
+    python load_test_service.py --start --requests 2000 --concurrency 8
+"""
+
+import argparse
+import bisect
+import json
+import os
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from batch_match import TOP_K, parse_preferences
+from catalog import catalog_path, load_catalog
+from geocoder import GEOCODERS, make_geocoder
+from publisher_evidence import AUTHORS_CSV
+from publisher_matcher import geocode_location, load_cache
+from scoring_engine import ScoringEngine, merge_weights
+
+DEFAULT_PORT = 8766
+# seconds between checks of the CSV / catalog for changes
+RELOAD_INTERVAL = 2.0
+MAX_BODY_BYTES = 1024 * 1024
+MAX_TOP_K = 100
+# endpoints with their own latency histogram; any other path is counted as "other"
+ROUTES = {"GET": ("/health", "/metrics"), "POST": ("/match", "/reload")}
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf")]
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles are reported at bucket resolution"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.count += 1
+            self.total_ms += ms
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th percentile (q in 0..100)"""
+        if not self.count:
+            return None
+        target = q / 100 * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "mean_ms": self.total_ms / self.count if self.count else None,
+                "p50_ms": self.percentile(50),
+                "p90_ms": self.percentile(90),
+                "p99_ms": self.percentile(99),
+                "buckets": {("+Inf" if b == float("inf") else str(b)): n for b, n in zip(self.buckets, self.counts)},
+            }
+
+
+class MatchState:
+    """One loaded catalog and its engine; not modified once it is serving requests"""
+
+    def __init__(self, csv_path: Path, geocoder):
+        self.catalog = load_catalog(csv_path, geocoder=geocoder)
+        self.rows = np.flatnonzero(~self.catalog.flag_is("in_house", "Y"))  # exclude in‑house only
+        self.engine = ScoringEngine.from_catalog(self.catalog, self.rows)
+        self.signature: tuple = ()
+        self.loaded_at = time.time()
+        self.records: Dict[int, Dict[str, str]] = {}
+        self.evidence = self.catalog.evidence
+
+    def record(self, row: int) -> Dict[str, str]:
+        if row not in self.records:
+            self.records[row] = self.catalog.record(row)
+        return self.records[row]
+
+
+class MatchService:
+    def __init__(self, csv_path: Path, geocoder_kind: str = "offline", reload_interval: float = RELOAD_INTERVAL):
+        self.csv_path = Path(csv_path)
+        self.geocoder = make_geocoder(geocoder_kind)
+        self.cache = load_cache()
+        self.started = time.time()
+        self.reloads = 0
+        self.reload_error: Optional[str] = None
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self._latency_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        # held only to swap or read the state reference, never while ranking
+        self._state_lock = threading.Lock()
+        self.state = MatchState(self.csv_path, self.geocoder)
+        self.state.signature = self.signature()
+
+        self._stop = threading.Event()
+        self._watcher = None
+        if reload_interval > 0:
+            self._watcher = threading.Thread(
+                target=self._watch, args=(reload_interval,), name="catalog-watcher", daemon=True
+            )
+            self._watcher.start()
+
+    # catalog reload
+    def signature(self) -> tuple:
+        """(mtime, size) of the CSV, the author data and the compiled catalog"""
+        stats = []
+        for path in (self.csv_path, AUTHORS_CSV, catalog_path(self.csv_path)):
+            try:
+                st = os.stat(path)
+                stats.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stats.append(None)
+        return tuple(stats)
+
+    def reload(self, force: bool = False) -> bool:
+        """Build a new state if the files changed (or `force`) and swap it in; True if swapped"""
+        with self._reload_lock:
+            signature = self.signature()
+            if not force and signature == self.state.signature:
+                return False
+            try:
+                state = MatchState(self.csv_path, self.geocoder)
+            except Exception as e:
+                self.reload_error = f"{type(e).__name__}: {e}"
+                print(f"   ⚠️  Catalog reload failed, keeping the loaded catalog: {self.reload_error}")
+                return False
+            # a rebuild rewrites the catalog file; remember the signature after it
+            state.signature = self.signature()
+            with self._state_lock:
+                self.state = state
+            self.reloads += 1
+            self.reload_error = None
+            print(f"Reloaded catalog ({state.catalog.size:,} publishers)")
+            return True
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            self.reload()
+
+    # ranking
+    def locate(self, prefs: dict, coords) -> Tuple[Optional[Tuple[float, float]], bool]:
+        if coords is not None:
+            lat, lon = (float(c) for c in coords)
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                raise ValueError(f"coords out of range: {coords!r}")
+            return (lat, lon), True
+        if not prefs["user_location"]:
+            return None, False
+        found = geocode_location(prefs["user_location"], self.cache, self.geocoder)
+        return found, bool(found)
+
+    def match(self, body: dict) -> dict:
+        for field in ("preferences", "weights"):
+            if not isinstance(body.get(field) or {}, dict):
+                raise ValueError(f"{field} must be a JSON object")
+        prefs = parse_preferences(body.get("preferences") or {})
+        profile = body.get("profile") or "default"
+        weights = merge_weights(body.get("weights"), str(profile))
+        k = int(body.get("top_k", TOP_K))
+        if not 1 <= k <= MAX_TOP_K:
+            raise ValueError(f"top_k must be between 1 and {MAX_TOP_K}")
+        user_coords, geocoded = self.locate(prefs, body.get("coords"))
+
+        with self._state_lock:
+            state = self.state  # one snapshot for the whole request
+        subjects = state.engine.subjects.describe(prefs["subjects"])
+        top = state.engine.rank(prefs, user_coords, k, weights)
+        matches = []
+        for rank, (i, percent) in enumerate(top, 1):
+            record = state.record(int(state.rows[i]))
+            matches.append({
+                "rank": rank,
+                "publisher": record["Publisher"],
+                "match_percent": percent,
+                "location": record["Regional Preference/Origin Location"],
+                "website": record["Website"],
+                "subjects": record["Subjects"],
+                "evidence": state.evidence(int(state.rows[i])),
+            })
+        return {
+            "matches": matches,
+            "geocoded": geocoded,
+            "subjects": [{"typed": typed, "matched": matched} for typed, matched in subjects],
+            "profile": profile,
+            "weights": weights,
+            "catalog_sha256": state.catalog.source_sha256,
+        }
+
+    # metrics
+    def observe(self, endpoint: str, ms: float):
+        with self._latency_lock:
+            histogram = self.latency.setdefault(endpoint, LatencyHistogram())
+        histogram.observe(ms)
+
+    def health(self) -> dict:
+        with self._state_lock:
+            state = self.state
+        return {
+            "status": "ok",
+            "publishers": len(state.rows),
+            "catalog_sha256": state.catalog.source_sha256,
+            "loaded_at": state.loaded_at,
+            "reloads": self.reloads,
+            "reload_error": self.reload_error,
+            "uptime_s": round(time.time() - self.started, 1),
+        }
+
+    def metrics(self) -> dict:
+        with self._latency_lock:
+            latency = {endpoint: h.snapshot() for endpoint, h in self.latency.items()}
+        return {"latency_ms": latency, **self.health()}
+
+    def close(self):
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join()
+        self.cache.close()
+
+
+class MatchHandler(BaseHTTPRequestHandler):
+    service = None  # set by make_server
+
+    def route(self) -> str:
+        """Request path without the query string"""
+        return urlsplit(self.path).path
+
+    def metric(self) -> str:
+        """Histogram key: the matched route, so clients cannot add keys with made-up paths"""
+        route = self.route()
+        return f"{self.command} {route if route in ROUTES.get(self.command, ()) else 'other'}"
+
+    def do_GET(self):
+        start = time.perf_counter()
+        try:
+            route = self.route()
+            if route == "/health":
+                self._send(200, self.service.health())
+            elif route == "/metrics":
+                self._send(200, self.service.metrics())
+            else:
+                self._send(404, {"message": "Not found"})
+        finally:
+            self.service.observe(self.metric(), (time.perf_counter() - start) * 1000)
+
+    def do_POST(self):
+        start = time.perf_counter()
+        try:
+            self._post()
+        finally:
+            # errors count too, so /metrics shows what callers actually waited
+            self.service.observe(self.metric(), (time.perf_counter() - start) * 1000)
+
+    def _post(self):
+        route = self.route()
+        if route == "/reload":
+            self._send(200, {"reloaded": self.service.reload(force=True), **self.service.health()})
+            return
+        if route != "/match":
+            self._send(404, {"message": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_BODY_BYTES:
+                self._send(413, {"message": "Request body too large"})
+                return
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("body must be a JSON object")
+            result = self.service.match(body)
+        except (KeyError, TypeError, ValueError) as e:
+            self._send(400, {"message": str(e)})
+            return
+        except Exception as e:
+            self._send(500, {"message": str(e)})
+            return
+        self._send(200, result)
+
+    def _send(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(service: Optional[MatchService], host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    handler = type("BoundMatchHandler", (MatchHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(server: ThreadingHTTPServer, args):
+    """Load the catalog and answer requests on `server` until interrupted"""
+    service = MatchService(args.csv, args.geocoder, args.reload_interval)
+    server.RequestHandlerClass.service = service
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--csv", type=Path, default=Path("publishers.csv"), help="publishers CSV")
+    parser.add_argument("--geocoder", choices=GEOCODERS, default="offline")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL,
+                        help="seconds between checks for a changed catalog (0 = never)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes accepting on the same socket (each holds its own engine)")
+    args = parser.parse_args()
+
+    if not args.csv.exists():
+        print(f"CSV not found: {args.csv.resolve()}")
+        raise SystemExit(1)
+    workers = args.workers if hasattr(os, "fork") else 1
+
+    # build the artifact once here, so the workers only memory-map it
+    catalog = load_catalog(args.csv, geocoder=make_geocoder(args.geocoder))
+    server = make_server(None, args.host, args.port)
+    print(f"Match service listening on http://{args.host}:{args.port} "
+          f"({catalog.size:,} publishers, {workers} worker{'s' if workers > 1 else ''})", flush=True)
+    if workers <= 1:
+        serve(server, args)
+        return
+
+    # pre-fork: the scoring is CPU-bound Python, so one process per core
+    # scales where threads would queue on the GIL
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            serve(server, args)
+            os._exit(0)
+        children.append(pid)
+    server.server_close()
+
+    def stop(signum, frame):
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for _ in children:
+            os.wait()
+    except KeyboardInterrupt:
+        # the terminal sent SIGINT to the workers as well
+        for _ in children:
+            os.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Per-publisher aggregates from the phase 1 author data.
+
+phase1/all_data/publisher_authors_data.csv has one row per (publisher,
+author) with the author's Goodreads rating, work count, and the genre and
+page count of a sample book. `aggregate_authors` reduces it to one row per
+catalog publisher. The reduction is a single groupby for the scalar columns
+and one np.unique over (publisher, genre) codes for the genre counts:
+
+  * evidence_authors / evidence_works - distinct authors, summed work counts
+  * evidence_rating                   - mean Goodreads rating (NaN if none)
+  * evidence_pages                    - median sample-book pages (NaN if none)
+  * genre_indptr / genre_indices / genre_counts
+                                      - sample-book genre counts per publisher
+                                        (CSR over the canonical genre keys)
+
+catalog.py stores these arrays in the catalog artifact. `BookEvidence`
+scores "publishes books like yours" from them with no file I/O per query:
+the cosine between the author's genres and the publisher's genre mix, and
+how close the author's page count is to the publisher's median.
+"""
+
+import difflib
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from subject_index import FUZZY_CUTOFF, RESOLVE_CACHE_SIZE, subject_key
+
+AUTHORS_CSV = Path(__file__).resolve().parent.parent / "phase1" / "all_data" / "publisher_authors_data.csv"
+
+# genres with fewer authors than this across all publishers are dropped
+MIN_GENRE_AUTHORS = 3
+# placeholder genres that say nothing about the book
+IGNORED_GENRES = {"unknown", ""}
+# sample-book page counts outside this range are treated as missing
+PAGES_RANGE = (10, 5000)
+# a book this many times longer or shorter than the median has no page fit
+PAGE_RATIO_LIMIT = 3.0
+
+
+def publisher_key(name: str) -> str:
+    return " ".join(str(name).casefold().split())
+
+
+# 1.  BUILD
+def aggregate_authors(authors_csv: Path, publishers: List[str]) -> Dict[str, object]:
+    """
+    Aggregate arrays aligned with `publishers` (the catalog's Publisher
+    column), plus "genre_names": the canonical genre keys the CSR refers to.
+    Publishers without author rows get zero counts and NaN statistics.
+    """
+    n = len(publishers)
+    df = pd.read_csv(authors_csv, usecols=[
+        "Publisher", "Author", "Goodreads_Rating", "Distinct_Works_Count", "Sample_Book_Genre", "Sample_Book_Pages",
+    ])
+    position = {}
+    for i, name in enumerate(publishers):
+        position.setdefault(publisher_key(name), i)
+    df["pub"] = df["Publisher"].map(lambda name: position.get(publisher_key(name), -1))
+    df = df[df["pub"] >= 0]
+
+    pages = df["Sample_Book_Pages"].where(df["Sample_Book_Pages"].between(*PAGES_RANGE))
+    rating = df["Goodreads_Rating"].where(df["Goodreads_Rating"] > 0)
+    stats = (
+        df.assign(pages=pages, rating=rating)
+        .groupby("pub")
+        .agg(authors=("Author", "nunique"), works=("Distinct_Works_Count", "sum"),
+             rating=("rating", "mean"), pages=("pages", "median"))
+    )
+    index = stats.index.to_numpy()
+
+    arrays: Dict[str, object] = {}
+    for name, column, dtype, fill in (
+        ("evidence_authors", "authors", np.int32, 0),
+        ("evidence_works", "works", np.int32, 0),
+        ("evidence_rating", "rating", np.float64, np.nan),
+        ("evidence_pages", "pages", np.float64, np.nan),
+    ):
+        values = np.full(n, fill, dtype=dtype)
+        values[index] = stats[column].to_numpy()
+        arrays[name] = values
+
+    # genre counts: canonical keys, rare and placeholder genres dropped
+    keys = df["Sample_Book_Genre"].astype(str).map(subject_key)
+    counts = keys[~keys.isin(IGNORED_GENRES)].value_counts()
+    genre_names = sorted(counts.index[counts >= MIN_GENRE_AUTHORS])
+    genre_ids = keys.map({key: g for g, key in enumerate(genre_names)})
+    known = genre_ids.notna().to_numpy()
+    # (publisher, genre) cell codes; np.unique sorts them by publisher, then genre
+    cells = df["pub"].to_numpy()[known] * len(genre_names) + genre_ids.to_numpy()[known].astype(np.int64)
+    cells, cell_counts = np.unique(cells, return_counts=True)
+    rows = cells // max(1, len(genre_names))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(rows, minlength=n))
+    arrays["genre_indptr"] = indptr
+    arrays["genre_indices"] = (cells % max(1, len(genre_names))).astype(np.int32)
+    arrays["genre_counts"] = cell_counts.astype(np.int32)
+    arrays["genre_names"] = genre_names
+    return arrays
+
+
+def empty_aggregates(n: int) -> Dict[str, object]:
+    """Evidence arrays for a catalog built without author data"""
+    return {
+        "evidence_authors": np.zeros(n, dtype=np.int32),
+        "evidence_works": np.zeros(n, dtype=np.int32),
+        "evidence_rating": np.full(n, np.nan),
+        "evidence_pages": np.full(n, np.nan),
+        "genre_indptr": np.zeros(n + 1, dtype=np.int64),
+        "genre_indices": np.empty(0, dtype=np.int32),
+        "genre_counts": np.empty(0, dtype=np.int32),
+        "genre_names": [],
+    }
+
+
+# 2.  SCORING
+class BookEvidence:
+    def __init__(self, genre_names: List[str], indptr: np.ndarray, indices: np.ndarray, counts: np.ndarray,
+                 median_pages: np.ndarray):
+        """Per-publisher genre counts (CSR) and median pages, as stored in the catalog"""
+        self.size = len(median_pages)
+        self.genre_names = list(genre_names)
+        self.genre_ids = {name: g for g, name in enumerate(self.genre_names)}
+        self.median_pages = np.asarray(median_pages, dtype=float)
+
+        indptr = np.asarray(indptr)
+        counts = np.asarray(counts, dtype=float)
+        publishers = np.repeat(np.arange(self.size), np.diff(indptr))
+        self.norm = np.sqrt(np.bincount(publishers, weights=counts ** 2, minlength=self.size))
+        # genre -> (publishers, counts), for summing over the author's genres only
+        order = np.argsort(np.asarray(indices), kind="stable")
+        self.post_publishers = publishers[order]
+        self.post_counts = counts[order]
+        self.post_bounds = np.searchsorted(np.asarray(indices)[order], np.arange(len(self.genre_names) + 1))
+        self.resolved: Dict[str, Optional[int]] = {}
+
+    @classmethod
+    def empty(cls, size: int) -> "BookEvidence":
+        return cls([], np.zeros(size + 1, dtype=np.int64), np.empty(0, np.int32), np.empty(0), np.full(size, np.nan))
+
+    def resolve(self, term: str) -> Optional[int]:
+        """Genre ID for a typed genre (exact canonical key, then fuzzy), or None"""
+        try:
+            return self.resolved[term]
+        except KeyError:
+            pass
+        key = subject_key(term)
+        genre = self.genre_ids.get(key)
+        if genre is None and key:
+            match = difflib.get_close_matches(key, self.genre_names, n=1, cutoff=FUZZY_CUTOFF)
+            genre = self.genre_ids[match[0]] if match else None
+        if len(self.resolved) >= RESOLVE_CACHE_SIZE:
+            self.resolved.clear()
+        self.resolved[term] = genre
+        return genre
+
+    def genre_cosine(self, terms: List[str]) -> Optional[np.ndarray]:
+        """Cosine between the author's genres (one-hot) and each publisher's genre counts; None if none resolve"""
+        genres = {self.resolve(term) for term in terms} - {None}
+        if not genres:
+            return None
+        dot = np.zeros(self.size)
+        for g in genres:
+            lo, hi = self.post_bounds[g], self.post_bounds[g + 1]
+            dot[self.post_publishers[lo:hi]] += self.post_counts[lo:hi]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cosine = dot / (self.norm * np.sqrt(len(genres)))
+        return np.nan_to_num(cosine)
+
+    def page_fit(self, pages: float) -> np.ndarray:
+        """1 at the publisher's median page count, falling to 0 at PAGE_RATIO_LIMIT times longer or shorter"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fit = 1 - np.abs(np.log(pages / self.median_pages)) / np.log(PAGE_RATIO_LIMIT)
+        return np.nan_to_num(np.clip(fit, 0.0, 1.0))
+
+    def similarity(self, prefs: dict) -> np.ndarray:
+        """
+        "Publishes books like yours" in [0, 1]: the mean of the genre cosine
+        (genres, or the subjects when no genres were given) and the page fit,
+        over the parts the author supplied
+        """
+        parts = []
+        cosine = self.genre_cosine(prefs.get("genres") or prefs["subjects"])
+        if cosine is not None:
+            parts.append(cosine)
+        if prefs.get("pages"):
+            parts.append(self.page_fit(float(prefs["pages"])))
+        if not parts:
+            return np.zeros(self.size)
+        return sum(parts) / len(parts)
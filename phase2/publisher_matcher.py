@@ -1,11 +1,14 @@
-import sys, json, time, difflib
+import sys, argparse
 from pathlib import Path
 from typing import Tuple, Optional
 
+import numpy as np
 import pandas as pd
-from geopy.geocoders import Nominatim
 from geopy.distance import geodesic
 
+from coords_cache import CoordsCache
+from geocoder import GEOCODERS, Geocoder, make_geocoder
+
 # CONFIGURABLE WEIGHTS
 WEIGHTS = {
     "distance": 4,     
@@ -17,9 +20,34 @@ WEIGHTS = {
     "proposal_required": 1,
     "academic_focus": 1,
     "religious_focus": 1,
+    # "publishes books like yours" (genre mix and page length, from the
+    # phase 1 author data); off unless a profile or request turns it on
+    "similarity": 0,
 }
 TOTAL_POSSIBLE = sum(WEIGHTS.values())
 
+# named weightings, selectable per run (--profile) or per service request
+WEIGHT_PROFILES = {
+    "default": WEIGHTS,
+    # every criterion ranked, distance first
+    "ranked": {
+        "distance": 10,
+        "subjects": 9,
+        "manuscript_needed": 8,
+        "chapters_needed": 7,
+        "requires_agent": 6,
+        "peer_reviewed": 5,
+        "proposal_required": 4,
+        "academic_focus": 3,
+        "religious_focus": 2,
+        "similarity": 0,
+    },
+    # location ignored, e.g. for authors happy to work remotely
+    "anywhere": {**WEIGHTS, "distance": 0},
+    # weighs what a publisher actually publishes as much as its listed subjects
+    "similar_books": {**WEIGHTS, "similarity": 4},
+}
+
 DIST_BUCKETS = [
     (100, 1.00),
     (500, 0.75),
@@ -28,40 +56,57 @@ DIST_BUCKETS = [
     (float("inf"), 0.00),
 ]
 
-CACHE_FILE = Path("coords_cache.json")
-geolocator = Nominatim(user_agent="publisher_matcher", timeout=10)
+# preference key -> publisher column for the yes/no criteria
+FLAG_MAP = {
+    "manuscript_needed": "Manuscript Needed (Y/N)",
+    "chapters_needed": "Chapters Needed (Y/N)",
+    "requires_agent": "requires_agent",
+    "peer_reviewed": "peer_reviewed",
+    "proposal_required": "proposal_required",
+    "academic_focus": "academic_focus",
+    "religious_focus": "religious_focus",
+}
+
+CACHE_FILE = Path("coords_cache.sqlite3")
+
+# offline gazetteer first, Nominatim only for names it does not know
+GEOCODER = "auto"
+_geocoder: Optional[Geocoder] = None
 
 # 1.  GEOCODING HELPERS
-def load_cache() -> dict:
-    if CACHE_FILE.exists():
-        with open(CACHE_FILE, "r", encoding="utf‑8") as f:
-            return json.load(f)
-    return {}
+def load_cache() -> CoordsCache:
+    """Open the SQLite coordinate cache (importing coords_cache.json the first time)"""
+    return CoordsCache(CACHE_FILE)
 
 
-def save_cache(cache: dict) -> None:
-    with open(CACHE_FILE, "w", encoding="utf‑8") as f:
-        json.dump(cache, f)
+def get_geocoder() -> Geocoder:
+    global _geocoder
+    if _geocoder is None:
+        _geocoder = make_geocoder(GEOCODER)
+    return _geocoder
 
 
-def geocode_location(location: str, cache: dict) -> Optional[Tuple[float, float]]:
+def geocode_location(location: str, cache, geocoder: Optional[Geocoder] = None) -> Optional[Tuple[float, float]]:
     """
-    Return (lat, lon) using cached value or querying Nominatim once.
-    Returns None on failure.
+    Return (lat, lon) using cached value or the geocoder backend
+    (default: offline gazetteer, then Nominatim). Returns None on failure.
+    `cache` is a CoordsCache or a plain dict.
     """
     if location in cache:
         return cache[location]
 
+    geocoder = geocoder or get_geocoder()
     try:
-        loc = geolocator.geocode(location)
-        if loc:
-            coords = (loc.latitude, loc.longitude)
+        coords = geocoder.geocode(location)
+        if coords:
+            coords = tuple(coords)
             cache[location] = coords
-            time.sleep(1.0)
             return coords
     except Exception as e:
         print(f"   ⚠️  Geocoding failed for '{location}': {e}")
-    cache[location] = None
+    if geocoder.remote:
+        # an offline miss is not cached, so a later online run can still resolve it
+        cache[location] = None
     return None
 
 
@@ -109,7 +154,17 @@ def ask(prompt: str, yes_no: bool = False) -> str:
             return val
 
 
-def get_preferences() -> dict:
+def ask_pages(prompt: str) -> Optional[int]:
+    while True:
+        val = input(prompt).strip()
+        if not val:
+            return None
+        if val.isdigit() and int(val) > 0:
+            return int(val)
+
+
+def get_preferences(book_details: bool = False) -> dict:
+    """The author's answers; `book_details` also asks for genres and page count"""
     prefs = {
         "user_location": ask("Your location (city / state / country): "),
         "subjects": [
@@ -125,6 +180,13 @@ def get_preferences() -> dict:
         "academic_focus": ask("Want an academic press? (Y/N): ", yes_no=True),
         "religious_focus": ask("Want a religious press? (Y/N): ", yes_no=True),
     }
+    if book_details:
+        prefs["genres"] = [
+            s.strip().lower()
+            for s in ask("Genres of your book (comma‑separated, blank = same as subjects): ").split(",")
+            if s.strip()
+        ]
+        prefs["pages"] = ask_pages("Approximate page count (blank = skip): ")
     return prefs
 
 
@@ -137,6 +199,7 @@ def distance_score(miles: float) -> float:
 
 
 def score_publisher(pub_row: pd.Series, prefs: dict, cache: dict, user_coords: Tuple[float, float]) -> float:
+    """Row-by-row reference scorer; subjects must match exactly (unlike ScoringEngine)"""
     score = 0.0
 
     # distance
@@ -154,16 +217,7 @@ def score_publisher(pub_row: pd.Series, prefs: dict, cache: dict, user_coords: T
         score += overlap * WEIGHTS["subjects"]
 
     # flag matches
-    flag_map = {
-        "manuscript_needed": "Manuscript Needed (Y/N)",
-        "chapters_needed": "Chapters Needed (Y/N)",
-        "requires_agent": "requires_agent",
-        "peer_reviewed": "peer_reviewed",
-        "proposal_required": "proposal_required",
-        "academic_focus": "academic_focus",
-        "religious_focus": "religious_focus",
-    }
-    for pref_key, col in flag_map.items():
+    for pref_key, col in FLAG_MAP.items():
         want = prefs[pref_key]
         if want == "" or want == pub_row[col]:
             score += WEIGHTS[pref_key]
@@ -173,46 +227,71 @@ def score_publisher(pub_row: pd.Series, prefs: dict, cache: dict, user_coords: T
 
 # 5.  MAIN
 def main():
-    # get CSV
-    if len(sys.argv) > 2:
-        print("Usage: python publisher_matcher.py [publishers.csv]")
-        sys.exit(1)
-    csv_path = Path(sys.argv[1]) if len(sys.argv) == 2 else Path("publishers.csv")
+    global GEOCODER
+    parser = argparse.ArgumentParser(description="Match an author with publishers")
+    parser.add_argument("csv", nargs="?", type=Path, default=Path("publishers.csv"), help="publishers CSV")
+    parser.add_argument("--geocoder", choices=GEOCODERS, default=GEOCODER,
+                        help="offline = bundled gazetteer only; auto = gazetteer, then Nominatim")
+    parser.add_argument("--profile", choices=WEIGHT_PROFILES, default="default", help="weight profile")
+    args = parser.parse_args()
+    GEOCODER = args.geocoder
+
+    csv_path = args.csv
     if not csv_path.exists():
         print(f"CSV not found: {csv_path.resolve()}")
         sys.exit(1)
 
-    df = load_publishers(csv_path)
-    df = df[df["in_house"] != "Y"].copy()  # exclude in‑house only
+    # compiled catalog (rebuilt only when the CSV, the author data or the geocoder changes)
+    from catalog import load_catalog
+    from scoring_engine import ScoringEngine
 
-    prefs = get_preferences()
+    catalog = load_catalog(csv_path, geocoder=get_geocoder())
+    rows = np.flatnonzero(~catalog.flag_is("in_house", "Y"))  # exclude in‑house only
+
+    weights = WEIGHT_PROFILES[args.profile]
+    prefs = get_preferences(book_details=weights.get("similarity", 0) > 0)
 
     # geocode user location once
     cache = load_cache()
     user_coords = geocode_location(prefs["user_location"], cache)
     if not user_coords:
         print("\n⚠️  Could not geocode your location; distance weight will be zero.")
-    save_cache(cache)  # save any new coords immediately
-
-    # score
-    df["match_percent"] = df.apply(
-        lambda row: score_publisher(row, prefs, cache, user_coords), axis=1
-    ).round(1)
-    save_cache(cache)  # save publisher coords
-    top = df[df["match_percent"] > 0].sort_values("match_percent", ascending=False).head(5)
+    cache.close()  # new coords were written as they were resolved
+
+    # score (vectorized; score_publisher row by row gives the same result only
+    # for subjects typed exactly as publishers list them - the engine also
+    # normalizes and fuzzy-matches them, see subject_index.py)
+    engine = ScoringEngine.from_catalog(catalog, rows)
+    for typed, matched in engine.subjects.describe(prefs["subjects"]):
+        if matched is None:
+            print(f"   ⚠️  No publisher lists the subject '{typed}'")
+        elif matched != typed:
+            print(f"   Subject '{typed}' matched as '{matched}'")
+    top = [(rows[i], percent) for i, percent in engine.top_k(prefs, user_coords, 5, weights)]
 
     # output
-    if top.empty:
+    if not top:
         print("\nNo suitable publishers found with current criteria.")
         return
 
     print("\nTop matches:")
-    for i, (_, row) in enumerate(top.iterrows(), 1):
+    for i, (idx, percent) in enumerate(top, 1):
+        row = catalog.record(idx)
+        evidence = catalog.evidence(idx)
+        authors = ""
+        if evidence["authors"]:
+            authors = f"   Authors : {evidence['authors']:,}"
+            if evidence["mean_rating"] is not None:
+                authors += f", mean Goodreads rating {evidence['mean_rating']}"
+            if evidence["median_pages"] is not None:
+                authors += f", median {evidence['median_pages']:.0f} pages"
+            authors += "\n"
         print(
-            f"{i}. {row['Publisher']} — {row['match_percent']}%\n"
+            f"{i}. {row['Publisher']} — {percent}%\n"
             f"   Location: {row['Regional Preference/Origin Location']}\n"
             f"   Website : {row['Website']}\n"
             f"   Subjects: {row['Subjects']}\n"
+            f"{authors}"
         )
 
 
@@ -0,0 +1,427 @@
+"""
+Vectorized publisher scoring.
+
+Gives the same match_percent as publisher_matcher.score_publisher for
+subjects typed exactly as publishers list them (score_publisher does no
+normalization or fuzzy matching), but scores the whole catalog with a
+handful of NumPy operations instead of a Python call per row:
+
+  * flags    - each flag column is integer-coded into an (n, 7) matrix and
+               compared against the coded preferences in one operation
+  * distance - a grid-cell spatial index (spatial_index.CellIndex) assigns
+               whole cells to a bucket ring; publishers in cells on a ring
+               boundary get haversine, and the few within HAVERSINE_MARGIN of
+               a cutoff are re-measured with geodesic, so the bucket (the only
+               thing that affects the score) matches exactly
+  * subjects - inverted index from canonical subject to publishers
+               (subject_index.SubjectIndex); typed subjects are normalized
+               and fuzzy-matched once per query, then posting lists merged
+  * similarity (weight 0 by default) - genre cosine and page-length fit
+               against the publisher's authors (publisher_evidence.BookEvidence)
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from publisher_evidence import BookEvidence
+from publisher_matcher import DIST_BUCKETS, FLAG_MAP, WEIGHT_PROFILES, WEIGHTS
+from spatial_index import CellIndex, point_buckets
+from subject_index import SubjectIndex
+
+LOCATION_COL = "Regional Preference/Origin Location"
+
+# memory for cached per-location distance-bucket rows (one byte per publisher)
+ROW_CACHE_BYTES = 32 << 20
+# memory for cached unweighted component matrices (one per preference set)
+COMPONENT_CACHE_BYTES = 64 << 20
+
+# columns of a component matrix, in the order score() adds them up
+COMPONENTS = ["distance", "subjects", *FLAG_MAP, "similarity"]
+
+# top_k scores TOP_K_SEED * k publishers exactly before pruning the rest
+TOP_K_SEED = 4
+# float noise allowed between the upper bound and the exact score
+PRUNE_SLACK = 1e-9
+
+Coords = Optional[Tuple[float, float]]
+
+
+def merge_weights(overrides: Optional[Dict[str, float]] = None, profile: str = "default") -> Dict[str, float]:
+    """
+    The WEIGHT_PROFILES entry `profile` with the entries in `overrides`
+    replaced. Weights must be non-negative numbers (top_k's upper bound
+    relies on it) and at least one must be positive.
+    """
+    if profile not in WEIGHT_PROFILES:
+        raise ValueError(f"unknown weight profile {profile!r}; expected one of {', '.join(WEIGHT_PROFILES)}")
+    weights = dict(WEIGHT_PROFILES[profile])
+    for key, value in (overrides or {}).items():
+        if key not in weights:
+            raise ValueError(f"unknown weight {key!r}; expected one of {', '.join(WEIGHTS)}")
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value) or value < 0:
+            raise ValueError(f"weight {key!r} must be a non-negative number, got {value!r}")
+        weights[key] = value
+    if sum(weights.values()) <= 0:
+        raise ValueError("at least one weight must be positive")
+    return weights
+
+
+def check_k(k: int):
+    """Rankings need k >= 1; a smaller k is a caller bug, not an empty result"""
+    if k < 1:
+        raise ValueError(f"k must be at least 1, got {k}")
+
+
+class ScoringEngine:
+    def __init__(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        flag_codes: np.ndarray,
+        flag_vocab: List[Dict[str, int]],
+        subject_ids: Dict[str, int],
+        subject_indptr: np.ndarray,
+        subject_indices: np.ndarray,
+        evidence: Optional[BookEvidence] = None,
+    ):
+        self.lat = lat
+        self.lon = lon
+        self.flag_codes = flag_codes
+        self.flag_vocab = flag_vocab
+        self.subject_ids = subject_ids
+        self.subject_indptr = subject_indptr
+        self.subject_indices = subject_indices
+        names = sorted(subject_ids, key=subject_ids.get)
+        self.subjects = SubjectIndex(names, subject_indptr, subject_indices, len(lat))
+        self.evidence = evidence or BookEvidence.empty(len(lat))
+
+        self.cutoffs = np.array([cutoff for cutoff, _ in DIST_BUCKETS])
+        self.bucket_scores = np.array([score for _, score in DIST_BUCKETS])
+        self.spatial = CellIndex(np.asarray(lat, dtype=float), np.asarray(lon, dtype=float))
+        # bucket index per publisher; the extra last entry (score 0) marks missing coordinates
+        self.row_scores = np.append(self.bucket_scores, 0.0)
+        self.row_cache: "OrderedDict[Tuple[float, float], np.ndarray]" = OrderedDict()
+        self.row_cache_size = max(1, ROW_CACHE_BYTES // max(1, self.size))
+        self.component_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self.component_cache_size = max(1, COMPONENT_CACHE_BYTES // max(1, self.size * len(COMPONENTS) * 8))
+        # guards only the two caches; scoring runs outside it, so threads can share one engine
+        self._cache_lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self.lat)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, geocode: Callable[[str], Coords]) -> "ScoringEngine":
+        """Build from a load_publishers() frame; `geocode` maps a location string to (lat, lon) or None"""
+        coords = {}
+        for loc in df[LOCATION_COL].astype(str).unique():
+            coords[loc] = geocode(loc)
+        lat = np.full(len(df), np.nan)
+        lon = np.full(len(df), np.nan)
+        for i, loc in enumerate(df[LOCATION_COL].astype(str)):
+            if coords[loc]:
+                lat[i], lon[i] = coords[loc]
+
+        flag_vocab = []
+        flag_codes = np.empty((len(df), len(FLAG_MAP)), dtype=np.int32)
+        for j, col in enumerate(FLAG_MAP.values()):
+            codes, uniques = pd.factorize(df[col])
+            flag_codes[:, j] = codes
+            flag_vocab.append({value: code for code, value in enumerate(uniques)})
+
+        subject_ids: Dict[str, int] = {}
+        indptr = [0]
+        indices: List[int] = []
+        for subjects in df["Subjects_list"]:
+            row = {subject_ids.setdefault(s, len(subject_ids)) for s in subjects}
+            indices.extend(sorted(row))
+            indptr.append(len(indices))
+
+        return cls(
+            lat,
+            lon,
+            flag_codes,
+            flag_vocab,
+            subject_ids,
+            np.array(indptr, dtype=np.int64),
+            np.array(indices, dtype=np.int32),
+        )
+
+    @classmethod
+    def from_catalog(cls, catalog, rows: Optional[np.ndarray] = None) -> "ScoringEngine":
+        """Build from a catalog.Catalog, optionally restricted to the publisher indices `rows`"""
+        rows = np.arange(catalog.size) if rows is None else np.asarray(rows)
+        # code 0 = "Y", 1 = "N", 2 = anything else
+        flag_codes = np.full((len(rows), len(FLAG_MAP)), 2, dtype=np.int32)
+        for j in range(len(FLAG_MAP)):
+            flag_codes[(catalog.flag_no[rows] >> j) & 1 == 1, j] = 1
+            flag_codes[(catalog.flag_yes[rows] >> j) & 1 == 1, j] = 0
+        flag_vocab = [{"Y": 0, "N": 1} for _ in FLAG_MAP]
+
+        starts, ends = catalog.subject_indptr[rows], catalog.subject_indptr[rows + 1]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(ends - starts)
+        indices = np.concatenate([catalog.subject_indices[s:e] for s, e in zip(starts, ends)] or [np.empty(0, np.int32)])
+
+        genre_indptr = catalog.arrays["genre_indptr"]
+        starts, ends = genre_indptr[rows], genre_indptr[rows + 1]
+        evidence_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        evidence_indptr[1:] = np.cumsum(ends - starts)
+        take = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)] or [np.empty(0, np.int64)]).astype(np.int64)
+        evidence = BookEvidence(
+            catalog.genre_names,
+            evidence_indptr,
+            catalog.arrays["genre_indices"][take],
+            catalog.arrays["genre_counts"][take],
+            catalog.arrays["evidence_pages"][rows],
+        )
+
+        return cls(
+            np.asarray(catalog.lat[rows]),
+            np.asarray(catalog.lon[rows]),
+            flag_codes,
+            flag_vocab,
+            {name: i for i, name in enumerate(catalog.subject_names)},
+            indptr,
+            indices.astype(np.int32),
+            evidence,
+        )
+
+    # components
+    def bucket_index(self, user: Tuple[float, float], cols: np.ndarray) -> np.ndarray:
+        """DIST_BUCKETS index for publishers `cols` (all with coordinates)"""
+        return point_buckets(user, self.lat[cols], self.lon[cols], self.cutoffs).astype(np.uint8)
+
+    def bucket_rows(self, users: List[Tuple[float, float]]) -> np.ndarray:
+        """
+        (len(users), n) distance-bucket scores for distinct user coordinates.
+        Rows are kept in a small LRU, since the same cities come up again and
+        again and the geodesic refinement is the expensive part.
+        """
+        with self._cache_lock:
+            found = {key: self.row_cache.get(key) for key in users}
+        # measured outside the lock, so other requests are not held up by the geodesic refinement
+        measured = {key: row if row is not None else self.spatial.buckets(key, self.cutoffs)
+                    for key, row in found.items()}
+        with self._cache_lock:
+            for key, row in measured.items():
+                self.row_cache[key] = row
+                self.row_cache.move_to_end(key)
+            while len(self.row_cache) > self.row_cache_size:
+                self.row_cache.popitem(last=False)
+        rows = np.empty((len(users), self.size), dtype=np.uint8)
+        for u, key in enumerate(users):
+            rows[u] = measured[key]
+        return self.row_scores[rows]
+
+    def distance_scores(self, user_coords: Coords) -> np.ndarray:
+        if not user_coords:
+            return np.zeros(self.size)
+        return self.bucket_rows([(float(user_coords[0]), float(user_coords[1]))])[0]
+
+    def distance_scores_at(self, user_coords: Coords, rows: np.ndarray) -> np.ndarray:
+        """distance_scores(user_coords)[rows], measuring only those publishers"""
+        if not user_coords:
+            return np.zeros(len(rows))
+        key = (float(user_coords[0]), float(user_coords[1]))
+        with self._cache_lock:
+            cached = self.row_cache.get(key)
+        if cached is not None:
+            return self.row_scores[cached[rows]]
+        index = np.full(len(rows), len(self.bucket_scores), dtype=np.uint8)
+        located = ~np.isnan(self.lat[rows])
+        if located.any():
+            index[located] = self.bucket_index(key, rows[located])
+        return self.row_scores[index]
+
+    def subject_overlap(self, subjects: List[str]) -> np.ndarray:
+        """|publisher subjects ∩ user subjects| / len(user subjects), matched through the subject index"""
+        return self.subjects.overlap(subjects)
+
+    def flag_matches(self, prefs: dict) -> np.ndarray:
+        """(n, 7) boolean matrix: preference is blank or equals the publisher value"""
+        wanted = np.array(
+            [-2 if prefs[key] == "" else vocab.get(prefs[key], -1) for key, vocab in zip(FLAG_MAP, self.flag_vocab)]
+        )
+        return (self.flag_codes == wanted[None, :]) | (wanted == -2)[None, :]
+
+    # blocks of authors (rows = authors, columns = publishers)
+    def distance_scores_block(self, coords_list: List[Coords]) -> np.ndarray:
+        scores = np.zeros((len(coords_list), self.size))
+        authors = [i for i, c in enumerate(coords_list) if c]
+        if not authors:
+            return scores
+        # authors often share a location; measure each distinct one once
+        keys = [(float(coords_list[i][0]), float(coords_list[i][1])) for i in authors]
+        distinct = list(dict.fromkeys(keys))
+        position = {key: u for u, key in enumerate(distinct)}
+        scores[authors] = self.bucket_rows(distinct)[[position[key] for key in keys]]
+        return scores
+
+    def subject_overlap_block(self, subjects_list: List[List[str]]) -> np.ndarray:
+        overlap = np.zeros((len(subjects_list), self.size))
+        for a, subjects in enumerate(subjects_list):
+            if subjects:
+                publishers, counts = self.subjects.matches(subjects)
+                overlap[a, publishers] = counts / len(subjects)
+        return overlap
+
+    def flag_matches_block(self, prefs_list: List[dict]) -> np.ndarray:
+        """(authors, n, 7) boolean tensor, as flag_matches for each author"""
+        wanted = np.array(
+            [
+                [-2 if prefs[key] == "" else vocab.get(prefs[key], -1) for key, vocab in zip(FLAG_MAP, self.flag_vocab)]
+                for prefs in prefs_list
+            ]
+        ).reshape(len(prefs_list), len(FLAG_MAP))
+        return (self.flag_codes[None, :, :] == wanted[:, None, :]) | (wanted == -2)[:, None, :]
+
+    def score_block(self, prefs_list: List[dict], coords_list: List[Coords],
+                    weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """(authors, n) match_percent matrix; row a equals score(prefs_list[a], coords_list[a])"""
+        weights = weights or WEIGHTS
+        total_possible = sum(weights.values())
+        score = np.zeros((len(prefs_list), self.size))
+        score += self.distance_scores_block(coords_list) * weights["distance"]
+        # authors without subjects get + 0.0, which leaves their floats unchanged
+        score += self.subject_overlap_block([prefs["subjects"] for prefs in prefs_list]) * weights["subjects"]
+        matches = self.flag_matches_block(prefs_list)
+        for j, key in enumerate(FLAG_MAP):
+            score += matches[:, :, j] * weights[key]
+        if weights.get("similarity"):
+            score += np.array([self.evidence.similarity(prefs) for prefs in prefs_list]) * weights["similarity"]
+        return (score / total_possible) * 100.0
+
+    # total
+    def score(self, prefs: dict, user_coords: Coords, weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """match_percent for every publisher (unrounded), under `weights` (default WEIGHTS)"""
+        weights = weights or WEIGHTS
+        total_possible = sum(weights.values())
+        # accumulate in the same order as score_publisher so the floats are identical
+        score = np.zeros(self.size)
+        score += self.distance_scores(user_coords) * weights["distance"]
+        if prefs["subjects"]:
+            score += self.subject_overlap(prefs["subjects"]) * weights["subjects"]
+        matches = self.flag_matches(prefs)
+        for j, key in enumerate(FLAG_MAP):
+            score += matches[:, j] * weights[key]
+        if weights.get("similarity"):
+            score += self.evidence.similarity(prefs) * weights["similarity"]
+        return (score / total_possible) * 100.0
+
+    # cached components: re-ranking the same preferences under other weights
+    def components(self, prefs: dict, user_coords: Coords) -> np.ndarray:
+        """
+        (n, len(COMPONENTS)) unweighted score parts for every publisher:
+        distance-bucket score, subject overlap, one 0/1 column per flag and
+        the books-like-yours similarity.
+        score() is these columns weighted and summed, so the matrix is kept
+        in an LRU keyed by the preference set and any weighting of it is one
+        matrix-vector product.
+        """
+        key = (
+            None if not user_coords else (float(user_coords[0]), float(user_coords[1])),
+            tuple(prefs["subjects"]),
+            tuple(prefs[k] for k in FLAG_MAP),
+            tuple(prefs.get("genres") or ()),
+            prefs.get("pages"),
+        )
+        with self._cache_lock:
+            cached = self.component_cache.get(key)
+            if cached is not None:
+                self.component_cache.move_to_end(key)
+                return cached
+        parts = np.empty((self.size, len(COMPONENTS)))
+        parts[:, 0] = self.distance_scores(user_coords)
+        parts[:, 1] = self.subject_overlap(prefs["subjects"]) if prefs["subjects"] else 0.0
+        parts[:, 2:-1] = self.flag_matches(prefs)
+        parts[:, -1] = self.evidence.similarity(prefs)
+        parts.flags.writeable = False
+        with self._cache_lock:
+            self.component_cache[key] = parts
+            while len(self.component_cache) > self.component_cache_size:
+                self.component_cache.popitem(last=False)
+        return parts
+
+    def rank(self, prefs: dict, user_coords: Coords, k: int = 5,
+             weights: Optional[Dict[str, float]] = None) -> List[Tuple[int, float]]:
+        """
+        Same result as top_k(), from the cached components. The first call
+        for a preference set measures every publisher; every later call,
+        whatever the weights, is a dot product and a partial sort.
+        """
+        check_k(k)
+        weights = weights or WEIGHTS
+        vector = np.array([weights.get(key, 0) for key in COMPONENTS], dtype=float)
+        percents = np.round((self.components(prefs, user_coords) @ vector / sum(weights.values())) * 100.0, 1)
+        if k >= self.size:
+            rows = np.arange(self.size)
+        else:
+            # everything tied with the k-th best, so ties can be broken by catalog order
+            threshold = np.partition(percents, self.size - k)[self.size - k]
+            rows = np.flatnonzero(percents >= threshold)
+        rows = rows[percents[rows] > 0]
+        order = np.lexsort((rows, -percents[rows]))[:k]
+        return [(int(rows[i]), float(percents[rows[i]])) for i in order]
+
+    def top_k(self, prefs: dict, user_coords: Coords, k: int = 5,
+              weights: Optional[Dict[str, float]] = None) -> List[Tuple[int, float]]:
+        """
+        The k best (publisher index, rounded match_percent) with match_percent > 0,
+        best first, ties in catalog order - the same as sorting score() - but
+        distances are only measured for publishers that can still make the top k.
+
+        Flags and subjects are cheap, and distance adds at most one bucket
+        weight, so they give an upper bound per publisher. The publishers with
+        the best bounds are scored exactly first; the k-th of those scores is a
+        threshold no pruned publisher can reach, even after rounding.
+        """
+        check_k(k)
+        weights = weights or WEIGHTS
+        total_possible = sum(weights.values())
+        overlap = self.subject_overlap(prefs["subjects"]) if prefs["subjects"] else None
+        matches = self.flag_matches(prefs)
+        similarity = self.evidence.similarity(prefs) if weights.get("similarity") else None
+
+        def exact(rows: np.ndarray) -> np.ndarray:
+            # same accumulation order as score(), so the floats are identical
+            score = np.zeros(len(rows))
+            score += self.distance_scores_at(user_coords, rows) * weights["distance"]
+            if overlap is not None:
+                score += overlap[rows] * weights["subjects"]
+            for j, key in enumerate(FLAG_MAP):
+                score += matches[rows, j] * weights[key]
+            if similarity is not None:
+                score += similarity[rows] * weights["similarity"]
+            return np.round((score / total_possible) * 100.0, 1)
+
+        cheap = matches @ np.array([weights[key] for key in FLAG_MAP], dtype=float)
+        if overlap is not None:
+            cheap += overlap * weights["subjects"]
+        if similarity is not None:
+            cheap += similarity * weights["similarity"]
+        if user_coords:
+            cheap += self.bucket_scores.max() * weights["distance"]
+        upper = cheap / total_possible * 100.0
+
+        n_seed = min(self.size, max(k, TOP_K_SEED * k))
+        seed = np.argpartition(-upper, n_seed - 1)[:n_seed] if n_seed < self.size else np.arange(self.size)
+        seed_scores = exact(seed)
+        threshold = np.partition(seed_scores, len(seed) - k)[len(seed) - k] if len(seed) >= k else -np.inf
+        # anything below threshold - 0.05 rounds to less than the threshold
+        candidates = np.ones(self.size, dtype=bool)
+        candidates[seed] = False
+        candidates &= upper >= threshold - 0.05 - PRUNE_SLACK
+        rest = np.flatnonzero(candidates)
+
+        rows = np.concatenate([seed, rest])
+        percents = np.concatenate([seed_scores, exact(rest)])
+        keep = percents > 0
+        rows, percents = rows[keep], percents[keep]
+        order = np.lexsort((rows, -percents))[:k]
+        return [(int(rows[i]), float(percents[i])) for i in order]
@@ -0,0 +1,142 @@
+"""
+Spatial index for distance-bucket scoring.
+
+Only the DIST_BUCKETS ring a publisher falls in (<=100, <=500, <=1000,
+<=2000 miles, or beyond) affects its score, so exact distances are only
+needed near the ring boundaries. CellIndex groups publishers into
+lat/lon grid cells, each with a bounding radius around its centre. For a
+query point:
+
+  * a cell whose whole radius lies inside one ring, clear of every cutoff's
+    HAVERSINE_MARGIN band, gets that ring for all its publishers at once
+  * only publishers in cells that straddle a boundary band are measured,
+    with Lambert's ellipsoidal formula (vectorized, within ~1.5e-6 of
+    geodesic up to 2,600 miles); the very few within LAMBERT_MARGIN of a
+    cutoff are re-measured with geodesic
+
+The cost therefore grows with the number of occupied cells and with the
+publishers near the four circles, not with the catalog size. Buckets are
+identical to measuring every publisher with geodesic.
+"""
+
+from typing import Tuple
+
+import numpy as np
+from geographiclib.geodesic import Geodesic
+from geopy.distance import ELLIPSOIDS
+
+EARTH_RADIUS_MILES = 3958.7613
+WGS84_A_MILES = ELLIPSOIDS["WGS-84"][0] / 1.609344
+WGS84_F = ELLIPSOIDS["WGS-84"][2]
+
+# haversine (sphere) vs geodesic (WGS-84) differ by at most ~0.56%
+HAVERSINE_MARGIN = 0.006
+
+# Lambert vs geodesic: worst relative error seen is ~1.4e-6 (random pairs up
+# to 2,600 miles, latitudes to +-85); the margin leaves ~70x headroom
+LAMBERT_MARGIN = 1e-4
+# Lambert's formula breaks down towards antipodes; beyond this (far outside
+# every finite cutoff) haversine is used as is
+LAMBERT_MAX_MILES = 5000.0
+
+# grid cell size; one degree of latitude is ~69 miles
+CELL_DEGREES = 1.0
+# guards the cell radius against float rounding in the triangle inequality
+RADIUS_SLACK = 1e-6
+
+# the ellipsoid geopy's geodesic uses, in km; one shared solver instead of one per call
+_WGS84 = Geodesic(ELLIPSOIDS["WGS-84"][0], ELLIPSOIDS["WGS-84"][2])
+
+
+def geodesic_miles(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Same value as geopy's geodesic(a, b).miles"""
+    km = _WGS84.Inverse(float(a[0]), float(a[1]), float(b[0]), float(b[1]), Geodesic.DISTANCE)["s12"]
+    return km / 1.609344
+
+
+def haversine_miles(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def lambert_miles(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Lambert's formula for the distance on the WGS-84 ellipsoid"""
+    b1 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lat)))
+    b2 = np.arctan((1 - WGS84_F) * np.tan(np.radians(lats)))
+    h = np.sin((b2 - b1) / 2) ** 2 + np.cos(b1) * np.cos(b2) * np.sin(np.radians(lons - lon) / 2) ** 2
+    sigma = 2 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+    p, q = (b1 + b2) / 2, (b2 - b1) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = (sigma - np.sin(sigma)) * np.sin(p) ** 2 * np.cos(q) ** 2 / np.cos(sigma / 2) ** 2
+        y = (sigma + np.sin(sigma)) * np.cos(p) ** 2 * np.sin(q) ** 2 / np.sin(sigma / 2) ** 2
+        miles = WGS84_A_MILES * (sigma - WGS84_F / 2 * (x + y))
+    return np.where(sigma > 0, miles, 0.0)
+
+
+def point_buckets(user: Tuple[float, float], lats: np.ndarray, lons: np.ndarray, cutoffs: np.ndarray) -> np.ndarray:
+    """Bucket index (searchsorted into `cutoffs`) of each point's geodesic distance from `user`"""
+    miles = haversine_miles(user[0], user[1], lats, lons)
+    close = miles < LAMBERT_MAX_MILES
+    miles[close] = lambert_miles(user[0], user[1], lats[close], lons[close])
+    finite = cutoffs[np.isfinite(cutoffs)]
+    near = (np.abs(miles[:, None] - finite[None, :]) <= finite * LAMBERT_MARGIN).any(axis=1)
+    for k in np.flatnonzero(near):
+        miles[k] = geodesic_miles(user, (lats[k], lons[k]))
+    return np.searchsorted(cutoffs, miles, side="left")
+
+
+class CellIndex:
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, cell_degrees: float = CELL_DEGREES):
+        self.size = len(lat)
+        located = np.flatnonzero(~np.isnan(lat))
+        n_cols = int(np.ceil(360 / cell_degrees))
+        rows = np.clip(np.floor((lat[located] + 90) / cell_degrees), 0, np.ceil(180 / cell_degrees) - 1)
+        cols = np.floor((lon[located] + 180) / cell_degrees) % n_cols
+        cell = (rows * n_cols + cols).astype(np.int64)
+
+        order = np.argsort(cell, kind="stable")
+        self.order = located[order]
+        self.lat = np.asarray(lat[self.order], dtype=float)
+        self.lon = np.asarray(lon[self.order], dtype=float)
+        cells, starts, counts = np.unique(cell[order], return_index=True, return_counts=True)
+        self.starts = starts
+        self.counts = counts
+
+        # cell centres, and the farthest member from each centre
+        self.cell_lat = (cells // n_cols + 0.5) * cell_degrees - 90
+        self.cell_lon = (cells % n_cols + 0.5) * cell_degrees - 180
+        if len(cells):
+            spread = haversine_miles(
+                np.repeat(self.cell_lat, counts), np.repeat(self.cell_lon, counts), self.lat, self.lon
+            )
+            self.cell_radius = np.maximum.reduceat(spread, starts) * (1 + RADIUS_SLACK) + RADIUS_SLACK
+        else:
+            self.cell_radius = np.zeros(0)
+
+    @property
+    def n_cells(self) -> int:
+        return len(self.starts)
+
+    def buckets(self, user: Tuple[float, float], cutoffs: np.ndarray) -> np.ndarray:
+        """
+        (size,) uint8 bucket index for every publisher; len(cutoffs) for
+        publishers without coordinates
+        """
+        out = np.full(self.size, len(cutoffs), dtype=np.uint8)
+        if not self.n_cells:
+            return out
+        centre = haversine_miles(user[0], user[1], self.cell_lat, self.cell_lon)
+        lo, hi = centre - self.cell_radius, centre + self.cell_radius
+        finite = cutoffs[np.isfinite(cutoffs)]
+        band_lo, band_hi = finite * (1 - HAVERSINE_MARGIN), finite * (1 + HAVERSINE_MARGIN)
+        straddle = ((hi[:, None] >= band_lo) & (lo[:, None] <= band_hi)).any(axis=1)
+
+        buckets = np.repeat(np.searchsorted(cutoffs, centre, side="left"), self.counts)
+        if straddle.any():
+            cells = np.flatnonzero(straddle)
+            members = np.concatenate([np.arange(self.starts[c], self.starts[c] + self.counts[c]) for c in cells])
+            buckets[members] = point_buckets(user, self.lat[members], self.lon[members], cutoffs)
+        out[self.order] = buckets
+        return out
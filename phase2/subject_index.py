@@ -0,0 +1,168 @@
+"""
+Inverted subject index with normalized and fuzzy subject matching.
+
+Publisher subjects and the subjects an author types are both reduced to a
+canonical key before comparing:
+
+  * lower-case, "&" -> "and", apostrophes dropped, other punctuation -> space
+  * each word singularized ("biographies" -> "biography", "memoirs" -> "memoir")
+  * SUBJECT_SYNONYMS applied ("sci fi" -> "science fiction", "humour" -> "humor")
+
+Publisher lists such as "Mystery & Crime, and Fiction" also leave entries
+like "and fiction" or "fantasy and science fiction" after splitting on
+commas. These are split on " and " into their subjects. An entry that
+splits into several subjects keeps its whole key as well, so an author who
+types "fantasy and science fiction" verbatim still matches it.
+
+Each canonical subject has a posting list: the sorted publisher indices
+that carry it. A query resolves each typed subject once (exact key, then a
+difflib fuzzy match over the canonical keys, memoized per index).
+Overlap is then a merge of the matched posting lists, so a query only
+touches the publishers that share a subject.
+"""
+
+import difflib
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# difflib ratio needed to accept a fuzzy subject match
+FUZZY_CUTOFF = 0.85
+# resolved user terms kept per index
+RESOLVE_CACHE_SIZE = 10_000
+
+# canonical key of an alias -> canonical key of the subject it means
+SUBJECT_SYNONYMS = {
+    "sci fi": "science fiction",
+    "scifi": "science fiction",
+    "sf": "science fiction",
+    "speculative fiction": "science fiction",
+    "ya": "young adult",
+    "ya fiction": "young adult",
+    "teen": "young adult",
+    "mg": "middle grade",
+    "kid": "childrens",
+    "children": "childrens",
+    "childrens book": "childrens",
+    "humour": "humor",
+    "comedy": "humor",
+    "non fiction": "nonfiction",
+    "lit fic": "literary fiction",
+    "litfic": "literary fiction",
+    "bio": "biography",
+    "poem": "poetry",
+    "cooking": "cookbook",
+    "cook book": "cookbook",
+    "recipe": "cookbook",
+    "movie": "film",
+    "cinema": "film",
+    "lgbt": "lgbtq",
+    "queer": "lgbtq",
+    "spiritual": "spirituality",
+    "self improvement": "self help",
+    "crime fiction": "crime",
+    "graphic": "graphic novel",
+}
+
+_PUNCT = re.compile(r"[^a-z0-9 ]+")
+
+
+def _singular(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def subject_key(subject: str) -> str:
+    """Canonical comparison key of one subject"""
+    text = subject.lower().replace("&", " and ").replace("'", "").replace("’", "")
+    key = " ".join(_singular(word) for word in _PUNCT.sub(" ", text).split())
+    return SUBJECT_SYNONYMS.get(key, key)
+
+
+def publisher_subject_keys(subject: str) -> List[str]:
+    """
+    Canonical keys of one publisher list entry, split on the list conjunction
+    "and"; the whole entry's key is kept too when it splits into several
+    """
+    parts = re.split(r"\band\b", subject.strip().lower())
+    keys = [key for key in (subject_key(part) for part in parts) if key]
+    if len(keys) > 1:
+        keys.append(subject_key(subject))
+    return keys
+
+
+class SubjectIndex:
+    def __init__(self, subject_names: List[str], indptr: np.ndarray, indices: np.ndarray, size: int):
+        """
+        `subject_names[i]` is the raw subject with ID i; publisher p carries
+        the raw IDs indices[indptr[p]:indptr[p + 1]] (the catalog's CSR).
+        """
+        self.size = size
+        self.canonical: Dict[str, int] = {}
+        raw_to_canonical = []
+        for name in subject_names:
+            raw_to_canonical.append([self.canonical.setdefault(key, len(self.canonical))
+                                     for key in publisher_subject_keys(name)])
+        self.keys = list(self.canonical)
+
+        # raw subject -> publishers, then union per canonical subject
+        indptr = np.asarray(indptr)
+        indices = np.asarray(indices)
+        publishers = np.repeat(np.arange(size), np.diff(indptr))
+        order = np.argsort(indices, kind="stable")
+        raw_bounds = np.searchsorted(indices[order], np.arange(len(subject_names) + 1))
+        merged: List[List[np.ndarray]] = [[] for _ in self.keys]
+        for raw, targets in enumerate(raw_to_canonical):
+            posting = publishers[order[raw_bounds[raw]:raw_bounds[raw + 1]]]
+            for canonical in targets:
+                merged[canonical].append(posting)
+        postings = [np.unique(np.concatenate(parts)) if parts else np.empty(0, np.int64) for parts in merged]
+        self.post_indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        self.post_indptr[1:] = np.cumsum([len(p) for p in postings])
+        self.post_indices = (np.concatenate(postings) if postings else np.empty(0)).astype(np.int32)
+
+        self.resolved: Dict[str, Optional[int]] = {}
+
+    def posting(self, canonical: int) -> np.ndarray:
+        return self.post_indices[self.post_indptr[canonical]:self.post_indptr[canonical + 1]]
+
+    def resolve(self, term: str) -> Optional[int]:
+        """Canonical subject ID for a typed subject (exact key, then fuzzy), or None"""
+        try:
+            return self.resolved[term]
+        except KeyError:
+            # not resolved yet (or the cache was just cleared by another thread)
+            pass
+        key = subject_key(term)
+        canonical = self.canonical.get(key)
+        if canonical is None and key:
+            match = difflib.get_close_matches(key, self.keys, n=1, cutoff=FUZZY_CUTOFF)
+            canonical = self.canonical[match[0]] if match else None
+        if len(self.resolved) >= RESOLVE_CACHE_SIZE:
+            self.resolved.clear()
+        self.resolved[term] = canonical
+        return canonical
+
+    def describe(self, terms: List[str]) -> List[Tuple[str, Optional[str]]]:
+        """(typed subject, canonical subject it matched or None)"""
+        return [(term, None if self.resolve(term) is None else self.keys[self.resolve(term)]) for term in terms]
+
+    def matches(self, terms: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """(publishers, number of distinct matched subjects) for publishers sharing any subject"""
+        ids = {self.resolve(term) for term in terms} - {None}
+        if not ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        merged = np.concatenate([self.posting(canonical) for canonical in ids])
+        return np.unique(merged, return_counts=True)
+
+    def overlap(self, terms: List[str]) -> np.ndarray:
+        """|publisher subjects ∩ user subjects| / len(user subjects) for every publisher"""
+        overlap = np.zeros(self.size)
+        if terms:
+            publishers, counts = self.matches(terms)
+            overlap[publishers] = counts / len(terms)
+        return overlap
@@ -0,0 +1,132 @@
+"""
+Persistent, content-addressed cache for manuscript analysis.
+
+Entries live in a single SQLite file and are keyed by a hash of the
+normalized text plus everything that affects the output (model names,
+label set, analysis options). Two kinds of entries are stored:
+
+  * "result" - a full analysis result for one manuscript
+  * "chunk"  - the 14 fused label scores for one classified chunk, so an
+               edited manuscript only re-classifies the chunks that changed
+
+The file is bounded to `max_bytes`; least recently used entries are evicted
+first. Hit/miss counters are kept per kind for the lifetime of the object.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent / "analysis_cache.sqlite3"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Unicode-normalize and collapse whitespace so trivial re-saves hash the same"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def make_key(kind, text, config):
+    """sha256 of the entry kind, the (JSON-serializable) config and the normalized text"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"kind": kind, "config": config}, sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._conn.commit()
+
+    def get(self, key, kind="result"):
+        return self.get_many([key], kind).get(key)
+
+    def get_many(self, keys, kind="result"):
+        """Return {key: value} for the keys that are cached, marking them as recently used"""
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _QUERY_CHUNK):
+                group = keys[start:start + _QUERY_CHUNK]
+                marks = ",".join("?" * len(group))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM entries WHERE kind = ? AND key IN ({marks})", [kind, *group]
+                ).fetchall()
+                found.update((key, json.loads(value)) for key, value in rows)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                self._conn.commit()
+        self.hits[kind] += len(found)
+        self.misses[kind] += len(set(keys)) - len(found)
+        return found
+
+    def put(self, key, value, kind="result"):
+        self.put_many({key: value}, kind)
+
+    def put_many(self, items, kind="result"):
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            encoded = json.dumps(value, ensure_ascii=False)
+            rows.append((key, kind, encoded, len(encoded.encode("utf-8")), now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, kind, value, size, last_used) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_used ASC"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"hits": dict(self.hits), "misses": dict(self.misses), "entries": entries, "bytes": size}
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
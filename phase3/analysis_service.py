@@ -0,0 +1,419 @@
+"""
+Resident manuscript analysis service.
+
+Loads the models once, then serves analysis over local HTTP (TCP or a Unix
+socket) so callers such as the Express backend never pay model start-up per
+request.
+
+  * Worker pool: `--workers N` forked processes run the analysis. With the
+    torch backend the models are loaded in the parent before forking, so the
+    workers share the weights copy-on-write instead of each holding a copy.
+  * Micro-batching: requests are queued and grouped into batches of up to
+    `--batch-size` texts; a batch is dispatched when it is full or when its
+    oldest request has waited `--max-wait-ms`.
+  * Metrics: per-endpoint latency histograms at GET /metrics, and a health
+    endpoint at GET /health for the server to poll.
+
+Endpoints:
+    POST /analyze   {"text": "..."} or {"texts": ["...", ...]}
+                    -> {"results": [...]}
+    GET  /health    -> {"status": "ok", "workers": ..., "queued": ..., ...}
+    GET  /metrics   -> {"latency_ms": {endpoint: histogram}, ...}
+
+Usage:
+    python analysis_service.py --port 8765 --workers 2
+    python analysis_service.py --socket /tmp/kavvy-analysis.sock
+"""
+
+import argparse
+import bisect
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from manuscript_model import BACKENDS, BATCH_SIZE, CLASSIFIER_MODEL, POOLING_METHODS, ManuscriptAnalyzer
+
+DEFAULT_PORT = 8765
+MAX_WAIT_MS = 20
+REQUEST_TIMEOUT_S = 300
+MAX_BODY_BYTES = 50 * 1024 * 1024
+# endpoints with their own latency histogram; any other path is counted as "other"
+ROUTES = {"GET": ("/health", "/metrics"), "POST": ("/analyze",)}
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf")]
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles are reported at bucket resolution"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = list(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, ms):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+            self.count += 1
+            self.total_ms += ms
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (q in 0..100)"""
+        if not self.count:
+            return None
+        target = q / 100 * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return self.buckets[-1]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "mean_ms": self.total_ms / self.count if self.count else None,
+                "p50_ms": self.percentile(50),
+                "p90_ms": self.percentile(90),
+                "p99_ms": self.percentile(99),
+                "buckets": {("+Inf" if b == float("inf") else str(b)): n for b, n in zip(self.buckets, self.counts)},
+            }
+
+
+# Worker side: the analyzer is a module global so forked workers inherit it
+_worker_analyzer = None
+
+
+def _init_worker(threads):
+    global _worker_analyzer
+    if threads:
+        import torch
+
+        torch.set_num_threads(threads)
+    cache = _worker_analyzer.cache
+    if cache is not None:
+        # SQLite connections must not be shared across fork
+        from analysis_cache import AnalysisCache
+
+        _worker_analyzer.cache = AnalysisCache(cache.path, max_bytes=cache.max_bytes)
+
+
+def _analyze_in_worker(texts, batch_size):
+    return _worker_analyzer.analyze_batch(texts, batch_size=batch_size)
+
+
+class MicroBatcher:
+    """
+    Groups single-text jobs into batches and hands them to the worker pool.
+    A batch closes when it holds `batch_size` texts or `max_wait_ms` after
+    its first job was queued, whichever comes first. A batch that has not
+    come back after `batch_timeout` seconds (e.g. its worker process died)
+    fails its requests with a TimeoutError.
+    """
+
+    def __init__(self, pool, batch_size=BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, batch_timeout=REQUEST_TIMEOUT_S):
+        self.pool = pool
+        self.batch_timeout = batch_timeout
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.jobs = queue.Queue()
+        self.in_flight = 0
+        self.batch_sizes = LatencyHistogram(buckets=[1, 2, 4, 8, 16, 32, 64, float("inf")])
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text):
+        future = Future()
+        self.jobs.put((time.monotonic(), text, future))
+        return future
+
+    def _run(self):
+        while True:
+            first = self.jobs.get()
+            batch = [first]
+            deadline = first[0] + self.max_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.jobs.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        texts = [text for _, text, _ in batch]
+        futures = [future for _, _, future in batch]
+        self.batch_sizes.observe(len(batch))
+        with self._lock:
+            self.in_flight += len(batch)
+        result = self.pool.apply_async(_analyze_in_worker, (texts, len(texts)))
+        threading.Thread(target=self._wait, args=(result, futures), name="batch-waiter", daemon=True).start()
+
+    def _wait(self, result, futures):
+        # a worker that dies mid-batch never reports back, so the wait is bounded
+        error = None
+        try:
+            results = result.get(timeout=self.batch_timeout)
+        except multiprocessing.TimeoutError:
+            error = TimeoutError(f"batch of {len(futures)} not analyzed within {self.batch_timeout:g} s")
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                self.in_flight -= len(futures)
+        for i, future in enumerate(futures):
+            if error is None:
+                future.set_result(results[i])
+            else:
+                future.set_exception(error)
+
+
+class InlinePool:
+    """Stand-in for multiprocessing.Pool that runs jobs on a thread (`--workers 0`)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def apply_async(self, fn, args):
+        future = Future()
+
+        def run():
+            try:
+                with self._lock:
+                    future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return InlineResult(future)
+
+    def close(self):
+        pass
+
+
+class InlineResult:
+    """The AsyncResult.get() side of a Future"""
+
+    def __init__(self, future):
+        self.future = future
+
+    def get(self, timeout=None):
+        try:
+            return self.future.result(timeout)
+        except TimeoutError:
+            raise multiprocessing.TimeoutError() from None
+
+
+class AnalysisService:
+    def __init__(self, analyzer, workers=1, batch_size=BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, threads_per_worker=None,
+                 batch_timeout=REQUEST_TIMEOUT_S):
+        global _worker_analyzer
+        _worker_analyzer = analyzer
+        self.workers = workers
+        self.started = time.time()
+        self.latency = {}
+        self._latency_lock = threading.Lock()
+
+        if workers > 0:
+            # fork so workers inherit the already-loaded weights copy-on-write
+            context = multiprocessing.get_context("fork")
+            self.pool = context.Pool(workers, initializer=_init_worker, initargs=(threads_per_worker,))
+        else:
+            self.pool = InlinePool()
+        self.batcher = MicroBatcher(self.pool, batch_size=batch_size, max_wait_ms=max_wait_ms, batch_timeout=batch_timeout)
+
+    def analyze(self, texts, timeout=REQUEST_TIMEOUT_S):
+        futures = [self.batcher.submit(text) for text in texts]
+        return [future.result(timeout=timeout) for future in futures]
+
+    def observe(self, endpoint, ms):
+        with self._latency_lock:
+            histogram = self.latency.setdefault(endpoint, LatencyHistogram())
+        histogram.observe(ms)
+
+    def health(self):
+        return {
+            "status": "ok",
+            "workers": self.workers,
+            "queued": self.batcher.jobs.qsize(),
+            "in_flight": self.batcher.in_flight,
+            "uptime_s": round(time.time() - self.started, 1),
+        }
+
+    def metrics(self):
+        with self._latency_lock:
+            latency = {endpoint: h.snapshot() for endpoint, h in self.latency.items()}
+        return {"latency_ms": latency, "batch_size": self.batcher.batch_sizes.snapshot(), **self.health()}
+
+    def close(self):
+        self.pool.close()
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    service = None  # set by make_server
+
+    def route(self):
+        """Request path without the query string"""
+        return urlsplit(self.path).path
+
+    def metric(self):
+        """Histogram key: the matched route, so clients cannot add keys with made-up paths"""
+        route = self.route()
+        return f"{self.command} {route if route in ROUTES.get(self.command, ()) else 'other'}"
+
+    def do_GET(self):
+        start = time.perf_counter()
+        try:
+            route = self.route()
+            if route == "/health":
+                self._send(200, self.service.health())
+            elif route == "/metrics":
+                self._send(200, self.service.metrics())
+            else:
+                self._send(404, {"message": "Not found"})
+        finally:
+            self.service.observe(self.metric(), (time.perf_counter() - start) * 1000)
+
+    def do_POST(self):
+        start = time.perf_counter()
+        try:
+            self._post()
+        finally:
+            # errors and timeouts count too, so /metrics shows what callers actually waited
+            self.service.observe(self.metric(), (time.perf_counter() - start) * 1000)
+
+    def _post(self):
+        if self.route() != "/analyze":
+            self._send(404, {"message": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_BODY_BYTES:
+                self._send(413, {"message": "Request body too large"})
+                return
+            body = json.loads(self.rfile.read(length) or b"{}")
+            texts = body["texts"] if "texts" in body else [body["text"]]
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("texts must be a list of strings")
+        except (KeyError, TypeError, ValueError) as e:
+            self._send(400, {"message": f"Expected {{\"text\": str}} or {{\"texts\": [str]}}: {e}"})
+            return
+        try:
+            results = self.service.analyze(texts)
+        except Exception as e:
+            self._send(500, {"message": str(e)})
+            return
+        self._send(200, {"results": results})
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix-socket clients have no (host, port) address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT, socket_path=None):
+    handler = type("BoundAnalysisHandler", (AnalysisHandler,), {"service": service})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        return UnixHTTPServer(socket_path, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", default=None, help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=1, help="analysis processes (0 = run in the server process)")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="torch intra-op threads per worker")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--batch-timeout", type=float, default=REQUEST_TIMEOUT_S,
+                        help="seconds before a batch whose worker never answered is failed")
+    parser.add_argument("--model", default=CLASSIFIER_MODEL)
+    parser.add_argument("--backend", choices=BACKENDS, default="torch")
+    parser.add_argument("--onnx-dir", default=None)
+    parser.add_argument("--chunked", action="store_true")
+    parser.add_argument("--max-chunks", type=int, default=None)
+    parser.add_argument("--pooling", choices=POOLING_METHODS, default="mean")
+    parser.add_argument("--cache", default=None, help="analysis cache file")
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache:
+        from analysis_cache import AnalysisCache
+
+        cache = AnalysisCache(args.cache)
+    analyzer = ManuscriptAnalyzer(
+        classifier_model=args.model,
+        backend=args.backend,
+        onnx_dir=args.onnx_dir,
+        chunked=args.chunked,
+        max_chunks=args.max_chunks,
+        pooling=args.pooling,
+        cache=cache,
+    )
+    analyzer.load_spacy()
+    if args.backend == "torch" or args.workers == 0:
+        # ONNX Runtime sessions do not survive fork; onnx workers load their own
+        analyzer.load_classifier()
+
+    service = AnalysisService(
+        analyzer,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        max_wait_ms=args.max_wait_ms,
+        threads_per_worker=args.threads_per_worker,
+        batch_timeout=args.batch_timeout,
+    )
+    server = make_server(service, args.host, args.port, args.socket)
+    where = args.socket or f"http://{args.host}:{args.port}"
+    print(f"Analysis service listening on {where} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Accuracy parity and latency/throughput of the classifier backends.
+
+Runs the fused classifier on the sample manuscripts (head plus chunks) with
+the torch backend and with the exported ONNX models (fp32 and int8), then
+reports how far the ONNX scores drift from torch and how fast each is.
+
+Usage:
+    python onnx_backend.py export [--model ...]     # once
+    python benchmark_backends.py parity [--model ...]
+    python benchmark_backends.py bench [--model ...] [--batch-sizes 1 4 8]
+"""
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+from manuscript_model import CLASSIFIER_MODEL, CLASSIFY_CHARS, ManuscriptAnalyzer, scores_to_outputs
+
+HERE = Path(__file__).resolve().parent
+
+VARIANTS = {
+    "torch": {"backend": "torch"},
+    "onnx-fp32": {"backend": "onnx", "quantized": False},
+    "onnx-int8": {"backend": "onnx", "quantized": True},
+}
+
+
+def sample_texts(files, max_chunks, model):
+    """Heads and evenly spaced chunks of each manuscript"""
+    chunker = ManuscriptAnalyzer(classifier_model=model, max_chunks=max_chunks)
+    texts = []
+    for path in files:
+        text = path.read_text(encoding="utf-8")
+        texts.append(text[:CLASSIFY_CHARS])
+        texts.extend(chunker.split_chunks(text))
+    return texts
+
+
+def load_variants(names, model, onnx_dir):
+    analyzers = {}
+    for name in names:
+        analyzer = ManuscriptAnalyzer(classifier_model=model, onnx_dir=onnx_dir, **VARIANTS[name])
+        try:
+            analyzer.load_classifier()
+        except RuntimeError as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        analyzers[name] = analyzer
+    return analyzers
+
+
+def parity(analyzers, texts, batch_size):
+    reference = analyzers["torch"].fused_probabilities(texts, batch_size)
+    ref_outputs = [scores_to_outputs(row) for row in reference]
+    print(f"{'backend':<10} {'max |diff|':>11} {'mean |diff|':>12} {'top-3 genres':>13} {'academic':>9} {'religious':>10}")
+    for name, analyzer in analyzers.items():
+        if name == "torch":
+            continue
+        scores = analyzer.fused_probabilities(texts, batch_size)
+        diff = (scores - reference).abs()
+        outputs = [scores_to_outputs(row) for row in scores]
+        top3 = statistics.mean(
+            [l for l, _ in a["genres"][:3]] == [l for l, _ in b["genres"][:3]] for a, b in zip(outputs, ref_outputs)
+        )
+        academic = statistics.mean(a["academic_focus"] == b["academic_focus"] for a, b in zip(outputs, ref_outputs))
+        religious = statistics.mean(a["religious_focus"] == b["religious_focus"] for a, b in zip(outputs, ref_outputs))
+        print(f"{name:<10} {diff.max().item():>11.4f} {diff.mean().item():>12.4f} "
+              f"{top3:>13.1%} {academic:>9.1%} {religious:>10.1%}")
+
+
+def bench(analyzers, texts, batch_sizes, runs):
+    print(f"{'backend':<10} {'batch':>6} {'s / text':>10} {'texts / s':>10}")
+    for name, analyzer in analyzers.items():
+        for batch_size in batch_sizes:
+            analyzer.fused_probabilities(texts[:batch_size], batch_size)  # warm-up
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                analyzer.fused_probabilities(texts, batch_size)
+                timings.append(time.perf_counter() - start)
+            elapsed = statistics.median(timings)
+            print(f"{name:<10} {batch_size:>6} {elapsed / len(texts):>10.3f} {len(texts) / elapsed:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["parity", "bench"])
+    parser.add_argument("files", nargs="*", type=Path)
+    parser.add_argument("--model", default=CLASSIFIER_MODEL)
+    parser.add_argument("--onnx-dir", default=None)
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument("--max-chunks", type=int, default=4, help="chunks per manuscript besides the head")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    files = args.files or sorted((HERE / "manuscripts").glob("*.txt"))
+    variants = args.variants
+    if args.command == "parity" and "torch" not in variants:
+        variants = ["torch", *variants]
+    analyzers = load_variants(variants, args.model, args.onnx_dir)
+    if not analyzers:
+        return
+    texts = sample_texts(files, args.max_chunks, args.model)
+    print(f"{len(texts)} texts from {len(files)} manuscripts\n")
+
+    if args.command == "parity":
+        if "torch" not in analyzers:
+            print("The torch backend is required as the parity reference")
+            return
+        parity(analyzers, texts, max(args.batch_sizes))
+    else:
+        bench(analyzers, texts, args.batch_sizes, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Per-manuscript classification latency for manuscript_model.
+
+Compares the three separate zero-shot pipeline calls against the fused
+single-batch pass, on the sample manuscripts (or any .txt files given).
+
+Usage:
+    python benchmark_inference.py [--runs 5] [files ...]
+"""
+
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+from manuscript_model import CLASSIFY_CHARS, ManuscriptAnalyzer
+
+HERE = Path(__file__).resolve().parent
+
+
+def time_call(fn, text, runs):
+    fn(text)  # warm-up
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def separate(analyzer):
+    def run(text):
+        analyzer.predict_genre(text)
+        analyzer.predict_academic_focus(text)
+        analyzer.predict_religious_focus(text)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", type=Path)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    files = args.files or sorted((HERE / "manuscripts").glob("*.txt"))
+    analyzer = ManuscriptAnalyzer()
+    analyzer.load_classifier()
+
+    modes = {"separate": separate(analyzer), "fused": analyzer.classify_fused}
+
+    print(f"{'file':<28} " + " ".join(f"{m + ' (s)':>14}" for m in modes) + f" {'speedup':>8}")
+    for path in files:
+        text = path.read_text(encoding="utf-8")[:CLASSIFY_CHARS]
+        timings = {m: time_call(fn, text, args.runs) for m, fn in modes.items()}
+        speedup = timings["separate"] / timings["fused"]
+        print(f"{path.name:<28} " + " ".join(f"{t:>14.3f}" for t in timings.values()) + f" {speedup:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
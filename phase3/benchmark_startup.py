@@ -0,0 +1,72 @@
+"""
+Startup benchmark for manuscript_model.
+
+Runs each scenario in a fresh interpreter and reports wall-clock time and
+peak RSS:
+
+  * import  - `import manuscript_model` only (models load lazily)
+  * eager   - import + load every model up front, i.e. what importing the
+              module used to cost before models were made lazy
+
+Usage:
+    python benchmark_startup.py [--runs 3]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+SCENARIOS = {
+    "import": "import manuscript_model",
+    "eager": "import manuscript_model\nmanuscript_model.ManuscriptAnalyzer().load_all()",
+}
+
+# Child process: time the snippet and report peak RSS in MB
+CHILD_TEMPLATE = """
+import contextlib, io, json, resource, sys, time
+sys.path.insert(0, {here!r})
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+{body}
+elapsed = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss /= 1024  # bytes on macOS, KB on Linux
+print(json.dumps({{"seconds": elapsed, "peak_rss_mb": rss / 1024}}))
+"""
+
+
+def run_scenario(body):
+    indented = "\n".join("    " + line for line in body.splitlines())
+    code = CHILD_TEMPLATE.format(here=str(HERE), body=indented)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else "child failed")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="runs per scenario (median is reported)")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    args = parser.parse_args()
+
+    print(f"{'scenario':<10} {'time (s)':>10} {'peak RSS (MB)':>15}")
+    for name in args.scenarios:
+        try:
+            runs = [run_scenario(SCENARIOS[name]) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name:<10} failed: {e}")
+            continue
+        seconds = statistics.median(r["seconds"] for r in runs)
+        rss = statistics.median(r["peak_rss_mb"] for r in runs)
+        print(f"{name:<10} {seconds:>10.3f} {rss:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
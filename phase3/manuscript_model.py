@@ -1,10 +1,63 @@
+import argparse
+import json
 import re
-import spacy
 import subprocess
 import sys
-from transformers import pipeline
+import zlib
+from collections import Counter
+from pathlib import Path
 
-def download_spacy_model(model_name="en_core_web_sm"):
+# spaCy and transformers are imported inside the loaders below so that
+# importing this module stays cheap; models load on first use.
+SPACY_MODEL = "en_core_web_sm"
+CLASSIFIER_MODEL = "facebook/bart-large-mnli"
+# Smaller MNLI checkpoint with the same label layout, for latency-bound runs
+DISTILLED_CLASSIFIER_MODEL = "valhalla/distilbart-mnli-12-1"
+
+# Inference backends for the classifier; "onnx" needs an export from onnx_backend.py
+BACKENDS = ("torch", "onnx")
+
+GENRE_LABELS = ["Romance", "Science Fiction", "Fantasy", "Mystery", "Thriller", "Non-Fiction", "Drama", "Comedy", "Historical", "Adventure"]
+ACADEMIC_LABELS = ["Academic", "Not academic"]
+RELIGIOUS_LABELS = ["Religious", "Not religious"]
+FUSED_LABELS = GENRE_LABELS + ACADEMIC_LABELS + RELIGIOUS_LABELS
+
+# Same default template the zero-shot pipeline uses
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+# Number of leading characters passed to the classifier
+CLASSIFY_CHARS = 1000
+
+# Manuscripts (or chunks) per forward pass; each one contributes 14 NLI pairs
+BATCH_SIZE = 8
+
+# Chunked mode: tokens per window (leaves room for the hypothesis within
+# BART's 1024-token limit) and how per-chunk scores are combined
+CHUNK_TOKENS = 400
+POOLING_METHODS = ("mean", "max", "attention")
+ATTENTION_TEMPERATURE = 0.1
+
+# Chunks are packed from whole paragraphs and also end after any paragraph
+# whose hash is 0 mod this value, so boundaries depend on content rather than
+# position and an edit only changes the chunks around it
+CHUNK_BOUNDARY_EVERY = 8
+
+LOCATION_PATTERN = re.compile(r"(Location|Lives in|From|Based in):?\s+([A-Z][a-zA-Z\s,]+)")
+
+# Location extraction only needs NER; these components are never loaded
+SPACY_EXCLUDE = ["tagger", "parser", "senter", "attribute_ruler", "lemmatizer"]
+
+# Text is streamed through spaCy paragraph by paragraph
+PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+PARAGRAPH_CHARS = 10000
+SPACY_BATCH_SIZE = 64
+
+# A GPE counts as high-confidence for early stopping once seen this often
+# (regex hits always count)
+LOCATION_MIN_MENTIONS = 2
+
+
+def download_spacy_model(model_name=SPACY_MODEL):
     """Download spaCy model if not available"""
     try:
         subprocess.check_call([sys.executable, "-m", "spacy", "download", model_name])
@@ -14,17 +67,22 @@ def download_spacy_model(model_name="en_core_web_sm"):
         print(f"Failed to download {model_name}: {e}")
         return False
 
-def load_spacy_model(model_name="en_core_web_sm"):
-    """Load spaCy model, download if necessary"""
+def load_spacy_model(model_name=SPACY_MODEL, auto_download=True, exclude=()):
+    """Load spaCy model, download if necessary (and allowed)"""
+    import spacy
+
     try:
-        nlp = spacy.load(model_name)
+        nlp = spacy.load(model_name, exclude=exclude)
         print(f"Loaded spaCy model: {model_name}")
         return nlp
     except OSError:
+        if not auto_download:
+            print(f"Model '{model_name}' not found and auto-download is disabled")
+            return None
         print(f"Model '{model_name}' not found. Attempting to download...")
         if download_spacy_model(model_name):
             try:
-                nlp = spacy.load(model_name)
+                nlp = spacy.load(model_name, exclude=exclude)
                 print(f"Successfully loaded {model_name} after download")
                 return nlp
             except OSError:
@@ -34,80 +92,783 @@ def load_spacy_model(model_name="en_core_web_sm"):
             print(f"Could not download {model_name}")
             return None
 
-# Load spaCy model for NER (with auto-download)
-print("Loading spaCy model...")
-nlp = load_spacy_model("en_core_web_sm")
+def load_classifier(model_name=CLASSIFIER_MODEL):
+    """Load Hugging Face zero-shot classifier"""
+    from transformers import pipeline
+
+    classifier = pipeline("zero-shot-classification", model=model_name)
+    print(f"Loaded Hugging Face classifier: {model_name}")
+    return classifier
+
+
+class ManuscriptAnalyzer:
+    """
+    Reusable manuscript analyzer.
+
+    Models are loaded lazily the first time they are needed, so constructing
+    an analyzer (or importing this module) is cheap. Each model can also be
+    loaded on its own with `load_spacy()` / `load_classifier()`.
+
+    With `chunked=True` the whole manuscript is classified instead of the
+    first CLASSIFY_CHARS characters: it is split into `chunk_tokens` windows,
+    optionally sampled down to `max_chunks` evenly spaced ones, and the
+    per-chunk scores are combined with `pooling` ("mean", "max" or
+    "attention").
+
+    Location extraction loads spaCy with only the NER component (`ner_only`)
+    and streams text through `nlp.pipe` paragraph by paragraph, using
+    `n_process` processes. With `location_limit` set, a manuscript stops
+    being scanned once that many high-confidence locations are found.
+
+    `backend="onnx"` runs the fused classifier through ONNX Runtime from a
+    directory exported by onnx_backend.py (`onnx_dir`, int8 unless
+    `quantized=False`); the separate pipeline calls need `backend="torch"`.
+
+    Pass an `analysis_cache.AnalysisCache` as `cache` to reuse results for
+    text that was analyzed before (no model is loaded on a hit) and to reuse
+    per-chunk scores in chunked mode.
+    """
+
+    def __init__(self, spacy_model=SPACY_MODEL, classifier_model=CLASSIFIER_MODEL, auto_download=True, fused=True,
+                 chunked=False, chunk_tokens=CHUNK_TOKENS, max_chunks=None, pooling="mean",
+                 ner_only=True, n_process=1, location_limit=None, cache=None,
+                 backend="torch", onnx_dir=None, quantized=True):
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+        if backend == "onnx" and not fused:
+            raise ValueError("the onnx backend only supports fused classification")
+        if pooling not in POOLING_METHODS:
+            raise ValueError(f"pooling must be one of {POOLING_METHODS}, got {pooling!r}")
+        if max_chunks is not None and max_chunks < 1:
+            raise ValueError("max_chunks must be at least 1")
+        self.spacy_model = spacy_model
+        self.classifier_model = classifier_model
+        self.auto_download = auto_download
+        self.fused = fused
+        self.chunked = chunked
+        self.chunk_tokens = chunk_tokens
+        self.max_chunks = max_chunks
+        self.pooling = pooling
+        self.ner_only = ner_only
+        self.n_process = n_process
+        self.location_limit = location_limit
+        self.cache = cache
+        self.backend = backend
+        self.onnx_dir = onnx_dir
+        self.quantized = quantized
+        self._nlp = None
+        self._classifier = None
+        self._tokenizer = None
+
+    # Model loading
+    def load_spacy(self):
+        """Load the spaCy model if it is not loaded yet"""
+        if self._nlp is None:
+            print("Loading spaCy model...")
+            exclude = SPACY_EXCLUDE if self.ner_only else ()
+            nlp = load_spacy_model(self.spacy_model, auto_download=self.auto_download, exclude=exclude)
+            if nlp is None:
+                raise RuntimeError(f"Cannot load spaCy model '{self.spacy_model}'")
+            # en_core_web_sm's NER has its own embedding layer, so the shared
+            # tok2vec is dead weight once the tagger and parser are gone
+            if self.ner_only and "tok2vec" in nlp.pipe_names and not nlp.get_pipe("tok2vec").listening_components:
+                nlp.remove_pipe("tok2vec")
+            self._nlp = nlp
+        return self._nlp
+
+    def load_classifier(self):
+        """Load the zero-shot classifier if it is not loaded yet"""
+        if self._classifier is None:
+            print("Loading ONNX classifier..." if self.backend == "onnx" else "Loading Hugging Face classifier...")
+            try:
+                if self.backend == "onnx":
+                    from onnx_backend import OnnxClassifier, default_onnx_dir
+
+                    onnx_dir = self.onnx_dir or default_onnx_dir(self.classifier_model)
+                    self._classifier = OnnxClassifier(onnx_dir, quantized=self.quantized)
+                    print(f"Loaded ONNX classifier: {self._classifier.path}")
+                else:
+                    self._classifier = load_classifier(self.classifier_model)
+            except Exception as e:
+                raise RuntimeError(f"Failed to load Hugging Face classifier: {e}") from e
+        return self._classifier
+
+    def load_all(self):
+        """Eagerly load every model (e.g. before forking workers)"""
+        self.load_spacy()
+        self.load_classifier()
+        return self
+
+    @property
+    def nlp(self):
+        return self.load_spacy()
+
+    @property
+    def classifier(self):
+        return self.load_classifier()
+
+    @property
+    def tokenizer(self):
+        """Classifier tokenizer; loaded on its own so chunking does not need the model"""
+        if self._classifier is not None:
+            return self._classifier.tokenizer
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            self._tokenizer = AutoTokenizer.from_pretrained(self.classifier_model)
+        return self._tokenizer
+
+    # Cache keys
+    def result_config(self):
+        """Everything besides the text that affects analyze() output"""
+        return {
+            "spacy_model": self.spacy_model,
+            "ner_only": self.ner_only,
+            "location_limit": self.location_limit,
+            **self.chunk_config(),
+            "fused": self.fused,
+            "chunked": self.chunked,
+            "classify_chars": CLASSIFY_CHARS,
+            "chunk_tokens": self.chunk_tokens,
+            "max_chunks": self.max_chunks,
+            "pooling": self.pooling,
+        }
+
+    def chunk_config(self):
+        """Everything besides the text that affects the scores of one chunk"""
+        return {
+            "classifier_model": self.classifier_model,
+            "backend": self.backend,
+            "quantized": self.backend == "onnx" and self.quantized,
+            "labels": FUSED_LABELS,
+            "template": HYPOTHESIS_TEMPLATE,
+        }
+
+    # Extract Author Location
+    def extract_location_spacy(self, text):
+        locations = []
+        for doc in self.nlp.pipe(iter_paragraphs(text), batch_size=SPACY_BATCH_SIZE, n_process=self.n_process):
+            locations.extend(ent.text for ent in doc.ents if ent.label_ == "GPE")
+        return locations
+
+    def extract_location_regex(self, text):
+        return [match[1] for match in LOCATION_PATTERN.findall(text)]
+
+    def get_author_location(self, text):
+        return self.get_author_locations([text])[0]
+
+    def get_author_locations(self, texts, batch_size=SPACY_BATCH_SIZE):
+        """
+        get_author_location for many texts. Paragraphs of every text go
+        through one nlp.pipe stream, so only a batch of small Docs is alive
+        at a time; texts that already have enough locations are skipped.
+        """
+        texts = list(texts)
+        locs_regex = [self.extract_location_regex(text) for text in texts]
+        locs_spacy = [[] for _ in texts]
+        mentions = [Counter() for _ in texts]
+        done = [self._enough_locations(regex, Counter()) for regex in locs_regex]
+
+        def paragraphs():
+            for i, text in enumerate(texts):
+                for paragraph in iter_paragraphs(text):
+                    if done[i]:
+                        break
+                    yield paragraph, i
+
+        docs = self.nlp.pipe(paragraphs(), as_tuples=True, batch_size=batch_size, n_process=self.n_process)
+        for doc, i in docs:
+            if done[i]:
+                continue
+            for ent in doc.ents:
+                if ent.label_ == "GPE":
+                    locs_spacy[i].append(ent.text)
+                    mentions[i][ent.text] += 1
+            done[i] = self._enough_locations(locs_regex[i], mentions[i])
+
+        return [merge_locations(spacy_hits, regex_hits) for spacy_hits, regex_hits in zip(locs_spacy, locs_regex)]
+
+    def _enough_locations(self, locs_regex, mentions):
+        if self.location_limit is None:
+            return False
+        confident = set(locs_regex) | {loc for loc, n in mentions.items() if n >= LOCATION_MIN_MENTIONS}
+        return len(confident) >= self.location_limit
+
+    # Predict Genre
+    def predict_genre(self, text):
+        result = self.classifier(text, GENRE_LABELS, multi_label=True)
+        return list(zip(result["labels"], result["scores"]))
+
+    # Predict Academic Focus
+    def predict_academic_focus(self, text):
+        result = self.classifier(text, candidate_labels=ACADEMIC_LABELS)
+        return result["labels"][0]
+
+    # Predict Religious Focus
+    def predict_religious_focus(self, text):
+        result = self.classifier(text, candidate_labels=RELIGIOUS_LABELS)
+        return result["labels"][0]  # Best match
+
+    # Fused classification: one padded NLI batch for all 14 labels
+    def nli_logits(self, premises, hypotheses):
+        """
+        Run premise/hypothesis pairs through the NLI model in one batch.
+        Returns an (n, 2) tensor of [contradiction, entailment] logits.
+        """
+        import torch
+
+        classifier = self.classifier
+        if self.backend == "onnx":
+            return classifier.nli_logits(premises, hypotheses)
+        inputs = classifier.tokenizer(
+            premises,
+            hypotheses,
+            padding=True,
+            truncation="only_first",
+            return_tensors="pt",
+        ).to(classifier.device)
+        with torch.no_grad():
+            logits = classifier.model(**inputs).logits
+        entailment_id = classifier.entailment_id
+        contradiction_id = -1 if entailment_id == 0 else 0
+        return logits[:, [contradiction_id, entailment_id]].float().cpu()
+
+    def classify_fused(self, text):
+        """
+        Score genre, academic and religious labels with a single forward pass.
+        Scores match the separate pipeline calls: genres are multi-label
+        (entailment vs contradiction per label), the two binary questions
+        are softmaxed over entailment logits within their own label pair.
+        """
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts, batch_size=BATCH_SIZE):
+        """classify_fused for many texts"""
+        return [scores_to_outputs(probs) for probs in self.fused_probabilities(texts, batch_size)]
+
+    def fused_probabilities(self, texts, batch_size=BATCH_SIZE):
+        """
+        (len(texts), 14) tensor of FUSED_LABELS scores. The pairs of
+        `batch_size` texts are stacked into one forward pass.
+        """
+        import torch
+
+        hypotheses = [HYPOTHESIS_TEMPLATE.format(l) for l in FUSED_LABELS]
+        n_labels = len(FUSED_LABELS)
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            group = texts[start:start + batch_size]
+            premises = [text for text in group for _ in range(n_labels)]
+            logits = self.nli_logits(premises, hypotheses * len(group))
+            batches.append(logits_to_scores(logits.view(len(group), n_labels, 2)))
+        return torch.cat(batches) if batches else torch.empty((0, n_labels))
+
+    # Chunked classification over the whole manuscript
+    def split_chunks(self, text):
+        """
+        Split text into windows of roughly `chunk_tokens` classifier tokens,
+        keeping `max_chunks` evenly spaced windows when a budget is set.
+        Windows are packed from whole paragraphs (longer paragraphs are cut
+        on token boundaries) and end at content-defined paragraphs, so
+        unchanged parts of an edited manuscript produce the same chunks.
+        """
+        paragraphs = list(iter_paragraphs(text))
+        if not paragraphs:
+            return [text]
+        offsets_per_paragraph = self.paragraph_offsets(paragraphs)
+        packer = ChunkPacker(self.chunk_tokens)
+        chunks = []
+        for paragraph, offsets in zip(paragraphs, offsets_per_paragraph):
+            chunks.extend(packer.add(paragraph, offsets))
+        chunks.extend(packer.flush())
+        return [chunks[i] for i in sample_evenly(len(chunks), self.max_chunks)]
+
+    def paragraph_offsets(self, paragraphs):
+        return self.tokenizer(
+            paragraphs, add_special_tokens=False, return_offsets_mapping=True, verbose=False
+        )["offset_mapping"]
+
+    def classify_chunked(self, text):
+        return self.classify_chunked_batch([text])[0]
+
+    def classify_chunked_batch(self, texts, batch_size=BATCH_SIZE):
+        """
+        Chunk every text, classify all chunks together in batches of
+        `batch_size`, then pool the scores back per text.
+        """
+        chunks_per_text = [self.split_chunks(text) for text in texts]
+        flat = [chunk for chunks in chunks_per_text for chunk in chunks]
+        probs = self.chunk_scores(flat, batch_size)
+        results = []
+        start = 0
+        for chunks in chunks_per_text:
+            pooled = pool_scores(probs[start:start + len(chunks)], self.pooling)
+            results.append(scores_to_outputs(pooled))
+            start += len(chunks)
+        return results
+
+    def chunk_scores(self, flat, batch_size=BATCH_SIZE):
+        """(len(flat), 14) scores for chunk texts, served from the chunk cache where possible"""
+        import torch
+
+        probs = [None] * len(flat)
+        if self.cache is not None:
+            from analysis_cache import make_key
+
+            config = self.chunk_config()
+            keys = [make_key("chunk", chunk, config) for chunk in flat]
+            cached = self.cache.get_many(keys, kind="chunk")
+            for i, key in enumerate(keys):
+                if key in cached:
+                    probs[i] = torch.tensor(cached[key])
+
+        missing = [i for i, row in enumerate(probs) if row is None]
+        if missing:
+            computed = self.fused_probabilities([flat[i] for i in missing], batch_size)
+            for i, row in zip(missing, computed):
+                probs[i] = row
+            if self.cache is not None:
+                self.cache.put_many({keys[i]: probs[i].tolist() for i in missing}, kind="chunk")
+        return torch.stack(probs) if probs else torch.empty((0, len(FUSED_LABELS)))
+
+    # Main Entry Function
+    def analyze(self, text):
+        """Analyze a manuscript and return a dict of results"""
+        return self.analyze_batch([text])[0]
+
+    def analyze_batch(self, texts, batch_size=BATCH_SIZE):
+        """Analyze many manuscripts; returns one result dict per text, in order"""
+        texts = list(texts)
+        if self.cache is None:
+            return self._analyze_uncached(texts, batch_size)
+
+        from analysis_cache import make_key
+
+        config = self.result_config()
+        keys = [make_key("result", text, config) for text in texts]
+        cached = self.cache.get_many(keys, kind="result")
+        results = [result_from_json(cached[key]) if key in cached else None for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = self._analyze_uncached([texts[i] for i in missing], batch_size)
+            for i, result in zip(missing, computed):
+                results[i] = result
+            self.cache.put_many({keys[i]: results[i] for i in missing}, kind="result")
+        return results
+
+    def analyze_stream(self, pages, batch_size=BATCH_SIZE):
+        """
+        Analyze a manuscript that arrives as an iterable of (page_number,
+        text) pairs, e.g. pdf_ingest.iter_pages(path). Each page is handed to
+        NER and the chunk classifier as soon as it is read, so the whole
+        document never has to sit in memory as one string.
 
-if nlp is None:
-    print("Cannot proceed without spaCy model. Exiting...")
-    sys.exit(1)
+        In chunked mode, completed chunks are classified every `batch_size`
+        chunks while later pages are still being parsed. With `max_chunks`
+        set, an evenly spaced sample of at most 2 * max_chunks chunks is
+        kept instead (the total is unknown up front) and classified at the
+        end. Otherwise the first CLASSIFY_CHARS characters are classified.
 
-# Load Hugging Face zero-shot classifier
-print("Loading Hugging Face classifier...")
-try:
-    classifier = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
-    print("Loaded Hugging Face classifier")
-except Exception as e:
-    print(f"Failed to load Hugging Face classifier: {e}")
-    sys.exit(1)
+        Besides the usual keys the result has `page_offsets` (character
+        offset of each page in the extracted text) and `location_pages`
+        (location -> pages it was found on).
+        """
+        import torch
+
+        locs_spacy, locs_regex = [], []
+        mentions = Counter()
+        location_pages = {}
+        page_offsets = []
+        offset = 0
+        done = self._enough_locations([], mentions)
+
+        head = []
+        packer = ChunkPacker(self.chunk_tokens)
+        pending, scores = [], []
+        sampler = StrideSampler(self.max_chunks) if self.max_chunks else None
+
+        def take_chunks(chunks, final=False):
+            if sampler is not None:
+                for chunk in chunks:
+                    sampler.add(chunk)
+                return
+            pending.extend(chunks)
+            while len(pending) >= batch_size or (final and pending):
+                group = pending[:batch_size]
+                del pending[:batch_size]
+                scores.append(self.chunk_scores(group, batch_size))
+
+        def paragraphs():
+            nonlocal offset, done
+            for number, text in pages:
+                page_offsets.append({"page": number, "offset": offset})
+                offset += len(text) + 1
+                for loc in self.extract_location_regex(text):
+                    locs_regex.append(loc)
+                    location_pages.setdefault(loc, []).append(number)
+                if self.chunked:
+                    page_paragraphs = list(iter_paragraphs(text))
+                    if page_paragraphs:
+                        for paragraph, offsets in zip(page_paragraphs, self.paragraph_offsets(page_paragraphs)):
+                            take_chunks(packer.add(paragraph, offsets))
+                elif sum(map(len, head)) < CLASSIFY_CHARS:
+                    head.append(text)
+                done = done or self._enough_locations(locs_regex, mentions)
+                if not done:
+                    for paragraph in iter_paragraphs(text):
+                        yield paragraph, number
+
+        docs = self.nlp.pipe(paragraphs(), as_tuples=True, batch_size=SPACY_BATCH_SIZE, n_process=self.n_process)
+        for doc, number in docs:
+            for ent in doc.ents:
+                if ent.label_ == "GPE":
+                    locs_spacy.append(ent.text)
+                    mentions[ent.text] += 1
+                    pages_seen = location_pages.setdefault(ent.text, [])
+                    if not pages_seen or pages_seen[-1] != number:
+                        pages_seen.append(number)
+            done = done or self._enough_locations(locs_regex, mentions)
+
+        if self.chunked:
+            take_chunks(packer.flush(), final=True)
+            if sampler is not None:
+                scores.append(self.chunk_scores(sampler.items(), batch_size))
+            scores = [s for s in scores if len(s)]
+            if scores:
+                classified = scores_to_outputs(pool_scores(torch.cat(scores), self.pooling))
+            else:
+                classified = self.classify_batch([""])[0]
+        else:
+            classified = self.classify_heads(["\n".join(head)[:CLASSIFY_CHARS]])[0]
+
+        return {
+            "location": merge_locations(locs_spacy, locs_regex),
+            **classified,
+            "page_offsets": page_offsets,
+            "location_pages": {loc: sorted(set(p)) for loc, p in location_pages.items()},
+        }
+
+    def _analyze_uncached(self, texts, batch_size):
+        locations = self.get_author_locations(texts)
+        heads = [text[:CLASSIFY_CHARS] for text in texts]
+        if self.chunked:
+            classified = self.classify_chunked_batch(texts, batch_size=batch_size)
+        else:
+            classified = self.classify_heads(heads, batch_size=batch_size)
+        return [{"location": loc, **cls} for loc, cls in zip(locations, classified)]
+
+    def classify_heads(self, heads, batch_size=BATCH_SIZE):
+        """Classify the opening text of each manuscript, fused or with the three separate pipelines"""
+        if self.fused:
+            return self.classify_batch(heads, batch_size=batch_size)
+        return [
+            {
+                "genres": self.predict_genre(head),
+                "academic_focus": self.predict_academic_focus(head),
+                "religious_focus": self.predict_religious_focus(head),
+            }
+            for head in heads
+        ]
+
+
+class ChunkPacker:
+    """
+    Packs paragraphs into chunks of roughly `chunk_tokens` tokens. A chunk
+    also ends after any paragraph whose hash is 0 mod CHUNK_BOUNDARY_EVERY,
+    and paragraphs longer than `chunk_tokens` are cut on token boundaries.
+    """
+
+    def __init__(self, chunk_tokens):
+        self.chunk_tokens = chunk_tokens
+        self.current = []
+        self.size = 0
+
+    def add(self, paragraph, offsets):
+        """Add a paragraph with its token offsets; returns the chunks it completed"""
+        if len(offsets) > self.chunk_tokens:
+            chunks = self.flush()
+            for first in range(0, len(offsets), self.chunk_tokens):
+                last = min(first + self.chunk_tokens, len(offsets)) - 1
+                chunks.append(paragraph[offsets[first][0]:offsets[last][1]])
+            return chunks
+        chunks = self.flush() if self.size + len(offsets) > self.chunk_tokens else []
+        self.current.append(paragraph)
+        self.size += len(offsets)
+        if zlib.crc32(paragraph.encode("utf-8")) % CHUNK_BOUNDARY_EVERY == 0:
+            chunks.extend(self.flush())
+        return chunks
+
+    def flush(self):
+        chunks = ["\n\n".join(self.current)] if self.current else []
+        self.current, self.size = [], 0
+        return chunks
+
+
+class StrideSampler:
+    """
+    Evenly spaced sample of a stream of unknown length: keeps every
+    `stride`-th item and doubles the stride (dropping every other kept item)
+    whenever more than 2 * budget items are held.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.stride = 1
+        self.seen = 0
+        self.kept = []
+
+    def add(self, item):
+        if self.seen % self.stride == 0:
+            self.kept.append(item)
+            if len(self.kept) > 2 * self.budget:
+                self.kept = self.kept[::2]
+                self.stride *= 2
+        self.seen += 1
+
+    def items(self):
+        return list(self.kept)
+
+
+def result_from_json(result):
+    """Restore the (label, score) tuples of a result loaded from JSON"""
+    return {**result, "genres": [tuple(pair) for pair in result["genres"]]}
+
+
+def merge_locations(locs_spacy, locs_regex):
+    all_locations = list(set(locs_spacy + locs_regex))
+    return all_locations if all_locations else None
+
+
+def iter_paragraphs(text, max_chars=PARAGRAPH_CHARS):
+    """Yield the non-blank paragraphs of text, splitting any longer than max_chars on whitespace"""
+    start = 0
+    for match in PARAGRAPH_PATTERN.finditer(text):
+        yield from _split_long(text[start:match.start()], max_chars)
+        start = match.end()
+    yield from _split_long(text[start:], max_chars)
+
+
+def _split_long(paragraph, max_chars):
+    while len(paragraph) > max_chars:
+        cut = paragraph.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        if paragraph[:cut].strip():
+            yield paragraph[:cut]
+        paragraph = paragraph[cut:]
+    if paragraph.strip():
+        yield paragraph
+
+
+def logits_to_scores(logits):
+    """
+    Turn (..., 14, 2) [contradiction, entailment] logits for FUSED_LABELS
+    into (..., 14) scores, using the zero-shot pipeline's rules: genres are
+    multi-label (entailment vs contradiction per label), the academic and
+    religious pairs are softmaxed over entailment logits within the pair.
+    """
+    import torch
+
+    n_genre, n_academic = len(GENRE_LABELS), len(ACADEMIC_LABELS)
+    entail = logits[..., 1]
+    return torch.cat(
+        [
+            logits[..., :n_genre, :].softmax(-1)[..., 1],
+            entail[..., n_genre:n_genre + n_academic].softmax(-1),
+            entail[..., n_genre + n_academic:].softmax(-1),
+        ],
+        dim=-1,
+    )
+
+
+def scores_to_outputs(scores):
+    """Split one row of FUSED_LABELS scores into the three analysis outputs"""
+    n_genre, n_academic = len(GENRE_LABELS), len(ACADEMIC_LABELS)
+    scores = scores.tolist()
+    genres = sorted(zip(GENRE_LABELS, scores[:n_genre]), key=lambda pair: pair[1], reverse=True)
+
+    def top_label(labels, label_scores):
+        return max(zip(labels, label_scores), key=lambda pair: pair[1])[0]
+
+    academic = top_label(ACADEMIC_LABELS, scores[n_genre:n_genre + n_academic])
+    religious = top_label(RELIGIOUS_LABELS, scores[n_genre + n_academic:])
+    return {"genres": genres, "academic_focus": academic, "religious_focus": religious}
+
+
+def pool_scores(scores, method="mean", temperature=ATTENTION_TEMPERATURE):
+    """
+    Combine (n_chunks, 14) scores into one row.
+    "attention" weights each chunk per label by softmax(score / temperature),
+    so confident chunks dominate without discarding the rest like "max" does.
+    """
+    if method == "mean":
+        return scores.mean(0)
+    if method == "max":
+        return scores.max(0).values
+    if method == "attention":
+        weights = (scores / temperature).softmax(0)
+        return (weights * scores).sum(0)
+    raise ValueError(f"pooling must be one of {POOLING_METHODS}, got {method!r}")
+
+
+def sample_evenly(n, budget):
+    """Indices of `budget` evenly spaced items out of n (all of them if budget is None or >= n)"""
+    if budget is None or budget >= n:
+        return list(range(n))
+    return [int((i + 0.5) * n / budget) for i in range(budget)]
+
+
+# Module-level API, backed by a shared lazily-loaded analyzer
+_default_analyzer = None
+
+def get_default_analyzer():
+    global _default_analyzer
+    if _default_analyzer is None:
+        _default_analyzer = ManuscriptAnalyzer()
+    return _default_analyzer
 
-# Extract Author Location
 def extract_location_spacy(text):
-    doc = nlp(text)
-    return [ent.text for ent in doc.ents if ent.label_ == "GPE"]
+    return get_default_analyzer().extract_location_spacy(text)
 
 def extract_location_regex(text):
-    pattern = re.compile(r"(Location|Lives in|From|Based in):?\s+([A-Z][a-zA-Z\s,]+)")
-    return [match[1] for match in pattern.findall(text)]
+    return get_default_analyzer().extract_location_regex(text)
 
 def get_author_location(text):
-    locs_spacy = extract_location_spacy(text) or []
-    locs_regex = extract_location_regex(text) or []
-    all_locations = list(set(locs_spacy + locs_regex))
-    return all_locations if all_locations else None
+    return get_default_analyzer().get_author_location(text)
 
-# Predict Genre
 def predict_genre(text):
-    candidate_labels = ["Romance", "Science Fiction", "Fantasy", "Mystery", "Thriller", "Non-Fiction", "Drama", "Comedy", "Historical", "Adventure"]
-    result = classifier(text, candidate_labels, multi_label=True)
-    return list(zip(result["labels"], result["scores"]))
+    return get_default_analyzer().predict_genre(text)
 
-# Predict Academic Focus
 def predict_academic_focus(text):
-    result = classifier(text, candidate_labels=["Academic", "Not academic"])
-    return result["labels"][0]  
+    return get_default_analyzer().predict_academic_focus(text)
 
-# Predict Religious Focus
 def predict_religious_focus(text):
-    result = classifier(text, candidate_labels=["Religious", "Not religious"])
-    return result["labels"][0]  # Best match
+    return get_default_analyzer().predict_religious_focus(text)
 
-# Main Entry Function
 def analyze_manuscript(text):
-    print("\n🔍 Analyzing Manuscript...\n")
-    
-    location = get_author_location(text)
-    print("📍 Author Location(s):", location or "Not found")
+    return get_default_analyzer().analyze(text)
+
+def analyze_batch(texts, batch_size=BATCH_SIZE):
+    return get_default_analyzer().analyze_batch(texts, batch_size=batch_size)
+
+def analyze_pdf(path, batch_size=BATCH_SIZE):
+    """Analyze a PDF manuscript page by page (see ManuscriptAnalyzer.analyze_stream)"""
+    from pdf_ingest import iter_pages
+
+    return get_default_analyzer().analyze_stream(iter_pages(path), batch_size=batch_size)
+
+def analyze_directory(directory, output_path, batch_size=BATCH_SIZE, pattern="*.txt"):
+    """
+    Analyze every manuscript file in `directory` and write one JSON Lines
+    record per file to `output_path`. Text files are read and analyzed
+    `batch_size` at a time, so memory does not grow with the directory;
+    PDFs are streamed page by page. Returns the number of records written.
+    """
+    paths = sorted(Path(directory).glob(pattern))
+    pdfs = [p for p in paths if p.suffix.lower() == ".pdf"]
+    paths = [p for p in paths if p.suffix.lower() != ".pdf"]
+    written = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        for path in pdfs:
+            out.write(json.dumps({"file": path.name, **analyze_pdf(path, batch_size)}, ensure_ascii=False) + "\n")
+            written += 1
+        for start in range(0, len(paths), batch_size):
+            group = paths[start:start + batch_size]
+            texts = [p.read_text(encoding="utf-8", errors="replace") for p in group]
+            for path, result in zip(group, analyze_batch(texts, batch_size=batch_size)):
+                out.write(json.dumps({"file": path.name, **result}, ensure_ascii=False) + "\n")
+                written += 1
+    return written
+
+def print_analysis(result):
+    """Pretty-print the dict returned by analyze_manuscript"""
+    print("📍 Author Location(s):", result["location"] or "Not found")
 
-    genre = predict_genre(text[:1000])  
     print("\n📚 Top Genres:")
-    for label, score in genre[:3]:
+    for label, score in result["genres"][:3]:
         print(f"  - {label} ({score:.2%})")
 
-    academic = predict_academic_focus(text[:1000])
-    print("\n🎓 Academic Focus:", academic)
+    print("\n🎓 Academic Focus:", result["academic_focus"])
+    print("✝️ Religious Focus:", result["religious_focus"])
 
-    religious = predict_religious_focus(text[:1000])
-    print("✝️ Religious Focus:", religious)
+def main():
+    parser = argparse.ArgumentParser(description="Analyze manuscripts")
+    parser.add_argument("input", nargs="?", help="manuscript text file, or a directory to batch-analyze (prompted if omitted)")
+    parser.add_argument("-o", "--output", default="analysis.jsonl", help="JSON Lines output for directory mode")
+    parser.add_argument("--pattern", default="*.txt", help="files to analyze in directory mode (e.g. '*.pdf')")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--chunked", action="store_true", help="classify the whole manuscript in token windows instead of the first characters")
+    parser.add_argument("--max-chunks", type=int, default=None, help="classify at most N evenly spaced chunks")
+    parser.add_argument("--pooling", choices=POOLING_METHODS, default="mean")
+    parser.add_argument("--n-process", type=int, default=1, help="spaCy processes for location extraction")
+    parser.add_argument("--location-limit", type=int, default=None, help="stop scanning once N high-confidence locations are found")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch", help="classifier inference backend")
+    parser.add_argument("--onnx-dir", default=None, help="exported ONNX model directory (default: onnx_models/<model>)")
+    parser.add_argument("--fp32", action="store_true", help="use the fp32 ONNX model instead of int8")
+    parser.add_argument("--model", default=CLASSIFIER_MODEL, help=f"MNLI checkpoint (e.g. {DISTILLED_CLASSIFIER_MODEL})")
+    parser.add_argument("--cache", nargs="?", const="analysis_cache.sqlite3", default=None,
+                        help="reuse results from an on-disk cache (default file: analysis_cache.sqlite3)")
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache:
+        from analysis_cache import AnalysisCache
+
+        cache = AnalysisCache(args.cache)
+
+    global _default_analyzer
+    _default_analyzer = ManuscriptAnalyzer(
+        classifier_model=args.model,
+        backend=args.backend,
+        onnx_dir=args.onnx_dir,
+        quantized=not args.fp32,
+        chunked=args.chunked,
+        max_chunks=args.max_chunks,
+        pooling=args.pooling,
+        n_process=args.n_process,
+        location_limit=args.location_limit,
+        cache=cache,
+    )
+
+    if args.input and Path(args.input).is_dir():
+        try:
+            count = analyze_directory(args.input, args.output, batch_size=args.batch_size, pattern=args.pattern)
+        except RuntimeError as e:
+            print(e)
+            sys.exit(1)
+        print(f"Wrote {count} records to {args.output}")
+        if cache is not None:
+            print(f"Cache: {cache.stats()}")
+        return
+
+    filepath = args.input or input("Enter path to manuscript text file: ").strip()
+    if filepath.lower().endswith(".pdf"):
+        try:
+            result = analyze_pdf(filepath, batch_size=args.batch_size)
+        except (OSError, RuntimeError) as e:
+            print(e)
+            sys.exit(1)
+        print("\n🔍 Analyzing Manuscript...\n")
+        print_analysis(result)
+        return
 
-# For Testing
-if __name__ == "__main__":
-    filepath = input("Enter path to manuscript text file: ").strip()
     try:
         with open(filepath, "r", encoding="utf-8") as f:
             manuscript_text = f.read()
-        analyze_manuscript(manuscript_text)
     except FileNotFoundError:
         print(f"File not found: {filepath}")
+        sys.exit(1)
     except Exception as e:
-        print(f"Error reading file: {e}")
\ No newline at end of file
+        print(f"Error reading file: {e}")
+        sys.exit(1)
+
+    try:
+        print("\n🔍 Analyzing Manuscript...\n")
+        print_analysis(analyze_manuscript(manuscript_text))
+    except RuntimeError as e:
+        print(e)
+        sys.exit(1)
+
+# For Testing
+if __name__ == "__main__":
+    main()
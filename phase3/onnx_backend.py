@@ -0,0 +1,143 @@
+"""
+ONNX Runtime backend for the zero-shot NLI classifier.
+
+One-time export of an MNLI checkpoint (BART-large-MNLI by default, or a
+smaller distilled one) to ONNX, with an optional dynamic int8 quantized copy:
+
+    python onnx_backend.py export
+    python onnx_backend.py export --model valhalla/distilbart-mnli-12-1
+
+The exported directory holds model.onnx, model.int8.onnx, the tokenizer and
+the model config. Use it from manuscript_model with
+`ManuscriptAnalyzer(backend="onnx", onnx_dir=...)` or `--backend onnx`.
+Requires the `onnx` and `onnxruntime` packages.
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+ONNX_ROOT = HERE / "onnx_models"
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+
+
+def default_onnx_dir(model_name):
+    return ONNX_ROOT / model_name.replace("/", "__")
+
+
+def find_entailment_id(config):
+    """Same lookup the zero-shot pipeline does on the model config"""
+    for label, idx in config.label2id.items():
+        if label.lower().startswith("entail"):
+            return idx
+    return -1
+
+
+def export_onnx(model_name, output_dir=None, quantize=True, opset=17):
+    """Export `model_name` to ONNX (plus an int8 copy) and return the output directory"""
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    output_dir = Path(output_dir or default_onnx_dir(model_name))
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+    sample = tokenizer(["A sample premise."] * 2, ["This example is Drama.", "This example is a longer hypothesis."],
+                       padding=True, return_tensors="pt")
+    fp32_path = output_dir / FP32_FILE
+    print(f"Exporting {model_name} to {fp32_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            LogitsOnly(model),
+            (sample["input_ids"], sample["attention_mask"]),
+            str(fp32_path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=opset,
+            dynamo=False,
+        )
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = output_dir / INT8_FILE
+        print(f"Quantizing to {int8_path}...")
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    return output_dir
+
+
+class OnnxClassifier:
+    """
+    NLI model served by ONNX Runtime. Exposes the pieces of the zero-shot
+    pipeline that ManuscriptAnalyzer's fused path uses: `tokenizer`,
+    `entailment_id` and `nli_logits`.
+    """
+
+    def __init__(self, model_dir, quantized=True, num_threads=None):
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+
+        model_dir = Path(model_dir)
+        path = model_dir / (INT8_FILE if quantized else FP32_FILE)
+        if not path.exists():
+            raise FileNotFoundError(f"{path} not found; run `python onnx_backend.py export` first")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads or os.cpu_count() or 1
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.entailment_id = find_entailment_id(AutoConfig.from_pretrained(model_dir))
+        self.path = path
+
+    def nli_logits(self, premises, hypotheses):
+        """(n, 2) torch tensor of [contradiction, entailment] logits"""
+        import torch
+
+        inputs = self.tokenizer(premises, hypotheses, padding=True, truncation="only_first", return_tensors="np")
+        feed = {name: value.astype("int64") for name, value in inputs.items() if name in self.input_names}
+        logits = torch.from_numpy(self.session.run(["logits"], feed)[0]).float()
+        contradiction_id = -1 if self.entailment_id == 0 else 0
+        return logits[:, [contradiction_id, self.entailment_id]]
+
+
+def main():
+    from manuscript_model import CLASSIFIER_MODEL, DISTILLED_CLASSIFIER_MODEL
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="export an MNLI checkpoint to ONNX")
+    export.add_argument("--model", default=CLASSIFIER_MODEL,
+                        help=f"checkpoint to export (e.g. {DISTILLED_CLASSIFIER_MODEL})")
+    export.add_argument("--out", type=Path, default=None, help="output directory (default: onnx_models/<model>)")
+    export.add_argument("--no-quantize", action="store_true", help="skip the int8 copy")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        out = export_onnx(args.model, args.out, quantize=not args.no_quantize)
+        print(f"Exported to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Streaming text extraction for manuscript PDFs.
+
+Pages are extracted one at a time as a generator, so a long PDF never has to
+be held in memory as a single string. Repeated running headers and footers
+(e.g. "Slaughter / Silvertide / 12") are stripped on the fly: the first and
+last lines of each page are compared, with digits masked, against the same
+lines on the pages seen so far.
+
+    for number, text in iter_pages("manuscripts/Sample_manuscript1.pdf"):
+        ...
+
+ManuscriptAnalyzer.analyze_stream consumes exactly this (page_number, text)
+stream. Requires the `pypdf` package.
+"""
+
+import re
+from collections import Counter, deque
+from pathlib import Path
+
+# How many lines at the top/bottom of a page may be a header/footer
+EDGE_LINES = 2
+# Pages read ahead before the first page is released, to learn the headers
+LOOKAHEAD_PAGES = 4
+# A line is boilerplate once it appears on at least this share of pages seen,
+# on at least MIN_REPEATS pages, with at least MIN_PAGES pages seen (a line
+# seen once on a two-page PDF is not a running header)
+MIN_REPEAT_RATIO = 0.5
+MIN_REPEATS = 2
+MIN_PAGES = 3
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def iter_pdf_pages(path):
+    """Yield (page_number, raw_text) for each page, 1-based, parsing lazily"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(str(path))
+    for number, page in enumerate(reader.pages, start=1):
+        yield number, page.extract_text() or ""
+
+
+def _edge_key(line):
+    """Mask page numbers and whitespace so running headers compare equal"""
+    return _SPACES.sub(" ", _DIGITS.sub("#", line)).strip().lower()
+
+
+def _edges(lines):
+    return lines[:EDGE_LINES] + lines[-EDGE_LINES:]
+
+
+def strip_headers_footers(pages, lookahead=LOOKAHEAD_PAGES, min_ratio=MIN_REPEAT_RATIO):
+    """
+    Remove repeated header/footer lines from a stream of (number, text)
+    pages. Only `lookahead` pages are buffered; after that each page is
+    released as soon as it is read, judged against all pages seen so far.
+    """
+    counts = Counter()
+    seen = 0
+    buffered = deque()
+
+    def clean(number, lines):
+        def boilerplate(line):
+            key = _edge_key(line)
+            return key and seen >= MIN_PAGES and counts[key] >= MIN_REPEATS and counts[key] / seen >= min_ratio
+
+        top = 0
+        while top < min(EDGE_LINES, len(lines)) and boilerplate(lines[top]):
+            top += 1
+        bottom = len(lines)
+        while bottom > max(top, len(lines) - EDGE_LINES) and boilerplate(lines[bottom - 1]):
+            bottom -= 1
+        return number, "\n".join(lines[top:bottom])
+
+    for number, text in pages:
+        lines = text.splitlines()
+        counts.update({_edge_key(line) for line in _edges(lines)} - {""})
+        seen += 1
+        buffered.append((number, lines))
+        if len(buffered) > lookahead:
+            yield clean(*buffered.popleft())
+    while buffered:
+        yield clean(*buffered.popleft())
+
+
+def iter_pages(path, strip_boilerplate=True):
+    """(page_number, text) stream for a .pdf, or a single page for a text file"""
+    path = Path(path)
+    if path.suffix.lower() != ".pdf":
+        yield 1, path.read_text(encoding="utf-8", errors="replace")
+        return
+    pages = iter_pdf_pages(path)
+    yield from strip_headers_footers(pages) if strip_boilerplate else pages
+
+
+def read_manuscript(path):
+    """Whole text of a .pdf or .txt manuscript (for callers that need one string)"""
+    return "\n".join(text for _, text in iter_pages(path))